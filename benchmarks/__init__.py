@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Offline benchmarks on synthetic MEPS/GFS-shaped datasets, run with: python -m benchmarks.run
@@ -0,0 +1,333 @@
+"""
+Benchmark the hot paths on synthetic datasets and report JSON.
+
+    python -m benchmarks.run                          # all stages, JSON to stdout
+    python -m benchmarks.run --quick --output bench.json
+    python -m benchmarks.run --stages parks route
+
+Every case is run twice: once for wall-clock time and once under tracemalloc for the
+peak Python/NumPy allocation, so the memory bookkeeping does not distort the timings.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from functools import partial
+from datetime import datetime, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import plotly
+from plotly.subplots import make_subplots
+
+from benchmarks import synthetic
+from utils.data import extract_points, extract_route
+from utils.export import write_quantized_html, StreamingHTMLWriter, encode_values
+from utils.frames import frame_panels, encoded_frames, open_netcdf_fields
+from utils.geo import GridIndex, load_country_borders
+from utils.plot import create_plots, create_scatter, add_country_borders, data_frame
+from utils.power import fleet_power
+from utils.fleet import validate_parks, load_parks, fleet_forecast
+
+SHAPEFILE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "ne_110m_admin_0_countries.zip")
+
+# Scaling parameters per stage: full run and --quick run
+PARAMS = {
+    "parks": dict(full=[10, 1000, 10000, 50000], quick=[10, 1000]),
+    "fleet": dict(full=[(100000, 5000), (100000, 20000)], quick=[(2000, 500)]),
+    "route": dict(full=[50, 200, 1000], quick=[50, 200]),
+    "gfs_frames": dict(full=[(5, 1), (20, 1), (20, 4)], quick=[(3, 4)]),
+    "frame_pool": dict(full=[(20, 1, 1), (20, 1, 2), (20, 1, 4)], quick=[(4, 4, 1), (4, 4, 2)]),
+    "meps_frames": dict(full=[(24, 20, "svg"), (24, 20, "webgl"), (24, 10, "webgl"), (24, 5, "webgl")],
+                        quick=[(4, 20, "svg"), (4, 20, "webgl")]),
+    "borders": dict(full=[1, 4], quick=[4]),
+}
+
+
+def measure(fn):
+    """
+    Returns (result, seconds, peak_bytes).
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def write_html_size(fig):
+    """
+    Returns (seconds, bytes) of fig.write_html to a temporary file.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "figure.html")
+        start = time.perf_counter()
+        fig.write_html(path)
+        seconds = time.perf_counter() - start
+        return seconds, os.path.getsize(path)
+
+
+def write_quantized_size(fig, encodings):
+    """
+    Returns (seconds, bytes) of utils.export.write_quantized_html to a temporary file.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "figure.html")
+        start = time.perf_counter()
+        write_quantized_html(fig, path, encodings)
+        seconds = time.perf_counter() - start
+        return seconds, os.path.getsize(path)
+
+
+def record(stage, params, seconds, peak, count, unit, **extra):
+    return dict(
+        stage=stage, params=params, seconds=round(seconds, 6),
+        throughput=round(count / seconds, 3) if seconds > 0 else None, throughput_unit=unit,
+        peak_mb=round(peak / 1024**2, 3), **extra
+    )
+
+
+# --- STAGES ---
+def bench_parks(values, scale):
+    shape = tuple(max(2, int(n * scale)) for n in synthetic.MEPS_SHAPE)
+    ds = synthetic.meps_dataset(n_times=6, shape=shape)
+    lat, lon = ds["latitude"].values, ds["longitude"].values
+    variables = ["wind_speed_10m", "air_temperature_2m", "air_pressure_at_sea_level"]
+    results = []
+    for n_parks in values:
+        df_parks, _, _ = validate_parks(synthetic.parks_table(n_parks))
+
+        def run():
+            park_y, park_x, _ = GridIndex(lat, lon).query(df_parks["Latitude"].values, df_parks["Longitude"].values)
+            data = extract_points(ds, variables, park_y, park_x)
+            return fleet_power(df_parks, data["wind_speed_10m"],
+                               temp=data["air_temperature_2m"], pres=data["air_pressure_at_sea_level"])
+
+        _, seconds, peak = measure(run)
+        results.append(record("parks", dict(n_parks=n_parks, grid=list(shape)), seconds, peak, n_parks, "parks/s"))
+    return results
+
+
+def bench_fleet(values, scale):
+    # CSV upload -> compact dtypes and validation -> chunked forecast into a columnar store
+    shape = tuple(max(2, int(n * scale)) for n in synthetic.MEPS_SHAPE)
+    ds = synthetic.meps_dataset(n_times=6, shape=shape)
+    grid_index = GridIndex(ds["latitude"].values, ds["longitude"].values)
+    results = []
+    with tempfile.TemporaryDirectory() as store_dir:
+        for n_parks, chunk_parks in values:
+            data = synthetic.parks_table(n_parks).to_csv(index=False).encode()
+
+            def run():
+                df_parks, _, _ = load_parks(data, "parks.csv")
+                # a fresh key per call, an existing store would be reused
+                key = f"bench_{n_parks}_{chunk_parks}_{time.time_ns()}"
+                return fleet_forecast(ds, df_parks, ds["time"].values, grid_index, key,
+                                      chunk_parks=chunk_parks, store_dir=store_dir)
+
+            _, seconds, peak = measure(run)
+            results.append(record("fleet", dict(n_parks=n_parks, chunk_parks=chunk_parks, grid=list(shape)),
+                                  seconds, peak, n_parks, "parks/s"))
+    return results
+
+
+def bench_route(values, scale):
+    shape = tuple(max(2, int(n * scale)) for n in synthetic.GFS_SHAPE)
+    ds = synthetic.gfs_wave_dataset(n_times=81, shape=shape)
+    start = ds["time"].values[0]
+    results = []
+    for n_waypoints in values:
+        route = synthetic.route_table(n_waypoints)
+        times = start + (route["Time"].values * 3600).astype("timedelta64[s]")
+        for interpolate in (False, True):
+            def run():
+                return extract_route(ds, ["windsfc", "htsgwsfc"], times, route["Latitude"].values,
+                                     route["Longitude"].values, interpolate=interpolate)
+            _, seconds, peak = measure(run)
+            results.append(record("route", dict(n_waypoints=n_waypoints, interpolate=interpolate, grid=list(shape)),
+                                  seconds, peak, n_waypoints, "waypoints/s"))
+    return results
+
+
+def bench_gfs_frames(values, scale):
+    shape = tuple(max(2, int(n * scale)) for n in synthetic.GFS_SHAPE)
+    results = []
+    for n_frames, stride in values:
+        ds = synthetic.gfs_dataset(n_times=n_frames, shape=shape).isel(
+            lat=slice(None, None, stride), lon=slice(None, None, stride))
+        lat, lon = ds["lat"].values, ds["lon"].values
+        fields = {name: ds[name].values for name in ds.data_vars}
+
+        def frame_fields(t):
+            wind = np.sqrt(fields["ugrd10m"][t] ** 2 + fields["vgrd10m"][t] ** 2)
+            return [wind, fields["tcdcclm"][t], fields["apcpsfc"][t], fields["pwatclm"][t]]
+
+        def run():
+            wind, cloud, precip, pwat = frame_fields(0)
+            fig = make_subplots(rows=4, cols=1)
+            for row, trace in enumerate([
+                create_plots(wind, lon, lat, colorscale='RdYlBu_r', zmin=0, zmax=35, text='m/s', hover_label='Wind'),
+                create_plots(cloud, lon, lat, colorscale='Blues', zmin=0, zmax=100, text='%', hover_label='Cloud'),
+                create_plots(precip, lon, lat, colorscale='PuBuGn', zmin=0, zmax=25, text='mm', hover_label='Precipitation'),
+                create_plots(pwat, lon, lat, colorscale='rainbow', zmin=0, zmax=70, text='mm', hover_label='Precipitable Water'),
+            ], start=1):
+                fig.add_trace(trace, row=row, col=1)
+            fig.frames = [data_frame(fig, str(t), frame_fields(t), traces=[0, 1, 2, 3]) for t in range(n_frames)]
+            return fig
+
+        fig, seconds, peak = measure(run)
+        html_seconds, html_bytes = write_html_size(fig)
+        quantized_seconds, quantized_bytes = write_quantized_size(fig, {0: "wind", 1: "cloud", 2: "precip", 3: "pwat"})
+        results.append(record("gfs_frames", dict(n_frames=n_frames, stride=stride, grid=list(shape)),
+                              seconds, peak, n_frames, "frames/s",
+                              write_html_seconds=round(html_seconds, 6), html_bytes=html_bytes,
+                              write_quantized_seconds=round(quantized_seconds, 6), quantized_bytes=quantized_bytes))
+    return results
+
+
+def bench_frame_pool(values, scale):
+    # The GFS script path: lazy fields of a local NetCDF (a cache entry), frames built and quantized
+    # by encoded_frames workers and streamed to HTML; workers=1 is the serial baseline
+    shape = tuple(max(2, int(n * scale)) for n in synthetic.GFS_SHAPE)
+    panels = [("speed", ("ugrd10m", "vgrd10m")), ("field", ("tcdcclm",)), ("field", ("apcpsfc",)), ("field", ("pwatclm",))]
+    encodings = {0: "wind", 1: "cloud", 2: "precip", 3: "pwat"}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_frames, stride, workers in values:
+            nc_path = os.path.join(tmp, f"gfs_{n_frames}_{stride}.nc")
+            if not os.path.exists(nc_path):
+                synthetic.gfs_dataset(n_times=n_frames, shape=shape).isel(
+                    lat=slice(None, None, stride), lon=slice(None, None, stride)).to_netcdf(nc_path)
+            names = ["ugrd10m", "vgrd10m", "tcdcclm", "apcpsfc", "pwatclm"]
+            open_fields = partial(open_netcdf_fields, nc_path, names)
+            frame_fn = partial(frame_panels, panels=panels)
+            fields = open_fields()
+            lat, lon = fields["ugrd10m"]["lat"].values, fields["ugrd10m"]["lon"].values
+            fig = make_subplots(rows=4, cols=1)
+            for row, (value, zmax) in enumerate(zip(frame_fn(fields, 0), (35, 100, 25, 70)), start=1):
+                fig.add_trace(create_plots(value, lon, lat, zmin=0, zmax=zmax), row=row, col=1)
+            html_path = os.path.join(tmp, "figure.html")
+
+            def run():
+                with StreamingHTMLWriter(html_path, fig, encodings=encodings) as writer:
+                    frame_encodings = writer.frame_encodings([0, 1, 2, 3])
+                    for t, frame_values in enumerate(encoded_frames(frame_fn, open_fields, n_frames, frame_encodings,
+                                                              max_workers=workers)):
+                        writer.add_encoded_frame(str(t), frame_values, traces=[0, 1, 2, 3])
+                return writer.frame_encodings([0, 1, 2, 3])
+
+            frame_encodings, seconds, peak = measure(run)
+            # what one frame costs to send back from a worker: quantized codes vs the float32 arrays
+            payload = encode_values(frame_fn(fields, 0), frame_encodings)
+            results.append(record("frame_pool", dict(n_frames=n_frames, stride=stride, workers=workers,
+                                                     grid=[int(lat.size), int(lon.size)]),
+                                  seconds, peak, n_frames, "frames/s",
+                                  html_bytes=os.path.getsize(html_path),
+                                  frame_payload_bytes=sum(len(value["__quantized__"]["q"]) for value in payload),
+                                  frame_float_bytes=sum(value.nbytes for value in frame_fn(fields, 0))))
+    return results
+
+
+def bench_meps_frames(values, scale):
+    shape = tuple(max(2, int(n * scale)) for n in synthetic.MEPS_SHAPE)
+    results = []
+    for n_frames, stride, render in values:
+        ds = synthetic.meps_dataset(n_times=n_frames, shape=shape).isel(
+            y=slice(None, None, stride), x=slice(None, None, stride))
+        latf, lonf = ds["latitude"].values.ravel(), ds["longitude"].values.ravel()
+        fields = {name: ds[name].values for name in ds.data_vars}
+
+        def run():
+            fig = make_subplots(rows=4, cols=1)
+            for row, trace in enumerate([
+                create_scatter(fields["wind_speed_10m"][0].ravel(), lonf, latf, cmin=0, cmax=35, text='m/s', hover_label='Wind', render=render),
+                create_scatter(fields["cloud_area_fraction"][0].ravel(), lonf, latf, colorscale="Blues", cmin=0, cmax=1, text='%', hover_label='Cloud cover', render=render),
+                create_scatter(fields["precipitation_amount"][0].ravel(), lonf, latf, colorscale="PuBuGn", cmin=0, cmax=25, text='mm', hover_label='Precipitation', render=render),
+                create_scatter(fields["air_temperature_2m"][0].ravel(), lonf, latf, colorscale="OrRd", cmin=250, cmax=320, text='K', hover_label='2m Temp', render=render),
+            ], start=1):
+                fig.add_trace(trace, row=row, col=1)
+            fig.frames = [
+                data_frame(fig, str(t), [fields[name][t].ravel() for name in
+                                         ("wind_speed_10m", "cloud_area_fraction", "precipitation_amount", "air_temperature_2m")],
+                           traces=[0, 1, 2, 3])
+                for t in range(n_frames)
+            ]
+            return fig
+
+        fig, seconds, peak = measure(run)
+        html_seconds, html_bytes = write_html_size(fig)
+        results.append(record("meps_frames", dict(n_frames=n_frames, stride=stride, render=render, n_points=int(latf.size)),
+                              seconds, peak, n_frames, "frames/s",
+                              write_html_seconds=round(html_seconds, 6), html_bytes=html_bytes))
+    return results
+
+
+def bench_borders(values, scale):
+    world = load_country_borders(SHAPEFILE_PATH)
+    results = []
+    for n_rows in values:
+        def run():
+            fig = make_subplots(rows=n_rows, cols=1)
+            for row in range(1, n_rows + 1):
+                add_country_borders(fig, world, row=row, col=1)
+            return fig
+
+        fig, seconds, peak = measure(run)
+        html_seconds, html_bytes = write_html_size(fig)
+        results.append(record("borders", dict(n_subplots=n_rows), seconds, peak, n_rows, "subplots/s",
+                              n_traces=len(fig.data), write_html_seconds=round(html_seconds, 6), html_bytes=html_bytes))
+    return results
+
+
+STAGES = {
+    "parks": bench_parks,
+    "fleet": bench_fleet,
+    "route": bench_route,
+    "gfs_frames": bench_gfs_frames,
+    "frame_pool": bench_frame_pool,
+    "meps_frames": bench_meps_frames,
+    "borders": bench_borders,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Skyfora hot paths on synthetic forecast data.")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--quick", action="store_true", help="small grids and few scaling points")
+    parser.add_argument("--scale", type=float, default=None, help="grid size factor (default 1.0, 0.25 with --quick)")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    scale = args.scale if args.scale is not None else (0.25 if args.quick else 1.0)
+    mode = "quick" if args.quick else "full"
+    results = []
+    for stage in args.stages:
+        print(f"Running {stage}...", file=sys.stderr)
+        results.extend(STAGES[stage](PARAMS[stage][mode], scale))
+
+    report = dict(
+        meta=dict(
+            timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            python=platform.python_version(), platform=platform.platform(),
+            numpy=np.__version__, plotly=plotly.__version__, mode=mode, scale=scale,
+        ),
+        results=results,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Synthetic datasets with the shapes and variable names of the real forecast sources.
+"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+MEPS_SHAPE = (2321, 1796)  # (y, x) of the 1 km Nordic MEPS post-processed grid
+GFS_SHAPE = (721, 1440)  # (lat, lon) of the 0.25° global grid
+
+
+def _times(n_times, step_hours, start="2025-01-01T00"):
+    return pd.date_range(start, periods=n_times, freq=f"{step_hours}h").values
+
+
+def _smooth_field(rng, shape, scale, offset=0.0):
+    # Cheap large-scale structure plus noise, so percentiles and colorscales look realistic
+    ny, nx = shape[-2:]
+    y = np.linspace(0, 4 * np.pi, ny)[:, None]
+    x = np.linspace(0, 4 * np.pi, nx)[None, :]
+    base = np.sin(y) * np.cos(x)
+    noise = rng.standard_normal(shape).astype(np.float32)
+    return (offset + scale * (0.5 * base + 0.5) + 0.1 * scale * noise).astype(np.float32)
+
+
+def meps_dataset(n_times=24, shape=MEPS_SHAPE, seed=0):
+    """
+    MEPS-like dataset: curvilinear latitude/longitude (y, x) and the variables used by the apps.
+    """
+    rng = np.random.default_rng(seed)
+    ny, nx = shape
+    yy, xx = np.meshgrid(np.linspace(0, 1, ny), np.linspace(0, 1, nx), indexing="ij")
+    # Lambert-like grid: meridians converge and parallels curve towards the north
+    lat = 52 + 21 * yy + 2 * (xx - 0.5) ** 2
+    lon = -2 + (xx - 0.5) * (50 - 20 * yy) + 15
+    dims = ("time", "y", "x")
+    full = (n_times, ny, nx)
+    return xr.Dataset(
+        {
+            "wind_speed_10m": (dims, np.abs(_smooth_field(rng, full, 20))),
+            "air_temperature_2m": (dims, _smooth_field(rng, full, 30, offset=260)),
+            "air_pressure_at_sea_level": (dims, _smooth_field(rng, full, 4000, offset=99000)),
+            "cloud_area_fraction": (dims, np.clip(_smooth_field(rng, full, 1), 0, 1)),
+            "precipitation_amount": (dims, np.clip(_smooth_field(rng, full, 10, offset=-3), 0, None)),
+        },
+        coords={
+            "time": _times(n_times, 1),
+            "latitude": (("y", "x"), lat),
+            "longitude": (("y", "x"), lon),
+        },
+        attrs={"forecast_cycle": "2025010100"},
+    )
+
+
+def gfs_dataset(n_times=20, shape=GFS_SHAPE, seed=0):
+    """
+    GFS 0.25° atmosphere dataset with 0-360 longitudes.
+    """
+    rng = np.random.default_rng(seed)
+    dims = ("time", "lat", "lon")
+    full = (n_times,) + shape
+    return xr.Dataset(
+        {
+            "ugrd10m": (dims, _smooth_field(rng, full, 30, offset=-15)),
+            "vgrd10m": (dims, _smooth_field(rng, full, 30, offset=-15)),
+            "tcdcclm": (dims, np.clip(_smooth_field(rng, full, 100), 0, 100)),
+            "apcpsfc": (dims, np.clip(_smooth_field(rng, full, 25, offset=-8), 0, None)),
+            "pwatclm": (dims, np.clip(_smooth_field(rng, full, 70), 0, None)),
+        },
+        coords={
+            "time": _times(n_times, 3),
+            "lat": np.linspace(-90, 90, shape[0]),
+            "lon": np.linspace(0, 360, shape[1], endpoint=False),
+        },
+        attrs={"forecast_cycle": "2025010100"},
+    )
+
+
+def gfs_wave_dataset(n_times=17, shape=GFS_SHAPE, seed=0):
+    """
+    GFS-Wave 0.25° dataset, significant wave height is NaN over a synthetic land mask.
+    """
+    rng = np.random.default_rng(seed)
+    dims = ("time", "lat", "lon")
+    full = (n_times,) + shape
+    wave = _smooth_field(rng, full, 12)
+    land = _smooth_field(np.random.default_rng(seed + 1), shape, 1) > 0.8
+    wave[:, land] = np.nan
+    return xr.Dataset(
+        {
+            "windsfc": (dims, np.abs(_smooth_field(rng, full, 30))),
+            "htsgwsfc": (dims, np.clip(wave, 0, None)),
+        },
+        coords={
+            "time": _times(n_times, 3),
+            "lat": np.linspace(-90, 90, shape[0]),
+            "lon": np.linspace(0, 360, shape[1], endpoint=False),
+        },
+        attrs={"forecast_cycle": "2025010100"},
+    )
+
+
+def parks_table(n_parks, lat_range=(56, 70), lon_range=(5, 30), seed=0):
+    """
+    Wind park table with the upload columns of app_windpower.py.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Longitude": rng.uniform(*lon_range, n_parks),
+        "Latitude": rng.uniform(*lat_range, n_parks),
+        "RotorRadius_m": rng.uniform(40, 80, n_parks),
+        "RatedPower_kW": rng.choice([2000, 3000, 3500, 5000], n_parks),
+        "CutInWind_mps": rng.uniform(2.5, 4, n_parks),
+        "RatedWind_mps": rng.uniform(11, 13, n_parks),
+        "CutoffWind_mps": np.full(n_parks, 25.0),
+        "TurbineHeight": rng.choice([80, 100, 120], n_parks),
+        "WindShear": rng.uniform(0.1, 0.2, n_parks),
+        "Efficiency": rng.uniform(0.4, 0.48, n_parks),
+    })
+
+
+def route_table(n_waypoints, start=(5.0, 60.0), end=(-70.0, 40.0), hours=240):
+    """
+    Great-circle-ish shipping route as Longitude, Latitude, Time (hours from start).
+    """
+    frac = np.linspace(0, 1, n_waypoints)
+    return pd.DataFrame({
+        "Longitude": start[0] + (end[0] - start[0]) * frac,
+        "Latitude": start[1] + (end[1] - start[1]) * frac + 5 * np.sin(np.pi * frac),
+        "Time": hours * frac,
+    })
@@ -2,12 +2,15 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import io
 import streamlit as st
-import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from utils.data import open_opendap_dataset, get_gfs_wave_opendap_url,get_latest_gfs_cycle
+from functools import partial
+from utils.data import open_opendap_dataset, get_gfs_wave_opendap_url,get_latest_gfs_cycle, route_series, sample_route, PARALLEL_OPENDAP_ENGINE
+from utils.resources import current_cycle, cycle_resource, cached_result, content_hash, start_job
+from utils.app import job_result, track_job, forget_job
 
 # Headers
 st.set_page_config(page_title="Voyage Weather & Wave Planner", layout="centered")
@@ -38,25 +41,36 @@ st.info("""
 - You can hover on map points to see time-specific forecasts.
 """)
 
-# Loads the latest GFS Wave Data
-cycle, yyyymmdd = get_latest_gfs_cycle()
-opendap_url = get_gfs_wave_opendap_url(yyyymmdd, cycle) # Get the OPeNDAP URL for the latest cycle
-print(f"Using GFS OPeNDAP URL: {opendap_url}")
-# Loading data
-ds = open_opendap_dataset(opendap_url) 
+# Loads the latest GFS Wave Data (newest cycle published on NOMADS).
+# The dataset handle and forecast times are shared by all sessions and reruns until a new cycle appears.
+def open_wave_dataset(cycle):
+    opendap_url = get_gfs_wave_opendap_url(cycle[:8], cycle[8:]) # Get the OPeNDAP URL for the cycle
+    print(f"Using GFS OPeNDAP URL: {opendap_url}")
+    return open_opendap_dataset(opendap_url, engine=PARALLEL_OPENDAP_ENGINE)
+
+with st.spinner("Opening the latest GFS Wave forecast..."):
+    fallback_cycle, fallback_yyyymmdd = get_latest_gfs_cycle()
+    wave_cycle = current_cycle("gfswave") or fallback_yyyymmdd + fallback_cycle
+    ds = cycle_resource("gfswave", "dataset", open_wave_dataset, cycle=wave_cycle)
+if ds is None:
+    st.error("GFS Wave forecast is not available right now, please try again later.")
+    st.stop()
+forecast_times = cycle_resource("gfswave", "forecast_times", lambda cycle: pd.to_datetime(ds['time'].values), cycle=wave_cycle)
 
 # Upload Excel File with Waypoints
 st.markdown("#### 1. Upload Route Table")
 uploaded_file = st.file_uploader("Upload Excel file with columns: Longitude, Latitude, Time (hours from start)", type=["xlsx"])
 
 if uploaded_file is not None:
-    df_waypoints = pd.read_excel(uploaded_file)
+    # Parsed table and route lookups are kept per file content, so reruns and re-uploads reuse them
+    upload_bytes = uploaded_file.getvalue()
+    upload_hash = content_hash(upload_bytes)
+    df_waypoints = cached_result(("route_table", upload_hash), lambda: pd.read_excel(io.BytesIO(upload_bytes))).copy()
     st.success("Route uploaded successfully!")
     st.write("Preview of uploaded waypoints:")
     st.dataframe(df_waypoints.head(), use_container_width=True)
 
     # Select starting time from forecast times
-    forecast_times = pd.to_datetime(ds['time'].values)
     st.markdown("#### 2. Set Departure Time")
     st.markdown("Select the UTC starting time for your voyage:")
     forecast_time_options = forecast_times[:10]
@@ -66,6 +80,11 @@ if uploaded_file is not None:
         format_func=lambda t: t.strftime("%Y-%m-%d %H:%M")
     )
 
+    interpolate = st.checkbox(
+        "Interpolate between grid points and forecast time steps",
+        value=False
+    )
+
     # Compute absolute times for each waypoint
     abs_times = [
         selected_start_time + pd.Timedelta(hours=float(h))
@@ -85,30 +104,32 @@ else:
     st.dataframe(example, use_container_width=True)
     waypoints = []
 
-# Extract Data for each checkpoint
+# Extract Data for all checkpoints: the spatial lookup (full time series at the route's grid points)
+# runs in the background once per route and cycle, a new departure time only re-indexes it in time.
+# Uploading another route (or changing interpolation) cancels the lookup still running for the old one
+def route_series_job(lats, lons, interpolate, job):
+    return route_series(ds, ["windsfc", "htsgwsfc"], lats, lons, interpolate=interpolate, progress=job.report)
+
 results = []
-for wp in waypoints:
-    try:
-        t_idx = np.argmin(np.abs(ds['time'].values - np.datetime64(wp['AbsTime'])))
-        lat_idx = np.argmin(np.abs(ds['lat'].values - wp['Latitude']))
-        lon_idx = np.argmin(np.abs(ds['lon'].values - wp['Longitude']))
-        wind = float(ds['windsfc'].isel(time=t_idx, lat=lat_idx, lon=lon_idx).values)
-        wave = float(ds['htsgwsfc'].isel(time=t_idx, lat=lat_idx, lon=lon_idx).values)
-        results.append({
-            "Longitude": wp['Longitude'],
-            "Latitude": wp['Latitude'],
-            "Arrival Time": wp['AbsTime'],
-            "Wind Speed (m/s)": wind,
-            "Wave Height (m)": wave
-        })
-    except Exception as e:
-        results.append({
-            "Longitude": wp.get('Longitude', 'N/A'),
-            "Latitude": wp.get('Latitude', 'N/A'),
-            "Arrival Time": wp.get('AbsTime', 'N/A'),
-            "Wind Speed (m/s)": "N/A",
-            "Wave Height (m)": "N/A"
-        })
+if waypoints:
+    route_job = start_job(
+        ("route_series", upload_hash, wave_cycle, interpolate),
+        partial(route_series_job, df_waypoints["Latitude"].values, df_waypoints["Longitude"].values, interpolate)
+    )
+    track_job("route_job", route_job)
+    series = job_result(route_job, "Extracting the forecast along the route")
+    if series is not None:
+        route = sample_route(series, df_waypoints["AbsTime"].values)
+        for wp, wind, wave in zip(waypoints, route["windsfc"], route["htsgwsfc"]):
+            results.append({
+                "Longitude": wp.get('Longitude', 'N/A'),
+                "Latitude": wp.get('Latitude', 'N/A'),
+                "Arrival Time": wp.get('AbsTime', 'N/A'),
+                "Wind Speed (m/s)": float(wind),
+                "Wave Height (m)": float(wave)
+            })
+else:
+    forget_job("route_job")
 
 df = pd.DataFrame(results)
 
@@ -221,7 +242,7 @@ This tool provides interactive visualizations of wind and wave conditions for ma
 - **Plotly:** For the powerful graphing library to create interactive plots.
 - **Xarray, Pandas, NumPy:** For the essential data handling and numerical computing capabilities.
 """)
-else:
+elif not waypoints:
     st.info("Upload your route data to get started!")
 
 
@@ -7,8 +7,18 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 
-from utils.data import open_opendap_dataset
-from utils.geo import load_country_borders, get_border_lines
+from functools import partial
+from utils.data import open_opendap_dataset, get_meps_cycle_url, PARALLEL_OPENDAP_ENGINE
+from utils.resources import current_cycle, cycle_resource, cached_result, content_hash, start_job, FrameLRU
+from utils.app import job_result, track_job, forget_job
+from utils.products import (open_meps_map_data, open_meps_map_stream, build_wind_power_map, wind_power_frame,
+                            read_product, write_product, wind_power_levels,
+                            WIND_POWER_MAP, MEPS_MAP_VARIABLES, MEPS_MAP_FRAMES, MAP_PERCENTILES, MAP_TIME_CHUNK)
+from utils.stats import compute_field_stats, color_range
+from utils.pyramid import select_level
+from utils.geo import load_country_borders, get_border_lines, get_grid_index
+from utils.plot import data_frame
+from utils.fleet import load_parks, fleet_forecast, PARK_FILE_TYPES
 
 # App title
 st.set_page_config(page_title="Wind Power Forecast Explorer", layout="centered")
@@ -22,7 +32,7 @@ Upload wind park coordinates and turbine specs, and explore **wind speed** and *
 # ---- Features ----
 st.markdown("""
 ### How it Works:
-1. **Upload Wind Park Table:** Provide your wind parks as a CSV or Excel file with required columns.
+1. **Upload Wind Park Table:** Provide your wind parks as a CSV, Excel, Parquet or Arrow file with required columns (full turbine registries are fine).
 2. **Visualize Forecasts:**  
    - **Map Overlay:** Always visible map showing wind power potential (at 10m height).
    - **Time Series:** Track wind speed and power output at each park.
@@ -54,94 +64,120 @@ example = pd.DataFrame({
 })
 st.dataframe(example, use_container_width=True)
 
+# Preparing data for map
+num_frames = MEPS_MAP_FRAMES # get first n forecasts 
+MAP_MAX_POINTS = 30000 # point budget of the map heatmap, picks the pyramid level
+LAZY_MAP = True # without a stored map product, compute only the frame on the time slider (neighbours prefetched)
+
 # loading data
-@st.cache_data
-def load_data():
-    url = "https://thredds.met.no/thredds/dodsC/metpplatest/met_forecast_1_0km_nordic_latest.nc"
-    ds = open_opendap_dataset(url)
-    return ds
+variables = MEPS_MAP_VARIABLES
+
+# Dataset handle, map product and derived arrays are kept process-wide per MEPS cycle (utils/resources.py),
+# so reruns and concurrent sessions reuse them and they are replaced when a new cycle is published
+def open_meps(cycle):
+    # Lazy full resolution dataset of the cycle's own file, wind parks only read their own grid points
+    return open_opendap_dataset(get_meps_cycle_url(cycle), variables=variables, time=num_frames, engine=PARALLEL_OPENDAP_ENGINE)
+
+def load_map_product(cycle):
+    # Precomputed by scripts/prefetch_worker.py; built here only if the stored one is older than the newest cycle
+    product = stored_map_product(cycle)
+    if product is None:
+        product = build_wind_power_map(open_meps_map_data(cycle=cycle))
+        write_product(WIND_POWER_MAP, product)
+    return product
+
+def stored_map_product(cycle):
+    # None (looked up again on the next run) until the prefetch worker has written the cycle's product
+    product = read_product(WIND_POWER_MAP, min_cycle=cycle)
+    return product if product is not None and "pyramid_factors" in product.attrs else None
+
+def open_map_frames(cycle):
+    # One time step of the map fields is read and reduced per requested frame
+    ds_map = cycle_resource("meps", "map_stream", open_meps_map_stream, cycle=cycle)
+    if ds_map is None:
+        return None
+    return FrameLRU(partial(wind_power_frame, ds_map), min(num_frames, len(ds_map["time"])))
+
+def build_map_job(cycle, job):
+    # Whole-horizon product built chunk by chunk in the background and stored for the other app processes
+    ds_map = cycle_resource("meps", "map_stream", open_meps_map_stream, cycle=cycle)
+    if ds_map is None:
+        raise RuntimeError("MEPS map fields could not be opened")
+    product = build_wind_power_map(ds_map, time_chunk=MAP_TIME_CHUNK, progress=job.report)
+    product.attrs["forecast_cycle"] = cycle
+    write_product(WIND_POWER_MAP, product)
+    return product
+
+with st.spinner("Opening the latest MEPS forecast..."):
+    meps_cycle = current_cycle("meps")
+    ds = cycle_resource("meps", "dataset", open_meps, cycle=meps_cycle)
+if ds is None:
+    st.error("MEPS forecast is not available right now, please try again later.")
+    st.stop()
+map_product = cycle_resource("meps", "wind_power_map", stored_map_product if LAZY_MAP else load_map_product, cycle=meps_cycle)
+map_job = None
+if map_product is None:
+    # The animation needs every frame: built in the background while single frames are shown on demand
+    map_job = start_job(("meps", meps_cycle, "wind_power_map"), partial(build_map_job, meps_cycle))
+    if map_job.done() and map_job.error() is None and not map_job.cancelled:
+        map_product = map_job.result()
+map_frames = None
+if map_product is None:
+    map_frames = cycle_resource("meps", "wind_power_frames", open_map_frames, cycle=meps_cycle)
+    if map_frames is None:
+        st.error("MEPS forecast is not available right now, please try again later.")
+        st.stop()
+
+lat, lon = cycle_resource("meps", "latlon", lambda cycle: (ds['latitude'].values, ds['longitude'].values), cycle=meps_cycle)
+times = cycle_resource("meps", "forecast_times", lambda cycle: pd.to_datetime(ds['time'].values[:num_frames]), cycle=meps_cycle)
 
-ds = load_data()
+# --- Animation: Wind Power Potential Map ---
+st.markdown("### Wind Power Potential Map (at 10m height)")
 
-# Preparing data for map
-stride = 20 # Cant plot all coordinates as its heavy processing task. So, plotting only every 20th point. 
-num_frames = 47 # get first n forecasts 
-rho0 = 1.225
-R = 287.05
-
-wind = ds['wind_speed_10m'].isel(time=slice(0, num_frames)).values  # (t, y, x)
-temp = ds['air_temperature_2m'].isel(time=slice(0, num_frames)).values
-pres = ds['air_pressure_at_sea_level'].isel(time=slice(0, num_frames)).values
-lat = ds['latitude'].values
-lon = ds['longitude'].values
-
-wind = wind[:, ::stride, ::stride]
-temp = temp[:, ::stride, ::stride]
-pres = pres[:, ::stride, ::stride]
-lat_sub = lat[::stride, ::stride]
-lon_sub = lon[::stride, ::stride]
-
-# Filter longitude between 0 and 30 for plotting
-lon_mask = (lon_sub >= 0) & (lon_sub <= 30)
-lat_mask = np.any(lon_mask, axis=1)
-lon_mask_any = np.any(lon_mask, axis=0)
-
-lat_sub_plot = lat_sub[lat_mask][:, lon_mask_any]
-lon_sub_plot = lon_sub[lat_mask][:, lon_mask_any]
-wind = wind[:, lat_mask][:, :, lon_mask_any]
-temp = temp[:, lat_mask][:, :, lon_mask_any]
-pres = pres[:, lat_mask][:, :, lon_mask_any]
-
-rho = pres / (R * temp)
-wind_power = 0.5 * rho * wind**3  # (t, y, x)
-
-# Country borders
-shapefile_path = r"data/ne_10m_admin_0_countries.zip"
+if map_frames is None:
+    # Whole stored product: every frame is part of the animation
+    wind_power_levels_all = cycle_resource("meps", "wind_power_levels", lambda cycle: wind_power_levels(map_product), cycle=meps_cycle)
+    wind_power_zmax = map_product.attrs["p99"]
+else:
+    # On demand: only the selected time step is computed, the color scale comes from the first frame
+    frame_idx = st.select_slider(
+        "Forecast time:", options=list(range(map_frames.n_frames)),
+        format_func=lambda k: times[k].strftime("%Y-%m-%d %H:%M")
+    )
+    try:
+        first_stats = cycle_resource(
+            "meps", "wind_power_first_frame_stats",
+            lambda cycle: compute_field_stats({"wind_power": map_frames.get(0)[0]["field"]}, quantiles=MAP_PERCENTILES)["wind_power"],
+            cycle=meps_cycle
+        )
+        wind_power_levels_all = map_frames.get(frame_idx)
+    except Exception as e:
+        print(f"Error computing wind power map frame {frame_idx}: {e}")
+        st.error("Wind power map could not be computed right now, please try again later.")
+        st.stop()
+    wind_power_zmax = color_range(first_stats, high="p99")[1]
+
+# Viewport: the finest block-mean level that fits the point budget is drawn, zooming in needs no new download
+map_lat = wind_power_levels_all[-1]["lat"]
+lat_min, lat_max = float(np.floor(np.nanmin(map_lat))), float(np.ceil(np.nanmax(map_lat)))
+col_lon, col_lat = st.columns(2)
+view_lon = col_lon.slider("Longitude range", 0.0, 30.0, (0.0, 30.0), step=0.5)
+view_lat = col_lat.slider("Latitude range", lat_min, lat_max, (lat_min, lat_max), step=0.5)
+map_level = select_level(wind_power_levels_all, MAP_MAX_POINTS, bbox=(view_lon[0], view_lat[0], view_lon[1], view_lat[1]))
+if map_level is None:
+    map_level = select_level(wind_power_levels_all, MAP_MAX_POINTS)
+wind_power = map_level["field"]  # (t, y, x), a single time step in on-demand mode
+lat_sub_plot = map_level["lat"]
+lon_sub_plot = map_level["lon"]
+
+# Country borders (bundled 1:110m; for coastline detail download ne_10m_admin_0_countries.zip from Natural Earth into data/ and point here)
+shapefile_path = r"data/ne_110m_admin_0_countries.zip"
 world = load_country_borders(
     shapefile_path,
-    bbox=(lon_sub_plot.min(), lat_sub_plot.min(), lon_sub_plot.max(), lat_sub_plot.max())
+    bbox=(np.nanmin(lon_sub_plot), np.nanmin(lat_sub_plot), np.nanmax(lon_sub_plot), np.nanmax(lat_sub_plot))
 )
 border_x, border_y = get_border_lines(world)
 
-# --- Animation: Wind Power Potential Map ---
-st.markdown("### Wind Power Potential Map (at 10m height)")
-times = pd.to_datetime(ds['time'].values[:num_frames])
-
-frames = []
-for t_idx in range(num_frames):
-    z = wind_power[t_idx]
-    frame = go.Frame(
-        data=[
-            go.Heatmap(
-                z=z,
-                x=lon_sub_plot[0, :],
-                y=lat_sub_plot[:, 0],
-                colorscale="YlGnBu",
-                zmin=0,
-                zmax=np.nanpercentile(wind_power, 99),
-                colorbar=dict(
-                    title="W/m²",
-                    len=1,
-                    thickness=30,
-                    y=0.5
-                ),
-                hovertemplate="Lon: {x:.2f}<br>Lat: {y:.2f}<br>Wind Power: {z:.1f} W/m²<extra></extra>",
-                showscale=True,
-                opacity=0.7
-            ),
-            go.Scatter(
-                x=border_x,
-                y=border_y,
-                mode='lines',
-                line=dict(color='black', width=1),
-                showlegend=False,
-                hoverinfo='skip'
-            )
-        ],
-        name=str(t_idx)
-    )
-    frames.append(frame)
-
 # initial frame
 z0 = wind_power[0]
 fig = go.Figure(
@@ -152,7 +188,7 @@ fig = go.Figure(
             y=lat_sub_plot[:, 0],
             colorscale="YlGnBu",
             zmin=0,
-            zmax=np.nanpercentile(wind_power, 99),
+            zmax=wind_power_zmax,
             colorbar=dict(
                 title="W/m²",
                 len=0.8,
@@ -178,7 +214,12 @@ fig = go.Figure(
         xaxis_title="Longitude",
         yaxis_title="Latitude",
         plot_bgcolor="white",
-        xaxis=dict(range=[0, 30]),
+        xaxis=dict(range=list(view_lon)),
+        yaxis=dict(range=list(view_lat))
+    )
+)
+if map_frames is None:
+    fig.update_layout(
         updatemenus=[
             dict(
                 type="buttons",
@@ -213,7 +254,7 @@ fig = go.Figure(
                     "label": times[k].strftime("%Y-%m-%d %H:%M"),
                     "method": "animate"
                 }
-                for k in range(num_frames)
+                for k in range(len(wind_power))
             ],
             "transition": {"duration": 0},
             "x": 0.1,
@@ -225,108 +266,91 @@ fig = go.Figure(
             },
             "len": 0.8
         }]
-    ),
-    frames=frames
-)
+    )
+    # Frames only carry the heatmap z; coordinates, colorbar and borders stay on the base figure.
+    # The dataset may hold fewer than num_frames time steps (e.g. a cycle still being published)
+    fig.frames = [data_frame(fig, str(t_idx), [wind_power[t_idx]], traces=[0]) for t_idx in range(len(wind_power))]
 st.plotly_chart(fig)
+if map_frames is not None:
+    job_result(map_job, "Loading all forecast hours for the animation")
 
 # Upload wind park coordinates
 st.markdown("### Upload Wind Park Coordinates and Turbine Specs")
+PREVIEW_ROWS = 200 # rows of large tables shown in the page, the complete tables are in the downloads
+PLOT_MAX_PARKS = 20 # parks drawn as individual time series, the ones with the highest mean output for larger fleets
+
 uploaded_file = st.file_uploader(
-    "Upload Excel or CSV file with required columns (see example above)",
-    type=["xlsx", "csv"]
+    "Upload Excel, CSV, Parquet or Arrow file with required columns (see example above)",
+    type=PARK_FILE_TYPES
 )
 
+def park_results(df_parks, upload_hash, job):
+    # Runs as a background job: parks are forecast chunk by chunk into an on-disk columnar store
+    grid_index = cycle_resource("meps", "grid_index", lambda cycle: get_grid_index(lat, lon), cycle=meps_cycle)
+    return fleet_forecast(ds, df_parks, times, grid_index, key=f"{upload_hash[:16]}_{meps_cycle}", progress=job.report)
+
 if uploaded_file is not None:
-    if uploaded_file.name.endswith(".xlsx"):
-        df_parks = pd.read_excel(uploaded_file)
-    else:
-        df_parks = pd.read_csv(uploaded_file)
-    # Convert to numeric
-    df_parks["Latitude"] = pd.to_numeric(df_parks["Latitude"], errors="coerce")
-    df_parks["Longitude"] = pd.to_numeric(df_parks["Longitude"], errors="coerce")
-    st.success("Wind park coordinates uploaded!")
-    st.dataframe(df_parks)
-
-    # Set default values if not provided (except rotor radius and rated power)
-    default_turbine_height = 100  # meters
-    default_windshear = 0.14
-    default_efficiency = 0.45  # Typical efficiency factor
-
-    if "TurbineHeight" not in df_parks:
-        df_parks["TurbineHeight"] = default_turbine_height
-    if "WindShear" not in df_parks:
-        df_parks["WindShear"] = default_windshear
-    if "Efficiency" not in df_parks:
-        df_parks["Efficiency"] = default_efficiency
-
-    # Check for required columns
-    required_cols = ["RotorRadius_m", "RatedPower_kW", "CutInWind_mps", "RatedWind_mps", "CutoffWind_mps"]
-    missing_cols = [col for col in required_cols if col not in df_parks]
-    if missing_cols:
+    # Parsed table and park forecasts are kept per file content (and MEPS cycle), so reruns,
+    # other sessions and re-uploads of the same file reuse them. The forecasts are extracted in
+    # the background; uploading another file cancels the extraction of the previous one
+    upload_bytes = uploaded_file.getvalue()
+    upload_hash = content_hash(upload_bytes)
+    try:
+        # Known columns only, as float32; defaults for optional columns and row checks on whole columns
+        df_parks, missing_cols, rejected = cached_result(("park_table", upload_hash, uploaded_file.name.lower()),
+                                                         lambda: load_parks(upload_bytes, uploaded_file.name))
+    except Exception as e:
+        print(f"Error reading park table {uploaded_file.name}: {e}")
+        df_parks, missing_cols, rejected = None, [], {}
+    fleet = None
+    if df_parks is None:
+        forget_job("park_job")
+        st.error("The uploaded file could not be read, please check its format.")
+    elif missing_cols:
+        forget_job("park_job")
         st.error(f"Please include columns {missing_cols} in your upload.")
+    elif df_parks.empty:
+        forget_job("park_job")
+        st.error("The upload contains no valid wind parks.")
     else:
-        # Calculate rotor area from radius
-        df_parks["RotorArea_m2"] = np.pi * df_parks["RotorRadius_m"] ** 2
-
-        # Extract wind forecast for each park for all frames
-        results = []
-        for idx, row in df_parks.iterrows():
-            park_lat = row["Latitude"]
-            park_lon = row["Longitude"]
-            turbine_height = row["TurbineHeight"]
-            windshear = row["WindShear"]
-            rotor_area = row["RotorArea_m2"]
-            rated_power = row["RatedPower_kW"]
-            cut_in = row["CutInWind_mps"]
-            rated_wind = row["RatedWind_mps"]
-            cut_off = row["CutoffWind_mps"]
-            efficiency = row["Efficiency"]
-
-            # Find nearest grid point
-            dist = np.sqrt((lat - park_lat)**2 + (lon - park_lon)**2)
-            y_idx, x_idx = np.unravel_index(np.argmin(dist), dist.shape)
-            windspeed_series_10m = ds['wind_speed_10m'].isel(y=y_idx, x=x_idx, time=slice(0, num_frames)).values
-
-            # Convert wind speed to turbine height using power law
-            windspeed_series_hub = windspeed_series_10m * (turbine_height / 10) ** windshear
-
-            # Calculate air density at site (optional, use 1.225 kg/m³ if not available)
-            try:
-                temp_series = ds['air_temperature_2m'].isel(y=y_idx, x=x_idx, time=slice(0, num_frames)).values
-                pres_series = ds['air_pressure_at_sea_level'].isel(y=y_idx, x=x_idx, time=slice(0, num_frames)).values
-                R = 287.05
-                rho_series = pres_series / (R * temp_series)
-            except Exception:
-                rho_series = np.full_like(windspeed_series_hub, 1.225)
-
-            # Calculate wind power at hub height
-            windpower_series = 0.5 * rho_series * rotor_area * windspeed_series_hub**3  # in Watts
-
-            # Apply efficiency
-            windpower_series = windpower_series * efficiency
-
-            # Calculate actual power output (limit by cut-in, rated, and cut-off wind speeds)
-            power_output_series = []
-            for ws, wp in zip(windspeed_series_hub, windpower_series):
-                if ws < cut_in or ws > cut_off:
-                    power_output_series.append(0)
-                elif ws >= rated_wind:
-                    power_output_series.append(rated_power)
-                else:
-                    power_output_series.append(min(wp / 1000, rated_power))  # in kW
-
-            for t_idx in range(len(windspeed_series_hub)):
-                results.append({
-                    "Park": f"Park {idx+1}",
-                    "Longitude": park_lon,
-                    "Latitude": park_lat,
-                    "Forecast Time": times[t_idx],
-                    "Wind Speed 10m (m/s)": windspeed_series_10m[t_idx],
-                    f"Wind Speed {int(turbine_height)}m (m/s)": windspeed_series_hub[t_idx],
-                    "Power Output (kW)": power_output_series[t_idx]
-                })
-        df_results = pd.DataFrame(results)
+        st.success(f"{len(df_parks):,} wind parks uploaded!")
+        if rejected:
+            st.warning("Skipped rows: " + "; ".join(f"{count:,} with {reason}" for reason, count in rejected.items()))
+        st.dataframe(df_parks.head(PREVIEW_ROWS))
+        if len(df_parks) > PREVIEW_ROWS:
+            st.caption(f"Showing the first {PREVIEW_ROWS} of {len(df_parks):,} parks.")
+
+        park_job = start_job(("park_results", upload_hash, meps_cycle), partial(park_results, df_parks, upload_hash))
+        track_job("park_job", park_job)
+        fleet = job_result(park_job, "Extracting forecasts at the wind parks")
+
+    if fleet is not None:
+        summary = cached_result(("park_summary", upload_hash, meps_cycle), fleet.summary)
+
+        # Plot total power output of the fleet
+        st.markdown("### Total Power Output of the Fleet")
+        fleet_total = fleet.fleet_total()
+        fig_total = go.Figure(go.Scatter(
+            x=fleet_total["Forecast Time"],
+            y=fleet_total["Fleet Power Output (kW)"],
+            mode="lines+markers",
+            name="Fleet"
+        ))
+        fig_total.update_layout(
+            xaxis_title="Forecast Time",
+            yaxis_title="Fleet Power Output (kW)",
+            height=350,
+            margin={"r":20,"t":40,"l":0,"b":0},
+            plot_bgcolor="white"
+        )
+        st.plotly_chart(fig_total, use_container_width=True)
+
+        # Individual time series only for a readable number of parks, read from the result store
+        plot_rows = None
+        if fleet.n_parks > PLOT_MAX_PARKS:
+            plot_rows = np.argsort(-summary["Mean Power Output (kW)"].fillna(-np.inf).to_numpy())[:PLOT_MAX_PARKS]
+            st.caption(f"Time series below show the {PLOT_MAX_PARKS} parks with the highest mean power output.")
+        df_results = fleet.table(plot_rows)
 
         # Plot power output time series plot
         st.markdown("### Power Output Time Series at Wind Park Locations")
@@ -370,6 +394,20 @@ if uploaded_file is not None:
         )
         st.plotly_chart(fig_ts_ws, use_container_width=True)
 
+        # Aggregated outputs: preview of the per-park summary, complete tables as downloads
+        st.markdown("### Wind Park Summary")
+        st.dataframe(summary.head(PREVIEW_ROWS))
+        col_summary, col_total = st.columns(2)
+        col_summary.download_button(
+            "Download park summary (CSV)",
+            cached_result(("park_summary_csv", upload_hash, meps_cycle), lambda: summary.to_csv(index=False)),
+            file_name=f"park_summary_{meps_cycle}.csv", mime="text/csv"
+        )
+        col_total.download_button(
+            "Download fleet total (CSV)", fleet_total.to_csv(index=False),
+            file_name=f"fleet_power_{meps_cycle}.csv", mime="text/csv"
+        )
+
     # About Section
     st.markdown("---")
     st.subheader("About This Tool")
@@ -391,4 +429,5 @@ This tool provides interactive visualizations of potential wind power production
 """)
 
 else:
+    forget_job("park_job")
     st.info("Upload your wind park coordinates to see site-specific forecasts")
\ No newline at end of file
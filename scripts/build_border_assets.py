@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import glob
+import argparse
+
+from utils.borders import build_border_asset, BORDER_TOLERANCES
+
+# One-time build step: converts Natural Earth country shapefiles into the simplified .npz border
+# assets read by utils.geo.load_country_borders, so plotting does not need geopandas/shapely.
+#   python scripts/build_border_assets.py                      # every data/*.zip
+#   python scripts/build_border_assets.py data/ne_10m_admin_0_countries.zip  # after downloading it from Natural Earth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build simplified country border assets from shapefiles.")
+    parser.add_argument("shapefiles", nargs="*", help="shapefiles or zipped shapefiles (default: data/*.zip)")
+    parser.add_argument("--tolerances", type=float, nargs="+", default=list(BORDER_TOLERANCES),
+                        help="simplification tolerances in degrees, one per zoom level")
+    args = parser.parse_args()
+
+    shapefiles = args.shapefiles or sorted(glob.glob("data/*.zip"))
+    for shapefile_path in shapefiles:
+        path = build_border_asset(shapefile_path, tolerances=args.tolerances)
+        print(f"{shapefile_path}: wrote {path} ({os.path.getsize(path) / 1024**2:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
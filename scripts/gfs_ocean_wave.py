@@ -2,23 +2,39 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils.data import open_opendap_dataset, get_gfs_wave_opendap_url, get_latest_gfs_cycle
+from utils.data import open_opendap_dataset, get_gfs_wave_opendap_url, get_latest_gfs_cycle, PARALLEL_OPENDAP_ENGINE
+from utils.cache import ForecastCache
+from utils.cycles import find_latest_cycle
 from utils.plot import create_plots, add_country_borders
+from utils.export import StreamingHTMLWriter
+from utils.frames import frame_panels, encoded_frames, open_netcdf_fields
+from utils.stats import get_field_stats, color_range
 from utils.geo import load_country_borders
-import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import plotly.io as pio
 import numpy as np
 from datetime import datetime
+from functools import partial
+import webbrowser
 
 # sourcing data
-cycle, yyyymmdd = get_latest_gfs_cycle() # There are 4 cycles of GFS data per day, get the latest cycle
+# There are 4 cycles of GFS data per day, use the newest one published on NOMADS
+latest = find_latest_cycle("gfswave")
+cycle, yyyymmdd = latest if latest is not None else get_latest_gfs_cycle()
 NUM_TIMESTEPS = 17  # Set number of time steps here, t+1 to t+NUM_TIMESTEPS
+QUANTIZED_HTML = True  # store fields as uint8/uint16 codes in the saved HTML (utils/export.py), False for full precision
+OUTPUT_HTML = "wind_speed_and_cloud_cover.html"
 opendap_url = get_gfs_wave_opendap_url(yyyymmdd, cycle) # Get the OPeNDAP URL for the latest cycle
 print(f"Using GFS OPeNDAP URL: {opendap_url}")
 
-# Loading data
-ds = open_opendap_dataset(opendap_url)
+# Downloading data once per cycle into the local cache (concurrent reads, see utils/data.py), the
+# returned dataset is the lazy cached NetCDF: each frame's slabs are read from local disk while the
+# frame is written, so memory stays around one frame however many time steps are animated
+ds = open_opendap_dataset(
+    opendap_url,
+    variables=["windsfc", "htsgwsfc"],
+    time=NUM_TIMESTEPS,
+    model="gfswave", cycle=yyyymmdd + cycle, cache=ForecastCache(), engine=PARALLEL_OPENDAP_ENGINE
+)
 if ds is None:
     print("Failed to open GFS dataset.")
     sys.exit(1)
@@ -39,39 +55,20 @@ if np.any(lon > 180):
 else:
     sort_idx = None
 
-# ANIMATION FRAMES (WIND + WAVE)
-frames = []
-for t in range(NUM_TIMESTEPS):
-    # Extract data for each time step
-    ds_t = ds.isel(time=t)
-    wind = ds_t["windsfc"].values
-    wave = ds_t["htsgwsfc"].values
-
-    if sort_idx is not None:
-        wind = wind[:, sort_idx]
-        wave = wave[:, sort_idx]
-    # Create traces for each subplot
-    frame_data = [
-        create_plots(wind, lon, lat, colorscale='RdYlBu_r', colorbar_x=1.0, colorbar_y=.75, colorbar_len=0.5, zmin=0, zmax=40,text='m/s', hover_label='Wind'),
-        create_plots(wave, lon, lat, colorscale='Blues',colorbar_x=1.0, colorbar_y=0.25, colorbar_len=0.5, zmin=0, zmax=20,text='m', hover_label='Wave'),
-    ]
-    frame_label = time_labels[t]
-    frames.append(go.Frame(
-        data=frame_data,
-        name=frame_label,
-        layout=go.Layout(
-            title_text=f"Wind Speed and significant wave height - Forecast Animation - {frame_label}"
-        )
-    ))
+# Lazy (time, lat, lon) fields of the cached file, nothing is read yet
+field_names = ["windsfc", "htsgwsfc"]
+fields = {name: ds[name] for name in field_names}
 
-# Data for first frame
-init_wind = ds.isel(time=0)["windsfc"].values
-init_wave = ds.isel(time=0)["htsgwsfc"].values
+# Wind and significant wave height per frame, longitudes in -180..180 order.
+panels = [("field", ("windsfc",)), ("field", ("htsgwsfc",))]
+frame_fields = partial(frame_panels, panels=panels, column_order=sort_idx)
 
-if sort_idx is not None:
-    init_wind = init_wind[:, sort_idx]
-    init_wave = init_wave[:, sort_idx]
+# Color scales from per-cycle statistics (computed once per cycle in chunks of time steps, then read from the cache)
+stats = get_field_stats("gfswave", yyyymmdd + cycle, {"windsfc": fields["windsfc"], "htsgwsfc": fields["htsgwsfc"]}, n_times=NUM_TIMESTEPS)
+wind_zmax = color_range(stats["windsfc"], default=(0, 40))[1]
+wave_zmax = color_range(stats["htsgwsfc"], default=(0, 20))[1]
 
+init_wind, init_wave = frame_fields(fields, 0)
 init_time_label = time_labels[0]
 
 # Subplots
@@ -85,16 +82,9 @@ fig = make_subplots(
     )
 )
 
-# Add initial traces for each subplot
-fig.add_trace(create_plots(init_wind, lon, lat, colorscale='RdYlBu_r', colorbar_x=1.0, colorbar_y=.75, colorbar_len=0.5, zmin=0, zmax=35,text='m/s', hover_label='Wind'), row=1, col=1)
-fig.add_trace(create_plots(init_wave, lon, lat, colorscale='Blues', colorbar_x=1.0, colorbar_y=0.25, colorbar_len=0.5, zmin=0, zmax=20,text='m', hover_label='Wave'), row=2, col=1)
-
-# Attach animation frames
-for frame in frames:
-    for trace in frame.data:
-        if isinstance(trace, go.Heatmap):
-            trace.showscale = True
-fig.frames = frames
+# Add initial traces for each subplot; coordinates, colorbars and hover templates live here only
+fig.add_trace(create_plots(init_wind, lon, lat, colorscale='RdYlBu_r', colorbar_x=1.0, colorbar_y=.75, colorbar_len=0.5, zmin=0, zmax=wind_zmax,text='m/s', hover_label='Wind'), row=1, col=1)
+fig.add_trace(create_plots(init_wave, lon, lat, colorscale='Blues', colorbar_x=1.0, colorbar_y=0.25, colorbar_len=0.5, zmin=0, zmax=wave_zmax,text='m', hover_label='Wave'), row=2, col=1)
 
 # Set axis ticks
 xticks = np.linspace(-180, 180, 7)
@@ -121,11 +111,18 @@ world = load_country_borders('data/ne_110m_admin_0_countries.zip')
 add_country_borders(fig, world, row=1, col=1)
 add_country_borders(fig, world, row=2, col=1)
 
-# show and save figure
-pio.renderers.default = "browser"
-fig.show()
-fig.write_html("wind_speed_and_cloud_cover.html")
-
-
-
+# ANIMATION FRAMES (WIND + WAVE): only the z arrays of traces 0-1 change per frame
+# Worker processes read and quantize the frames from the cached file (utils/frames.py), the frames
+# are streamed into the HTML file in order, so only a few frames are held in memory
+with StreamingHTMLWriter(OUTPUT_HTML, fig, encodings={0: "wind", 1: "wave"} if QUANTIZED_HTML else None) as writer:
+    open_fields = partial(open_netcdf_fields, ds.encoding["source"], field_names)
+    frames = encoded_frames(frame_fields, open_fields, NUM_TIMESTEPS, writer.frame_encodings([0, 1]))
+    for t, values in enumerate(frames):
+        frame_label = time_labels[t]
+        writer.add_encoded_frame(
+            frame_label, values, traces=[0, 1],
+            title=f"Wind Speed and significant wave height - Forecast Animation - {frame_label}"
+        )
 
+# open the saved animation in the browser
+webbrowser.open("file://" + os.path.abspath(OUTPUT_HTML))
@@ -3,64 +3,83 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # --- Imports ---
-import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.subplots import make_subplots
 import numpy as np
-from utils.data import open_opendap_dataset
-from utils.plot import create_scatter, add_country_borders
+from utils.data import open_opendap_dataset, fetch_arrays, get_dataset_cycle, PARALLEL_OPENDAP_ENGINE
+from utils.cache import ForecastCache
+from utils.plot import create_scatter, create_plots, add_country_borders, data_frame, CurvilinearRaster
 from utils.geo import load_country_borders
+from utils.pyramid import block_reduce, factor_for_budget
+from utils.stats import get_field_stats, color_range, stats_key
 
 
 # data configuration
 url = "https://thredds.met.no/thredds/dodsC/metpplatest/met_forecast_1_0km_nordic_latest.nc" # Link to the latest MEPS forecast
-stride = 20  # Subsampling step for faster plotting
+stride = 5  # Subsampling step of the download
+max_points = 60000  # Points per panel; the downloaded grid is block-averaged down to this instead of subsampled further
 num_frames = 24  # Number of time steps to animate
+render_mode = "webgl"  # "webgl": WebGL scatter of grid points, "raster": curvilinear grid resampled to a lon/lat heatmap image, "svg": SVG scatter (slow, use stride 20)
+raster_resolution = 0.05  # degrees, raster mode only
 
 # --- Data Loading ---
-ds = open_opendap_dataset(url)
-wind = ds['wind_speed_10m'].isel(time=slice(0, num_frames))
-cloud = ds['cloud_area_fraction'].isel(time=slice(0, num_frames))
-precip = ds['precipitation_amount'].isel(time=slice(0, num_frames))
-temp2m = ds['air_temperature_2m'].isel(time=slice(0, num_frames))  
-times = wind['time'].values
-lat = ds['latitude'].values
-lon = ds['longitude'].values
-
-# Subsample for plotting
-z0 = wind.isel(time=0).values[::stride, ::stride]
-cloud0 = cloud.isel(time=0).values[::stride, ::stride]
-precip0 = precip.isel(time=0).values[::stride, ::stride]
-temp0 = temp2m.isel(time=0).values[::stride, ::stride]
-lat_sub = lat[::stride, ::stride]
-lon_sub = lon[::stride, ::stride]
-
-# --- Animation Frames ---
-frames = []
-for t_idx in range(num_frames):
-    # Subsample and flatten for scatter
-    zf = wind.isel(time=t_idx).values[::stride, ::stride].flatten()
-    cloudf = cloud.isel(time=t_idx).values[::stride, ::stride].flatten()
-    precipf = precip.isel(time=t_idx).values[::stride, ::stride].flatten()
-    tempf = temp2m.isel(time=t_idx).values[::stride, ::stride].flatten()
-    latf = lat[::stride, ::stride].flatten()
-    lonf = lon[::stride, ::stride].flatten()
-    # Clean up values
-    cloudf = np.clip(cloudf, 0, 1)
-    precipf = np.where(~np.isfinite(precipf) | (precipf > 1e4), 0, precipf)
-
-    wind_scatter = create_scatter(zf, lonf, latf, colorscale="RdYlBu_r", cmin=0, cmax=35, colorbar_x=1.01, colorbar_y=7/8, colorbar_len=.22, text='m/s', hover_label='Wind')
-    cloud_scatter = create_scatter(cloudf, lonf, latf, colorscale="Blues", cmin=0, cmax=1, colorbar_x=1.01, colorbar_y=5/8, colorbar_len=.22, text='%', hover_label='Cloud cover')
-    precip_scatter = create_scatter(precipf, lonf, latf, colorscale="PuBuGn", cmin=0, cmax=25, colorbar_x=1.01, colorbar_y=3/8, colorbar_len=.22, text='mm', hover_label='Precipitation')
-    temp_scatter = create_scatter(tempf, lonf, latf, colorscale="OrRd", cmin=250, cmax=320, colorbar_x=1.01, colorbar_y=1/8, colorbar_len=.22, text='K', hover_label='2m Temp')
-
-    # Add frame
-    frame = go.Frame(
-        data=[wind_scatter, cloud_scatter, precip_scatter, temp_scatter],
-        name=str(times[t_idx]),
-        layout=go.Layout(title_text=f"MEPS Forecast: Wind, Cloud, Precip, 2m Temp at {str(times[t_idx])}")
-    )
-    frames.append(frame)
+# Subsampling happens in the OPeNDAP request, so only every stride-th point is transferred
+ds = open_opendap_dataset(
+    url,
+    variables=["wind_speed_10m", "cloud_area_fraction", "precipitation_amount", "air_temperature_2m"],
+    time=num_frames, stride=stride,
+    model="meps", cache=ForecastCache(), engine=PARALLEL_OPENDAP_ENGINE
+)
+fields = fetch_arrays(ds, ["wind_speed_10m", "cloud_area_fraction", "precipitation_amount", "air_temperature_2m"])
+# Clean up values
+fields['cloud_area_fraction'] = np.clip(fields['cloud_area_fraction'], 0, 1)
+fields['precipitation_amount'] = np.where(~np.isfinite(fields['precipitation_amount']) | (fields['precipitation_amount'] > 1e4), 0, fields['precipitation_amount'])
+
+# Area-average blocks down to the point budget (keeps the field's mean, unlike skipping points)
+factor = factor_for_budget(ds['latitude'].shape, max_points)
+wind = block_reduce(fields['wind_speed_10m'], factor)
+cloud = block_reduce(fields['cloud_area_fraction'], factor)
+precip = block_reduce(fields['precipitation_amount'], factor)
+temp2m = block_reduce(fields['air_temperature_2m'], factor)
+times = ds['time'].values
+lat = block_reduce(ds['latitude'].values, factor)
+lon = block_reduce(ds['longitude'].values, factor)
+lat_sub = lat.flatten()
+lon_sub = lon.flatten()
+
+# Color scales from per-cycle statistics of the downloaded fields (computed once per cycle, then read from the cache),
+# precipitation keyed with its cleanup above (invalid values set to 0), the products store it with other settings
+precip_key = stats_key("precipitation_amount", valid_max=1e4, fill=0)
+stats = get_field_stats("meps", get_dataset_cycle(ds), {
+    "wind_speed_10m": fields["wind_speed_10m"],
+    precip_key: fields["precipitation_amount"],
+    "air_temperature_2m": fields["air_temperature_2m"],
+})
+wind_range = color_range(stats["wind_speed_10m"], default=(0, 35))
+precip_range = color_range(stats[precip_key], default=(0, 25))
+temp_range = color_range(stats["air_temperature_2m"], low="p1", default=(250, 320))
+
+# One entry per subplot row: (field, colorscale, cmin, cmax, colorbar_y, unit, hover label)
+panels = [
+    (wind, "RdYlBu_r", *wind_range, 7/8, 'm/s', 'Wind'),
+    (cloud, "Blues", 0, 1, 5/8, '%', 'Cloud cover'),
+    (precip, "PuBuGn", *precip_range, 3/8, 'mm', 'Precipitation'),
+    (temp2m, "OrRd", *temp_range, 1/8, 'K', '2m Temp'),
+]
+
+if render_mode == "raster":
+    raster = CurvilinearRaster(lat, lon, resolution=raster_resolution)
+
+def panel_traces(t_idx):
+    traces = []
+    for field, colorscale, cmin, cmax, colorbar_y, unit, label in panels:
+        if render_mode == "raster":
+            traces.append(create_plots(raster.regrid(field[t_idx]), raster.lon, raster.lat, colorscale=colorscale,
+                                       colorbar_x=1.01, colorbar_y=colorbar_y, colorbar_len=.22, zmin=cmin, zmax=cmax, text=unit, hover_label=label))
+        else:
+            traces.append(create_scatter(field[t_idx].flatten(), lon_sub, lat_sub, colorscale=colorscale, cmin=cmin, cmax=cmax,
+                                         colorbar_x=1.01, colorbar_y=colorbar_y, colorbar_len=.22, text=unit, hover_label=label, render=render_mode))
+    return traces
 
 # Initial figure 
 fig_anim = make_subplots(
@@ -75,27 +94,21 @@ fig_anim = make_subplots(
     )
 )
 
-# Row 1: Wind speed
-z0 = z0.flatten()
-lon_sub = lon_sub.flatten()
-lat_sub = lat_sub.flatten()
-wind_scatter = create_scatter(z0, lon_sub, lat_sub, colorscale="RdYlBu_r", cmin=0, cmax=35, colorbar_x=1.01, colorbar_y=7/8, colorbar_len=.22, text='m/s', hover_label='Wind')
-fig_anim.add_trace(wind_scatter, row=1, col=1)
-
-# Row 2: Cloud area fraction
-cloud0_clean = np.clip(cloud0.flatten(), 0, 1)
-cloud_scatter = create_scatter(cloud0_clean, lon_sub, lat_sub, colorscale="Blues", cmin=0, cmax=1, colorbar_x=1.01, colorbar_y=5/8, colorbar_len=.22, text='%', hover_label='Cloud cover')
-fig_anim.add_trace(cloud_scatter, row=2, col=1)
+# Rows 1-4: wind speed, cloud area fraction, precipitation amount, 2m air temperature
+for row, trace in enumerate(panel_traces(0), start=1):
+    fig_anim.add_trace(trace, row=row, col=1)
 
-# Row 3: Precipitation amount
-precip0_clean = np.where(~np.isfinite(precip0.flatten()) | (precip0.flatten() > 1e4), 0, precip0.flatten())
-precip_scatter = create_scatter(precip0_clean, lon_sub, lat_sub, colorscale="PuBuGn", cmin=0, cmax=25, colorbar_x=1.01, colorbar_y=3/8, colorbar_len=.22, text='mm', hover_label='Precipitation')
-fig_anim.add_trace(precip_scatter, row=3, col=1)
+# --- Animation Frames ---
+# Frames only carry the changing z / marker.color of traces 0-3
+def panel_values(t_idx):
+    if render_mode == "raster":
+        return [raster.regrid(field[t_idx]) for field, *_ in panels]
+    return [field[t_idx].ravel() for field, *_ in panels]
 
-# Row 4: 2m Air Temperature
-temp0_clean = temp0.flatten()
-temp_scatter = create_scatter(temp0_clean, lon_sub, lat_sub, colorscale="OrRd", cmin=250, cmax=320, colorbar_x=1.01, colorbar_y=1/8, colorbar_len=.22, text='K', hover_label='2m Temp')
-fig_anim.add_trace(temp_scatter, row=4, col=1)
+frames = []
+for t_idx in range(num_frames):
+    frames.append(data_frame(fig_anim, str(times[t_idx]), panel_values(t_idx), traces=[0, 1, 2, 3],
+                             title=f"MEPS Forecast: Wind, Cloud, Precip, 2m Temp at {str(times[t_idx])}"))
 
 # --- Final Layout and Show ---
 fig_anim.frames = frames
@@ -109,12 +122,15 @@ fig_anim.update_layout(
             ])]
 )
 
-# --- Country Borders ---
-world = load_country_borders('data/ne_10m_admin_0_countries.zip', bbox=(lon_sub.min(), lat_sub.min(), lon_sub.max(), lat_sub.max()))
+# --- Country Borders --- (bundled 1:110m; ne_10m_admin_0_countries.zip from Natural Earth gives coastline detail)
+world = load_country_borders('data/ne_110m_admin_0_countries.zip', bbox=(lon_sub.min(), lat_sub.min(), lon_sub.max(), lat_sub.max()))
 add_country_borders(fig_anim, world, row=1, col=1)
 add_country_borders(fig_anim, world, row=2, col=1)
 add_country_borders(fig_anim, world, row=3, col=1)
 add_country_borders(fig_anim, world, row=4, col=1)
+# Axes fixed to the data extent, border lines running past the edge are cut there
+fig_anim.update_xaxes(range=[lon_sub.min(), lon_sub.max()])
+fig_anim.update_yaxes(range=[lat_sub.min(), lat_sub.max()])
 
 pio.renderers.default = "browser"
 fig_anim.show()
\ No newline at end of file
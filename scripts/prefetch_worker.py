@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import argparse
+
+from utils.data import open_opendap_dataset, get_gfs_opendap_url, get_gfs_wave_opendap_url, PARALLEL_OPENDAP_ENGINE
+from utils.cache import ForecastCache
+from utils.cycles import find_latest_cycle
+from utils.products import open_meps_map_data, build_wind_power_map, write_product, WIND_POWER_MAP
+from utils.transport import STATS
+
+# Long running worker: watches for new MEPS (hourly) and GFS (6-hourly) cycles, pulls the fields
+# the apps and animation scripts use into the forecast cache and precomputes derived products,
+# so user facing runs only read from local disk.
+#   python scripts/prefetch_worker.py            # keep watching
+#   python scripts/prefetch_worker.py --once     # single pass, e.g. from cron
+
+POLL_SECONDS = 300
+
+# Same requests as scripts/gfs_atmos_animations.py and scripts/gfs_ocean_wave.py, so they hit the cache
+GFS_ATMOS_VARIABLES = ["ugrd10m", "vgrd10m", "tcdcclm", "apcpsfc", "pwatclm"]
+GFS_ATMOS_TIMESTEPS = 20
+GFS_WAVE_VARIABLES = ["windsfc", "htsgwsfc"]
+GFS_WAVE_TIMESTEPS = 17
+
+
+def prefetch_meps(cycle, yyyymmdd, cache):
+    ds_map = open_meps_map_data(cache, cycle=yyyymmdd + cycle)
+    if ds_map is None:
+        return False
+    product = build_wind_power_map(ds_map)
+    if product.attrs["forecast_cycle"] != yyyymmdd + cycle:
+        print(f"MEPS data holds cycle {product.attrs['forecast_cycle']}, not {yyyymmdd}{cycle}, retrying later")
+        return False
+    path = write_product(WIND_POWER_MAP, product)
+    print(f"MEPS {product.attrs['forecast_cycle']}: wrote {path}")
+    return True
+
+
+def prefetch_gfs(cycle, yyyymmdd, cache):
+    ds = open_opendap_dataset(
+        get_gfs_opendap_url(yyyymmdd, cycle), variables=GFS_ATMOS_VARIABLES, time=GFS_ATMOS_TIMESTEPS,
+        model="gfs", cycle=yyyymmdd + cycle, cache=cache, engine=PARALLEL_OPENDAP_ENGINE
+    )
+    return ds is not None
+
+
+def prefetch_gfswave(cycle, yyyymmdd, cache):
+    ds = open_opendap_dataset(
+        get_gfs_wave_opendap_url(yyyymmdd, cycle), variables=GFS_WAVE_VARIABLES, time=GFS_WAVE_TIMESTEPS,
+        model="gfswave", cycle=yyyymmdd + cycle, cache=cache, engine=PARALLEL_OPENDAP_ENGINE
+    )
+    return ds is not None
+
+
+PREFETCHERS = {
+    "meps": prefetch_meps,
+    "gfs": prefetch_gfs,
+    "gfswave": prefetch_gfswave,
+}
+
+
+def run_once(done, cache):
+    for model, prefetch in PREFETCHERS.items():
+        latest = find_latest_cycle(model)
+        if latest is None or done.get(model) == latest:
+            continue
+        cycle, yyyymmdd = latest
+        print(f"New {model} cycle {yyyymmdd}{cycle}, prefetching")
+        try:
+            if prefetch(cycle, yyyymmdd, cache):
+                done[model] = latest
+        except Exception as e:
+            print(f"Error prefetching {model} {yyyymmdd}{cycle}: {e}")
+    print(f"Transport: {STATS.as_dict()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch new forecast cycles and precompute app products.")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--interval", type=int, default=POLL_SECONDS, help="seconds between polls")
+    args = parser.parse_args()
+
+    cache = ForecastCache()
+    done = {}
+    while True:
+        run_once(done, cache)
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
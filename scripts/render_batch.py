@@ -0,0 +1,63 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import argparse
+
+from utils.cache import ForecastCache
+from utils.render import ModelData, render_product, DEFAULT_MEPS_STRIDE
+from utils.transport import STATS
+
+# Headless batch rendering of animation products, e.g. nightly from cron:
+#   python scripts/render_batch.py config/render_batch.json
+#   python scripts/render_batch.py config/render_batch.json --products gfs_atmos --output-dir /srv/renders
+# Products of the same model (and MEPS stride) share one dataset open and download, the
+# per-cycle statistics and the country borders. See config/render_batch.json for the format.
+
+
+def data_key(product):
+    return product["model"], product.get("stride", DEFAULT_MEPS_STRIDE) if product["model"] == "meps" else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render forecast animation products to HTML without a browser.")
+    parser.add_argument("config", help="JSON file with output_dir, quantize and a list of products")
+    parser.add_argument("--products", nargs="+", help="only render the products with these names")
+    parser.add_argument("--output-dir", help="overrides output_dir of the config")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    products = [p for p in config["products"] if not args.products or p["name"] in args.products]
+    output_dir = args.output_dir or config.get("output_dir", "renders")
+    quantize = config.get("quantize", True)
+
+    # One dataset per model with every variable and the longest horizon any of its products needs
+    groups = {}
+    for product in products:
+        groups.setdefault(data_key(product), []).append(product)
+
+    cache = ForecastCache()
+    failed = 0
+    for (model, stride), group in groups.items():
+        variables = {v for product in group for panel in product["panels"] for v in panel["variables"]}
+        time_steps = max(product.get("time_steps", 20) for product in group)
+        data = ModelData(model, variables, time_steps, stride=stride, cache=cache)
+        if data.fields is None:
+            print(f"Failed to open {model} dataset, skipping {[p['name'] for p in group]}")
+            failed += len(group)
+            continue
+        for product in group:
+            try:
+                path = render_product(product, data, output_dir, quantize=quantize)
+                print(f"{product['name']}: wrote {path}")
+            except Exception as e:
+                print(f"Error rendering {product['name']}: {e}")
+                failed += 1
+    print(f"Transport: {STATS.as_dict()}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from utils.cache import ForecastCache
+from utils.data import open_opendap_dataset
+
+# A directory of synthetic NetCDF files stands in for the OPeNDAP server: the files are opened
+# through the same code path (engine="netcdf4" reads local paths and DAP URLs alike).
+VARIABLES = ["windsfc", "htsgwsfc"]
+
+
+def make_forecast(cycle, n_times=6, n_lat=10, n_lon=20):
+    start = pd.Timestamp(f"{cycle[:8]}T{cycle[8:]}")
+    rng = np.random.default_rng(int(cycle))
+    shape = (n_times, n_lat, n_lon)
+    return xr.Dataset(
+        {name: (("time", "lat", "lon"), rng.random(shape, dtype=np.float32)) for name in VARIABLES},
+        coords={
+            "time": pd.date_range(start, periods=n_times, freq="3h"),
+            "lat": np.linspace(50, 70, n_lat),
+            "lon": np.linspace(0, 30, n_lon),
+        },
+    )
+
+
+@pytest.fixture
+def server(tmp_path):
+    server_dir = tmp_path / "server"
+    server_dir.mkdir()
+    urls = {}
+    for cycle in ["2026101500", "2026101506"]:
+        urls[cycle] = str(server_dir / f"gfswave_{cycle}.nc")
+        make_forecast(cycle).to_netcdf(urls[cycle])
+    return urls
+
+
+def open_cycle(url, cycle, cache, **selection):
+    return open_opendap_dataset(url, variables=["windsfc"], model="gfswave", cycle=cycle,
+                                cache=cache, engine="netcdf4", **selection)
+
+
+def test_open_is_served_from_cache(tmp_path, server):
+    cache = ForecastCache(str(tmp_path / "cache"))
+    url = server["2026101500"]
+    expected = make_forecast("2026101500")["windsfc"].values[:3]
+
+    ds = open_cycle(url, "2026101500", cache, time=3)
+    np.testing.assert_array_equal(ds["windsfc"].values, expected)
+    assert ds.attrs["forecast_cycle"] == "2026101500"
+    ds.close()
+
+    # the second open does not touch the server
+    os.remove(url)
+    ds = open_cycle(url, "2026101500", cache, time=3)
+    np.testing.assert_array_equal(ds["windsfc"].values, expected)
+    ds.close()
+
+
+def test_new_cycle_drops_older_cycles(tmp_path, server):
+    cache = ForecastCache(str(tmp_path / "cache"))
+    open_cycle(server["2026101500"], "2026101500", cache, time=3).close()
+    open_cycle(server["2026101506"], "2026101506", cache, time=3).close()
+
+    assert cache.get("gfswave", "2026101500", ["windsfc"], {"_time": 3}) is None
+    cached = cache.get("gfswave", "2026101506", ["windsfc"], {"_time": 3})
+    assert cached is not None
+    cached.close()
+    assert [name for name in os.listdir(cache.cache_dir) if name.startswith("gfswave_2026101500")] == []
+
+
+def test_evicts_least_recently_used(tmp_path, server):
+    cache = ForecastCache(str(tmp_path / "cache"))
+    url = server["2026101506"]
+
+    def rows(start):
+        # equally sized selections, one cache entry each
+        return {"isel": {"lat": slice(start, start + 5)}}
+
+    for start in (0, 1, 2):
+        open_cycle(url, "2026101506", cache, **rows(start)).close()
+    entry_size = max(entry["size"] for entry in cache._read_index().values())
+
+    # room for two entries: rows(0) is read again, so rows(1) and rows(2) are the least recently used
+    cache.max_bytes = 2 * entry_size + entry_size // 2
+    cache.get("gfswave", "2026101506", ["windsfc"], rows(0)["isel"]).close()
+    open_cycle(url, "2026101506", cache, **rows(3)).close()
+
+    assert len(cache._read_index()) == 2
+    for start, kept in ((0, True), (1, False), (2, False), (3, True)):
+        ds = cache.get("gfswave", "2026101506", ["windsfc"], rows(start)["isel"])
+        assert (ds is not None) == kept
+        if ds is not None:
+            ds.close()
+
+
+def _put_selections(args):
+    cache_dir, url, times = args
+    cache = ForecastCache(cache_dir)
+    for time in times:
+        open_cycle(url, "2026101506", cache, time=time).close()
+
+
+def test_concurrent_processes_share_the_index(tmp_path, server):
+    cache_dir = str(tmp_path / "cache")
+    url = server["2026101506"]
+    # every process writes one selection of its own and one that all of them write
+    jobs = [(cache_dir, url, [time, 6]) for time in (1, 2, 3, 4)]
+    with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+        pool.map(_put_selections, jobs)
+
+    cache = ForecastCache(cache_dir)
+    index = cache._read_index()
+    assert len(index) == 5
+    for entry in index.values():
+        assert os.path.getsize(os.path.join(cache_dir, entry["file"])) == entry["size"]
+    assert [name for name in os.listdir(cache_dir) if name.endswith(".tmp")] == []
+    for time in (1, 2, 3, 4, 6):
+        ds = cache.get("gfswave", "2026101506", ["windsfc"], {"_time": time})
+        assert ds.sizes["time"] == time
+        ds.close()
@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import threading
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils import cycles
+from utils.cycles import find_latest_cycle
+
+NOW = datetime(2026, 10, 15, 14, 30)  # candidates with lookback_hours=12: 12z, 06z, 00z
+
+
+class DodsHandler(BaseHTTPRequestHandler):
+    """
+    Answers <dataset>.das like a GrADS DODS server: a DAS for published datasets,
+    200 with an error page for the others.
+    """
+    published = set()
+    hits = Counter()
+
+    def do_GET(self):
+        dataset = self.path[:-len(".das")] if self.path.endswith(".das") else None
+        self.hits[dataset] += 1
+        body = b"Attributes {\n}\n" if dataset in self.published else b"<html><b>GrADS Data Server - error</b></html>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(cycles, "CATALOG_PATH", str(tmp_path / "catalog.json"))
+    monkeypatch.setattr(cycles, "_catalog", None)
+    monkeypatch.setattr(cycles, "_catalog_mtime", None)
+    DodsHandler.published = {"/gfs20261015/gfs_0p25_00z", "/gfs20261015/gfs_0p25_06z"}
+    DodsHandler.hits = Counter()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), DodsHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def latest(server):
+    def url_for(yyyymmdd, cycle):
+        return f"{server}/gfs{yyyymmdd}/gfs_0p25_{cycle}z"
+    return find_latest_cycle("gfs", now=NOW, lookback_hours=12, url_for=url_for)
+
+
+def test_finds_newest_published_cycle(server):
+    assert latest(server) == ("06", "20261015")
+    # the error page of the unpublished 12z cycle is not taken for a dataset
+    assert DodsHandler.hits["/gfs20261015/gfs_0p25_12z"] == 1
+
+
+def test_catalog_skips_the_network(server):
+    latest(server)
+    probes = sum(DodsHandler.hits.values())
+    assert latest(server) == ("06", "20261015")
+    assert sum(DodsHandler.hits.values()) == probes
+    assert [name for name in os.listdir(os.path.dirname(cycles.CATALOG_PATH)) if name.endswith(".tmp")] == []
+
+
+def test_missing_cycle_is_probed_again(server, monkeypatch):
+    latest(server)
+    DodsHandler.published.add("/gfs20261015/gfs_0p25_12z")
+    assert latest(server) == ("06", "20261015")  # still within MISSING_TTL
+    monkeypatch.setattr(cycles, "MISSING_TTL", -1)
+    assert latest(server) == ("12", "20261015")
+    assert DodsHandler.hits["/gfs20261015/gfs_0p25_06z"] == 1
+
+
+def test_catalog_written_by_another_process_is_read(server):
+    latest(server)
+    # e.g. the prefetch worker found the 12z cycle meanwhile
+    with open(cycles.CATALOG_PATH) as f:
+        catalog = json.load(f)
+    entry = catalog[f"{server}/gfs20261015/gfs_0p25_12z"]
+    entry["available"] = True
+    with open(cycles.CATALOG_PATH, "w") as f:
+        json.dump(catalog, f)
+    stat = os.stat(cycles.CATALOG_PATH)
+    os.utime(cycles.CATALOG_PATH, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert latest(server) == ("12", "20261015")
+    assert DodsHandler.hits["/gfs20261015/gfs_0p25_12z"] == 1
@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import json
+import base64
+
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+
+from utils.export import quantize, write_quantized_html, NAN_CODES
+
+
+def dequantize(encoded):
+    # Python port of decodeQuantized (DECODER_JS)
+    codes = np.frombuffer(base64.b64decode(encoded["q"]), dtype="<u2" if encoded["dtype"] == "uint16" else "u1")
+    nan_code = NAN_CODES[encoded["dtype"]]
+    step = (encoded["hi"] - encoded["lo"]) / (nan_code - 1)
+    values = np.where(codes == nan_code, np.nan, encoded["lo"] + codes * step)
+    return values.reshape(encoded["shape"])
+
+
+@pytest.mark.parametrize("dtype,lo,hi", [("uint8", 0, 35), ("uint16", 0, 25), ("uint16", 250, 320)])
+def test_round_trip_error_is_half_a_step(dtype, lo, hi):
+    rng = np.random.default_rng(0)
+    values = rng.uniform(lo, hi, (30, 40))
+    decoded = dequantize(quantize(values, lo, hi, dtype))
+    assert decoded.shape == values.shape
+    step = (hi - lo) / (NAN_CODES[dtype] - 1)
+    assert np.abs(decoded - values).max() <= step / 2 + 1e-9
+    # the range ends are exact
+    np.testing.assert_allclose(dequantize(quantize([lo, hi], lo, hi, dtype)), [lo, hi], atol=1e-9)
+
+
+def test_out_of_range_and_missing_values():
+    values = np.array([[-5.0, np.nan], [40.0, np.inf]])
+    decoded = dequantize(quantize(values, 0, 35, "uint8"))
+    assert decoded[0, 0] == 0
+    assert decoded[1, 0] == 35
+    assert np.isnan(decoded[0, 1]) and np.isnan(decoded[1, 1])
+
+
+def test_empty_range():
+    decoded = dequantize(quantize(np.full(4, 3.0), 3.0, 3.0, "uint8"))
+    np.testing.assert_array_equal(decoded, np.full(4, 3.0))
+
+
+def test_html_frames_are_quantized_against_the_trace_range(tmp_path):
+    rng = np.random.default_rng(1)
+    fields = rng.uniform(0, 35, (3, 5, 6))
+    fig = go.Figure(go.Heatmap(z=fields[0], zmin=0, zmax=35))
+    fig.frames = [go.Frame(data=[go.Heatmap(z=field)], traces=[0], name=str(t)) for t, field in enumerate(fields)]
+    path = write_quantized_html(fig, str(tmp_path / "figure.html"), {0: "wind"}, include_plotlyjs=False)
+    with open(path) as f:
+        html = f.read()
+    # the base trace, then every frame
+    encoded = [json.loads(match) for match in re.findall(r'"__quantized__":(\{[^{}]*\})', html)]
+    assert len(encoded) == 4
+    step = 35 / (NAN_CODES["uint8"] - 1)
+    for field, value in zip([fields[0]] + list(fields), encoded):
+        assert (value["lo"], value["hi"]) == (0, 35)
+        assert np.abs(dequantize(value) - field).max() <= step / 2 + 1e-9
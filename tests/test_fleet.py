@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from utils.fleet import validate_parks, fleet_forecast
+from utils.geo import GridIndex
+from utils.power import fleet_power, DEFAULT_TURBINE_HEIGHT
+
+
+def park_rows(n_parks, rng):
+    return pd.DataFrame({
+        "Longitude": rng.uniform(5, 15, n_parks),
+        "Latitude": rng.uniform(57, 65, n_parks),
+        "RotorRadius_m": rng.uniform(40, 80, n_parks),
+        "RatedPower_kW": rng.uniform(2000, 8000, n_parks),
+        "CutInWind_mps": np.full(n_parks, 3.0),
+        "RatedWind_mps": np.full(n_parks, 12.0),
+        "CutoffWind_mps": np.full(n_parks, 25.0),
+    }).astype(np.float32)
+
+
+def meps_like_dataset(n_times=6):
+    rng = np.random.default_rng(0)
+    yy, xx = np.meshgrid(np.arange(40), np.arange(30), indexing="ij")
+    dims = ("time", "y", "x")
+    shape = (n_times, 40, 30)
+    return xr.Dataset(
+        {
+            "wind_speed_10m": (dims, rng.uniform(0, 25, shape).astype(np.float32)),
+            "air_temperature_2m": (dims, rng.uniform(260, 300, shape).astype(np.float32)),
+            "air_pressure_at_sea_level": (dims, rng.uniform(97000, 104000, shape).astype(np.float32)),
+        },
+        coords={
+            "time": pd.date_range("2026-10-15", periods=n_times, freq="h"),
+            "latitude": (("y", "x"), 55 + 0.25 * yy),
+            "longitude": (("y", "x"), 2 + 0.5 * xx),
+        },
+    )
+
+
+def test_validate_parks_defaults_and_rejections():
+    df = park_rows(6, np.random.default_rng(0))
+    df["TurbineHeight"] = [120, np.nan, 90, 90, 90, 90]
+    df.loc[2, "Latitude"] = 95                            # coordinates out of range
+    df.loc[3, "RatedPower_kW"] = 0                        # non-positive rated power
+    df.loc[4, "RatedWind_mps"] = 2                        # below cut-in
+    df.loc[5, ["RotorRadius_m", "Latitude"]] = [np.nan, 95]  # counted once, under its first failed check
+
+    valid, missing, reasons = validate_parks(df)
+    assert missing == []
+    assert list(valid.index) == [0, 1]  # upload row numbers are kept
+    assert valid.loc[1, "TurbineHeight"] == DEFAULT_TURBINE_HEIGHT
+    np.testing.assert_allclose(valid["RotorArea_m2"], np.pi * valid["RotorRadius_m"] ** 2, rtol=1e-6)
+    assert reasons == {
+        "missing or non-numeric values": 1,
+        "coordinates out of range": 1,
+        "non-positive rotor radius, rated power or hub height": 1,
+        "wind speeds not ordered cut-in < rated <= cut-off": 1,
+    }
+
+
+def test_validate_parks_reports_missing_columns():
+    _, missing, _ = validate_parks(park_rows(2, np.random.default_rng(0)).drop(columns=["RatedPower_kW"]))
+    assert missing == ["RatedPower_kW"]
+
+
+@pytest.mark.parametrize("chunk_parks", [1, 7, 1000])
+def test_fleet_forecast_chunks_match_one_pass(tmp_path, chunk_parks):
+    ds = meps_like_dataset()
+    df_parks, _, _ = validate_parks(park_rows(23, np.random.default_rng(1)))
+    grid_index = GridIndex(ds["latitude"].values, ds["longitude"].values)
+    times = ds["time"].values
+    calls = []
+    results = fleet_forecast(ds, df_parks, times, grid_index, "fleet", chunk_parks=chunk_parks,
+                             store_dir=str(tmp_path), progress=lambda done, total: calls.append((done, total)))
+
+    # the same parks in one fleet_power call
+    y, x, _ = grid_index.query(df_parks["Latitude"].values, df_parks["Longitude"].values)
+    point = {name: ds[name].values[:, y, x].T for name in ds.data_vars}
+    wind_hub, power_kw = fleet_power(df_parks, point["wind_speed_10m"], temp=point["air_temperature_2m"],
+                                     pres=point["air_pressure_at_sea_level"])
+    np.testing.assert_allclose(results.column("wind10"), point["wind_speed_10m"], rtol=1e-6)
+    np.testing.assert_allclose(results.column("wind_hub"), wind_hub, rtol=1e-5)
+    np.testing.assert_allclose(results.column("power_kw"), power_kw, rtol=1e-5, atol=1e-3)
+    np.testing.assert_allclose(results.fleet_total()["Fleet Power Output (kW)"], power_kw.sum(axis=0), rtol=1e-5)
+    np.testing.assert_allclose(results.summary()["Max Power Output (kW)"], power_kw.max(axis=1), rtol=1e-5, atol=1e-3)
+    assert calls[-1] == (23, 23)
+    assert len(calls) == -(-23 // chunk_parks)
+    assert len(results.table(rows=[0, 5])) == 2 * len(times)
+
+
+def test_fleet_forecast_reuses_the_store(tmp_path):
+    ds = meps_like_dataset()
+    df_parks, _, _ = validate_parks(park_rows(5, np.random.default_rng(2)))
+    grid_index = GridIndex(ds["latitude"].values, ds["longitude"].values)
+    first = fleet_forecast(ds, df_parks, ds["time"].values, grid_index, "fleet", store_dir=str(tmp_path))
+    # an existing store is opened without reading the dataset
+    again = fleet_forecast(None, df_parks, ds["time"].values, grid_index, "fleet", store_dir=str(tmp_path))
+    np.testing.assert_array_equal(again.column("power_kw"), first.column("power_kw"))
+    assert os.listdir(str(tmp_path)) == ["fleet"]
@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from utils.frames import frame_panels, encoded_frames, open_netcdf_fields
+
+PANELS = [("speed", ("u", "v")), ("field", ("h",))]
+
+
+def write_fields(path, n_times=5):
+    rng = np.random.default_rng(0)
+    dims = ("time", "lat", "lon")
+    shape = (n_times, 6, 8)
+    xr.Dataset(
+        {"u": (dims, rng.normal(size=shape)), "v": (dims, rng.normal(size=shape)),
+         "h": (dims, np.where(rng.random(shape) < 0.1, np.nan, rng.random(shape) * 10))},
+        coords={"time": pd.date_range("2026-10-15", periods=n_times, freq="3h"),
+                "lat": np.linspace(50, 60, 6), "lon": np.linspace(0, 14, 8)},
+    ).to_netcdf(path)
+
+
+def test_pool_matches_serial(tmp_path):
+    path = str(tmp_path / "fields.nc")
+    write_fields(path)
+    open_fields = partial(open_netcdf_fields, path, ["u", "v", "h"])
+    frame_fn = partial(frame_panels, panels=PANELS)
+    # first panel quantized, second sent as floats
+    encodings = [(0.0, 5.0, "uint8"), None]
+
+    serial = list(encoded_frames(frame_fn, open_fields, 5, encodings, max_workers=1))
+    pooled = list(encoded_frames(frame_fn, open_fields, 5, encodings, max_workers=2))
+
+    assert len(serial) == len(pooled) == 5
+    fields = open_fields()
+    for t, (a, b) in enumerate(zip(serial, pooled)):
+        assert a[0] == b[0]
+        np.testing.assert_array_equal(a[1], b[1])
+        np.testing.assert_array_equal(b[1], frame_fn(fields, t)[1])
@@ -0,0 +1,67 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from utils.geo import GridIndex, get_grid_index, EARTH_RADIUS_KM
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def brute_force(grid_lat, grid_lon, lats, lons):
+    # distance from every point to every grid cell, the nearest one wins
+    dist = haversine_km(lats[:, None], lons[:, None], grid_lat.ravel()[None, :], grid_lon.ravel()[None, :])
+    flat = dist.argmin(axis=1)
+    y, x = np.unravel_index(flat, grid_lat.shape)
+    return y, x, dist[np.arange(len(lats)), flat]
+
+
+def test_regular_grid_matches_brute_force():
+    lat = np.linspace(-90, 90, 37)
+    lon = np.arange(0, 360, 5.0)
+    rng = np.random.default_rng(0)
+    lats, lons = rng.uniform(-89, 89, 200), rng.uniform(0, 360, 200)
+    y, x, dist = GridIndex(lat, lon).query(lats, lons)
+    grid_lat, grid_lon = np.meshgrid(lat, lon, indexing="ij")
+    _, _, expected_dist = brute_force(grid_lat, grid_lon, lats, lons)
+    # ties between equally near cells may pick either, the distance is what matters
+    np.testing.assert_allclose(dist, expected_dist, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(haversine_km(lats, lons, lat[y], lon[x]), dist, rtol=1e-6, atol=1e-6)
+
+
+def test_curvilinear_grid_at_high_latitude():
+    # rotated, MEPS-like 2D coordinates
+    yy, xx = np.meshgrid(np.arange(40), np.arange(30), indexing="ij")
+    grid_lat = 55 + 0.25 * yy + 0.05 * xx
+    grid_lon = 0 + 0.5 * xx - 0.1 * yy
+    rng = np.random.default_rng(1)
+    lats, lons = rng.uniform(58, 64, 100), rng.uniform(2, 10, 100)
+    y, x, dist = GridIndex(grid_lat, grid_lon).query(lats, lons)
+    ey, ex, expected_dist = brute_force(grid_lat, grid_lon, lats, lons)
+    np.testing.assert_array_equal(y, ey)
+    np.testing.assert_array_equal(x, ex)
+    np.testing.assert_allclose(dist, expected_dist, rtol=1e-6)
+
+
+def test_wraps_around_the_dateline():
+    lat = np.linspace(-10, 10, 5)
+    lon = np.arange(0, 360, 1.0)
+    y, x, dist = GridIndex(lat, lon).query([0.0, 0.0], [-0.2, 359.8])
+    assert list(x) == [0, 0]
+    assert list(y) == [2, 2]
+    np.testing.assert_allclose(dist, haversine_km(0, 0, 0, 0.2), rtol=1e-6)
+
+
+def test_scalar_query_and_reuse():
+    lat = np.linspace(50, 70, 21)
+    lon = np.linspace(0, 30, 31)
+    index = get_grid_index(lat, lon)
+    assert get_grid_index(lat.copy(), lon.copy()) is index
+    y, x, dist = index.query(60.0, 10.0)
+    assert (y[0], x[0]) == (10, 10)
+    assert dist[0] < 1e-6
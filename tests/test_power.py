@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from utils.power import fleet_power
+
+
+def make_parks(n_parks, rng):
+    radius = rng.uniform(40, 80, n_parks)
+    return pd.DataFrame({
+        "TurbineHeight": rng.uniform(80, 150, n_parks),
+        "WindShear": rng.uniform(0.1, 0.2, n_parks),
+        "Efficiency": rng.uniform(0.35, 0.5, n_parks),
+        "RotorRadius_m": radius,
+        "RotorArea_m2": np.pi * radius ** 2,
+        "RatedPower_kW": rng.uniform(2000, 8000, n_parks),
+        "CutInWind_mps": rng.uniform(2.5, 4, n_parks),
+        "RatedWind_mps": rng.uniform(11, 14, n_parks),
+        "CutoffWind_mps": rng.uniform(24, 26, n_parks),
+    })
+
+
+def scalar_power(row, wind10, temp=None, pres=None):
+    # the per-park, per-time-step loop fleet_power replaced
+    wind_hub = wind10 * (row["TurbineHeight"] / 10) ** row["WindShear"]
+    rho = pres / (287.05 * temp) if temp is not None else np.full_like(wind_hub, 1.225)
+    available = 0.5 * rho * row["RotorArea_m2"] * wind_hub ** 3 * row["Efficiency"]
+    power = []
+    for ws, wp in zip(wind_hub, available):
+        if ws < row["CutInWind_mps"] or ws > row["CutoffWind_mps"]:
+            power.append(0)
+        elif ws >= row["RatedWind_mps"]:
+            power.append(row["RatedPower_kW"])
+        else:
+            power.append(min(wp / 1000, row["RatedPower_kW"]))
+    return wind_hub, np.array(power, dtype=np.float64)
+
+
+def test_matches_scalar_power_curve():
+    rng = np.random.default_rng(0)
+    df_parks = make_parks(25, rng)
+    # 10m winds from calm to storm, so every branch of the curve is hit after shear scaling
+    wind10 = rng.uniform(0, 25, (25, 48))
+    temp = rng.uniform(260, 300, (25, 48))
+    pres = rng.uniform(97000, 104000, (25, 48))
+
+    for kwargs in ({}, {"temp": temp, "pres": pres}):
+        wind_hub, power_kw = fleet_power(df_parks, wind10, **kwargs)
+        assert wind_hub.shape == power_kw.shape == (25, 48)
+        for i, (_, row) in enumerate(df_parks.iterrows()):
+            expected_hub, expected_power = scalar_power(
+                row, wind10[i], **{name: value[i] for name, value in kwargs.items()})
+            np.testing.assert_allclose(wind_hub[i], expected_hub, rtol=1e-12)
+            np.testing.assert_allclose(power_kw[i], expected_power, rtol=1e-12)
+
+
+def test_power_curve_regions():
+    rng = np.random.default_rng(1)
+    df_parks = make_parks(1, rng).assign(TurbineHeight=10.0, CutInWind_mps=3.0, RatedWind_mps=12.0,
+                                         CutoffWind_mps=25.0, RatedPower_kW=3000.0)
+    # hub height 10 m: the hub wind is the 10m wind
+    wind10 = np.array([[0.0, 2.9, 3.0, 12.0, 20.0, 25.0, 25.1]])
+    wind_hub, power_kw = fleet_power(df_parks, wind10)
+    np.testing.assert_allclose(wind_hub, wind10)
+    assert power_kw[0, 0] == power_kw[0, 1] == 0
+    assert 0 < power_kw[0, 2] < 3000
+    assert list(power_kw[0, 3:6]) == [3000, 3000, 3000]
+    assert power_kw[0, 6] == 0
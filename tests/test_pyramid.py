@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+
+from utils.pyramid import block_reduce, build_pyramid, factor_for_budget, select_level
+
+
+def test_block_mean_and_max():
+    field = np.arange(16, dtype=np.float32).reshape(4, 4)
+    np.testing.assert_array_equal(block_reduce(field, 2), [[2.5, 4.5], [10.5, 12.5]])
+    np.testing.assert_array_equal(block_reduce(field, 2, how="max"), [[5, 7], [13, 15]])
+    np.testing.assert_array_equal(block_reduce(field, 1), field)
+
+
+def test_partial_edge_blocks_and_nan():
+    field = np.ones((2, 5, 5), dtype=np.float32)  # (time, y, x), 5 is not a multiple of 2
+    field[0, 0, 0] = np.nan
+    field[1, 4, 4] = 7
+    reduced = block_reduce(field, 2)
+    assert reduced.shape == (2, 3, 3)
+    assert reduced[0, 0, 0] == 1  # NaN ignored, mean of the 3 valid cells
+    assert reduced[1, 2, 2] == 7  # 1x1 edge block
+    assert np.isnan(block_reduce(np.full((4, 4), np.nan), 2)).all()
+
+
+def test_block_mean_keeps_the_field_mean():
+    rng = np.random.default_rng(0)
+    field = rng.random((64, 48)).astype(np.float32)
+    assert block_reduce(field, 4).mean() == pytest.approx(field.mean(), rel=1e-5)
+
+
+def test_factor_for_budget():
+    assert factor_for_budget((100, 100), 10000) == 1
+    assert factor_for_budget((100, 100), 2500) == 2
+    assert factor_for_budget((949, 739), 60000) == 4
+    ny, nx = 949, 739
+    factor = factor_for_budget((ny, nx), 60000)
+    assert block_reduce(np.zeros((ny, nx)), factor).size <= 60000
+
+
+def grid_levels():
+    yy, xx = np.meshgrid(np.arange(64), np.arange(64), indexing="ij")
+    lat = (50 + 0.25 * yy).astype(np.float32)
+    lon = (0 + 0.5 * xx).astype(np.float32)
+    field = np.broadcast_to(lat, (3, 64, 64)).copy()
+    return build_pyramid(field, lat, lon, factors=(1, 2, 4, 8))
+
+
+def test_select_level_fits_the_budget():
+    levels = grid_levels()
+    assert select_level(levels, 64 * 64)["factor"] == 1
+    level = select_level(levels, 1000)
+    assert level["factor"] == 4  # 16 x 16 = 256 points, 32 x 32 = 1024 would not fit
+    assert level["field"].shape == (3, 16, 16)
+    # nothing fits: the coarsest level is used
+    assert select_level(levels, 1)["factor"] == 8
+
+
+def test_select_level_clips_to_the_viewport():
+    levels = grid_levels()
+    bbox = (5.0, 55.0, 10.0, 58.0)  # 11 x 13 full-resolution points
+    level = select_level(levels, 1000, bbox=bbox)
+    assert level["factor"] == 1
+    assert level["lat"].min() >= bbox[1] and level["lat"].max() <= bbox[3]
+    assert level["lon"].min() >= bbox[0] and level["lon"].max() <= bbox[2]
+    assert level["field"].shape[1:] == level["lat"].shape
+    np.testing.assert_array_equal(level["field"][0], level["lat"])
+    assert select_level(levels, 1000, bbox=(100.0, 0.0, 110.0, 10.0)) is None
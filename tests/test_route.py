@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from utils.data import extract_route, route_series, sample_route
+
+START = np.datetime64("2026-10-15T00:00", "ns")
+
+
+def linear_dataset(descending_lat):
+    # a field linear in time, lat and lon is reproduced exactly by (bi)linear interpolation
+    lat = np.arange(80.0, 39.0, -1.0) if descending_lat else np.arange(40.0, 81.0, 1.0)
+    lon = np.arange(0.0, 360.0, 1.0)
+    time = pd.date_range(START, periods=9, freq="3h")
+    hours = np.arange(9, dtype=np.float64)[:, None, None] * 3
+    field = 0.5 * hours + 2.0 * lat[None, :, None] + 0.01 * lon[None, None, :]
+    wave = field.copy()
+    wave[:, lat == 60.0, :] = np.nan  # a row of "land"
+    return xr.Dataset(
+        {"windsfc": (("time", "lat", "lon"), field), "htsgwsfc": (("time", "lat", "lon"), wave)},
+        coords={"time": time, "lat": lat, "lon": lon},
+    )
+
+
+def linear_value(hours, lat, lon):
+    return 0.5 * hours + 2.0 * lat + 0.01 * (np.asarray(lon) % 360)
+
+
+@pytest.mark.parametrize("descending_lat", [False, True])
+def test_nearest_matches_sel(descending_lat):
+    ds = linear_dataset(descending_lat)
+    hours = np.array([0.0, 4.0, 10.0, 23.0])
+    lats = np.array([45.2, 50.6, 61.4, 79.9])
+    lons = np.array([10.3, 20.7, 355.1, 3.4])
+    times = START + (hours * 3600).astype("timedelta64[s]")
+    out = extract_route(ds, ["windsfc"], times, lats, lons)
+    expected = [ds["windsfc"].sel(time=t, lat=la, lon=lo, method="nearest").item()
+                for t, la, lo in zip(times, lats, lons)]
+    np.testing.assert_allclose(out["windsfc"], expected)
+
+
+@pytest.mark.parametrize("descending_lat", [False, True])
+def test_interpolation_is_exact_on_linear_fields(descending_lat):
+    ds = linear_dataset(descending_lat)
+    hours = np.array([1.0, 7.5, 13.2, 22.9])
+    lats = np.array([41.3, 55.75, 70.1, 79.5])
+    lons = np.array([0.4, 12.25, 200.6, -20.3])  # -20.3 is 339.7 on the 0-360 grid
+    times = START + (hours * 3600).astype("timedelta64[s]")
+    out = extract_route(ds, ["windsfc"], times, lats, lons, interpolate=True)
+    np.testing.assert_allclose(out["windsfc"], linear_value(hours, lats, lons), rtol=1e-9)
+
+
+def test_missing_corners_are_left_out():
+    ds = linear_dataset(descending_lat=True)
+    times = np.array([START, START])
+    # the first waypoint has two "land" corners, the second sits on land
+    out = extract_route(ds, ["htsgwsfc"], times, np.array([60.5, 60.0]), np.array([10.5, 10.0]), interpolate=True)
+    assert out["htsgwsfc"][0] == pytest.approx(ds["windsfc"].sel(time=START, lat=61.0).interp(lon=10.5).item())
+    assert np.isnan(out["htsgwsfc"][1])
+
+
+def test_clamps_outside_the_forecast():
+    ds = linear_dataset(descending_lat=True)
+    times = np.array([START - np.timedelta64(6, "h"), START + np.timedelta64(100, "h")])
+    out = extract_route(ds, ["windsfc"], times, np.array([50.0, 50.0]), np.array([5.0, 5.0]), interpolate=True)
+    np.testing.assert_allclose(out["windsfc"], linear_value(np.array([0.0, 24.0]), 50.0, 5.0))
+
+
+@pytest.mark.parametrize("interpolate", [False, True])
+def test_route_series_is_reused_across_departures(interpolate):
+    ds = linear_dataset(descending_lat=True)
+    lats = np.array([42.6, 50.2, 58.9, 66.6, 74.1])
+    lons = np.array([350.4, 355.0, 0.3, 5.2, 10.8])
+    hours_along = np.array([0.0, 3.5, 7.0, 11.0, 14.0])
+    series = route_series(ds, ["windsfc"], lats, lons, interpolate=interpolate)
+    for departure in (0.0, 2.0, 5.0):
+        times = START + ((departure + hours_along) * 3600).astype("timedelta64[s]")
+        sampled = sample_route(series, times)["windsfc"]
+        if interpolate:
+            np.testing.assert_allclose(sampled, linear_value(departure + hours_along, lats, lons), rtol=1e-9)
+        else:
+            expected = [ds["windsfc"].sel(time=t, lat=la, lon=lo, method="nearest").item()
+                        for t, la, lo in zip(times, lats, lons)]
+            np.testing.assert_allclose(sampled, expected)
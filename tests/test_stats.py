@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+
+from utils.stats import QuantileSketch, compute_field_stats, get_field_stats, stats_key
+
+PERCENTS = [1, 5, 25, 50, 75, 95, 99]
+
+
+def quantile_error_bound(values, bins):
+    # QuantileSketch docstring: accurate to one bin, at worst (max - min) / bins * 2
+    return (values.max() - values.min()) / bins * 2
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "normal", "skewed"])
+def test_sketch_matches_numpy_quantiles(distribution):
+    rng = np.random.default_rng(1)
+    values = {
+        "uniform": rng.uniform(0, 35, 200000),
+        "normal": rng.normal(280, 10, 200000),
+        "skewed": np.where(rng.random(200000) < 0.8, 0, rng.exponential(5, 200000)),  # mostly dry precipitation
+    }[distribution]
+    sketch = QuantileSketch(bins=1024)
+    for chunk in np.array_split(values, 20):
+        sketch.update(chunk)
+    expected = np.quantile(values, np.array(PERCENTS) / 100)
+    np.testing.assert_allclose(sketch.quantiles(PERCENTS), expected, atol=quantile_error_bound(values, 1024))
+
+
+def test_sketch_grows_in_both_directions():
+    rng = np.random.default_rng(2)
+    values = rng.normal(0, 1, 100000)
+    order = np.argsort(np.abs(values))  # narrow values first, extremes last
+    sketch = QuantileSketch(bins=512)
+    for chunk in np.array_split(values[order], 50):
+        sketch.update(chunk)
+    expected = np.quantile(values, np.array(PERCENTS) / 100)
+    np.testing.assert_allclose(sketch.quantiles(PERCENTS), expected, atol=quantile_error_bound(values, 512))
+
+
+def test_sketch_ignores_missing_values():
+    sketch = QuantileSketch()
+    assert np.isnan(sketch.quantiles([50])[0])
+    sketch.update([np.nan, np.inf, 1.0, 2.0, 3.0])
+    assert sketch.quantiles([50])[0] == pytest.approx(2.0, abs=0.01)
+
+
+def test_field_stats_of_function_sources():
+    field = np.arange(24, dtype=np.float32).reshape(6, 2, 2)
+    stats = compute_field_stats({"field": field, "double": lambda t: field[t] * 2}, n_times=6)
+    assert stats["field"]["count"] == 24
+    assert (stats["field"]["min"], stats["field"]["max"]) == (0, 23)
+    assert stats["double"]["max"] == 46
+    assert stats["field"]["mean"] == pytest.approx(11.5)
+
+
+def test_stats_key_includes_cleanup():
+    assert stats_key("apcpsfc") == "apcpsfc"
+    assert stats_key("apcpsfc", clip=None, valid_max=None) == "apcpsfc"
+    assert stats_key("apcpsfc", clip=(0, 50)) != stats_key("apcpsfc", clip=(0, 25))
+    assert stats_key("apcpsfc", valid_max=1e4) != stats_key("apcpsfc")
+
+
+def test_get_field_stats_keeps_cleanups_apart(tmp_path):
+    stats_dir = str(tmp_path)
+    field = np.linspace(0, 100, 400, dtype=np.float32).reshape(4, 10, 10)
+    raw = get_field_stats("gfs", "2026101500", {stats_key("apcpsfc"): field}, stats_dir=stats_dir)
+    clipped_key = stats_key("apcpsfc", clip=(0, 50))
+    clipped = get_field_stats("gfs", "2026101500", {clipped_key: np.clip(field, 0, 50)}, stats_dir=stats_dir)
+    assert raw["apcpsfc"]["max"] == 100
+    assert clipped[clipped_key]["max"] == 50
+    # both are kept in the cycle's file, nothing else is left behind
+    assert os.listdir(stats_dir) == ["gfs_2026101500.json"]
+    again = get_field_stats("gfs", "2026101500", {stats_key("apcpsfc"): field[:0]}, n_times=4, stats_dir=stats_dir)
+    assert again["apcpsfc"]["max"] == 100
@@ -0,0 +1,132 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils import transport
+from utils.transport import STATS, call_with_retry, make_session
+
+BODY = b"Attributes {\n}\n"
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    /flaky: 503 twice, then 200; /missing: 404; /slow: first answer after 1 s;
+    /chunked: 200 with a chunked body.
+    """
+    hits = Counter()
+
+    def do_GET(self):
+        hits = self.hits
+        hits[self.path] += 1
+        if self.path == "/flaky" and hits[self.path] <= 2:
+            self._reply(503, b"busy")
+        elif self.path == "/missing":
+            self._reply(404, b"no such cycle")
+        elif self.path == "/slow" and hits[self.path] == 1:
+            time.sleep(1)
+            self._reply(200, BODY)
+        elif self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for part in (BODY[:5], BODY[5:]):
+                self.wfile.write(f"{len(part):x}\r\n".encode() + part + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._reply(200, BODY)
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(transport, "backoff_delay", lambda attempt: 0)
+    FlakyHandler.hits = Counter()
+    STATS.reset()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_retryable_status_is_retried(server):
+    response = call_with_retry(make_session().get, server + "/flaky")
+    assert response.content == BODY
+    assert FlakyHandler.hits["/flaky"] == 3
+    assert STATS.as_dict() == dict(requests=3, retries=2, failures=2, bytes=len(b"busy") * 2 + len(BODY))
+
+
+def test_retries_give_up(server):
+    with pytest.raises(requests.HTTPError):
+        call_with_retry(make_session().get, server + "/flaky", retries=1)
+    assert FlakyHandler.hits["/flaky"] == 2
+
+
+def test_missing_is_not_retried(server):
+    def read():
+        # e.g. pydap opening a cycle that is not published yet
+        make_session().get(server + "/missing").raise_for_status()
+
+    with pytest.raises(requests.HTTPError):
+        call_with_retry(read)
+    assert FlakyHandler.hits["/missing"] == 1
+    assert STATS.retries == 0
+
+
+@pytest.mark.parametrize("error", [FileNotFoundError, ValueError, RuntimeError, KeyError])
+def test_other_errors_are_not_retried(error):
+    calls = []
+
+    def read():
+        calls.append(1)
+        raise error("not a transport error")
+
+    with pytest.raises(error):
+        call_with_retry(read)
+    assert len(calls) == 1
+
+
+def test_timeout_is_retried(server):
+    session = make_session(timeout=(1, 0.2))
+    response = call_with_retry(session.get, server + "/slow")
+    assert response.content == BODY
+    assert FlakyHandler.hits["/slow"] == 2
+    assert STATS.retries == 1
+
+
+def test_refused_connection_is_retried(monkeypatch):
+    monkeypatch.setattr(transport, "backoff_delay", lambda attempt: 0)
+    STATS.reset()
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # nothing listens on the port any more
+    with pytest.raises(requests.ConnectionError):
+        call_with_retry(make_session().get, f"http://127.0.0.1:{port}/", retries=2)
+    assert STATS.retries == 2
+    assert STATS.failures == 1
+
+
+def test_chunked_bytes_are_counted(server):
+    response = make_session().get(server + "/chunked", stream=True)
+    assert STATS.bytes == 0
+    assert b"".join(response.iter_content(4)) == BODY
+    assert STATS.bytes == len(BODY)
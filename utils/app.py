@@ -0,0 +1,62 @@
+"""
+Streamlit helpers shared by the Skyfora apps.
+
+Slow results (downloads, extractions) run as background jobs (utils/resources.py). The page
+renders everything else right away and shows a progress bar in place of each pending result;
+only that bar is refreshed while the job runs, and the page reruns once it has finished.
+"""
+import streamlit as st
+
+PROGRESS_POLL_SECONDS = 1.0
+
+
+def job_result(job, label, poll_seconds=PROGRESS_POLL_SECONDS):
+    """
+    Result of a background job, or None while it runs (a progress bar is shown instead),
+    when it was cancelled or when it failed (an error is shown).
+    Args:
+        label: what the job does, e.g. "Extracting forecasts at the wind parks"
+    """
+    if job.done():
+        if job.cancelled:
+            return None
+        error = job.error()
+        if error is not None:
+            print(f"{label} failed: {error}")
+            st.error(f"{label} failed, please try again later.")
+            return None
+        return job.result()
+
+    @st.fragment(run_every=poll_seconds)
+    def progress():
+        if job.done():
+            st.rerun()
+        steps = f" ({job.done_steps}/{job.total_steps})" if job.total_steps else ""
+        st.progress(job.fraction, text=f"{label}...{steps}")
+
+    progress()
+    return None
+
+
+def track_job(slot, job):
+    """
+    Remember the job this session shows in slot and release the one it replaces (e.g. the
+    extraction of a previously uploaded file). Jobs are shared between sessions, so a released
+    job is only cancelled when no other session still holds it.
+    """
+    previous = st.session_state.get(slot)
+    if previous is job:
+        return
+    job.hold()
+    st.session_state[slot] = job
+    if previous is not None:
+        previous.release()
+
+
+def forget_job(slot):
+    """
+    Forget and release the job this session shows in slot, e.g. when its upload was removed.
+    """
+    job = st.session_state.pop(slot, None)
+    if job is not None:
+        job.release()
@@ -0,0 +1,189 @@
+"""
+Precompiled country border lines for Skyfora project.
+
+Natural Earth shapefiles are converted once (scripts/build_border_assets.py, or on first use)
+into a compressed .npz in the local cache directory: the exterior rings of every country,
+simplified at a few tolerances (one per zoom level), stored as flat coordinate arrays with ring offsets and a bounding box
+per ring. At runtime clipping to a viewport is array masking against that index and the ring
+segments, so plotting borders only needs numpy (no geopandas/shapely import, no per-country intersection).
+"""
+import os
+import numpy as np
+
+BORDER_TOLERANCES = (0.0, 0.02, 0.1)  # degrees; full detail, regional maps, global maps
+BORDER_PIXELS = 1000  # approximate plot width the tolerance is chosen for
+# Same root as utils.cache.DEFAULT_CACHE_DIR (not imported, that module needs xarray)
+BORDER_ASSET_DIR = os.path.join(
+    os.environ.get("SKYFORA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "skyfora")), "borders"
+)
+
+_asset_cache = {}
+
+
+def border_asset_path(shapefile_path, asset_dir=BORDER_ASSET_DIR):
+    """
+    .npz asset belonging to a shapefile, e.g. ~/.cache/skyfora/borders/ne_10m_admin_0_countries.npz.
+    """
+    return os.path.join(asset_dir, os.path.splitext(os.path.basename(shapefile_path))[0] + ".npz")
+
+
+def build_border_asset(shapefile_path, asset_path=None, tolerances=BORDER_TOLERANCES):
+    """
+    Read a country shapefile and write its simplified exterior rings as an .npz asset.
+    Per tolerance level i the asset has x_l<i>, y_l<i> (float32 ring coordinates back to back),
+    offsets_l<i> (ring starts plus the total length) and bbox_l<i> (min_lon, min_lat, max_lon, max_lat per ring).
+    Returns:
+        path of the written asset
+    """
+    import geopandas as gpd
+    asset_path = asset_path or border_asset_path(shapefile_path)
+    world = gpd.read_file(shapefile_path)
+    arrays = dict(tolerances=np.asarray(tolerances, dtype=np.float32))
+    for i, tolerance in enumerate(tolerances):
+        rings = []
+        for geom in world.geometry:
+            if geom is None or geom.is_empty:
+                continue
+            if tolerance > 0:
+                geom = geom.simplify(tolerance, preserve_topology=True)
+            polys = geom.geoms if geom.geom_type == 'MultiPolygon' else [geom] if geom.geom_type == 'Polygon' else []
+            for poly in polys:
+                if poly.is_empty:
+                    continue
+                rings.append(np.asarray(poly.exterior.coords, dtype=np.float32)[:, :2])
+        lengths = np.array([len(ring) for ring in rings], dtype=np.int64)
+        coords = np.concatenate(rings) if rings else np.empty((0, 2), dtype=np.float32)
+        arrays[f"x_l{i}"] = coords[:, 0]
+        arrays[f"y_l{i}"] = coords[:, 1]
+        arrays[f"offsets_l{i}"] = np.concatenate([[0], np.cumsum(lengths)])
+        arrays[f"bbox_l{i}"] = np.array(
+            [[r[:, 0].min(), r[:, 1].min(), r[:, 0].max(), r[:, 1].max()] for r in rings], dtype=np.float32
+        ).reshape(-1, 4)
+    os.makedirs(os.path.dirname(os.path.abspath(asset_path)), exist_ok=True)
+    tmp_path = f"{asset_path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, asset_path)
+    return asset_path
+
+
+def load_border_asset(asset_path):
+    """
+    All arrays of a border asset, read once per process.
+    """
+    key = os.path.abspath(asset_path)
+    if key not in _asset_cache:
+        with np.load(asset_path) as npz:
+            _asset_cache[key] = {name: npz[name] for name in npz.files}
+    return _asset_cache[key]
+
+
+def tolerance_level(tolerances, bbox=None, pixels=BORDER_PIXELS):
+    """
+    Coarsest simplification level whose tolerance stays below one pixel of a plot showing bbox.
+    """
+    span = 360.0 if bbox is None else max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    level = 0
+    for i, tolerance in enumerate(tolerances):
+        if tolerance <= span / pixels and tolerance >= tolerances[level]:
+            level = i
+    return level
+
+
+class BorderLines:
+    """
+    Country exterior rings as flat arrays: x, y, offsets (ring starts plus total length)
+    and bbox (one row per ring). attrs["source"] identifies the selection for memoization.
+    """
+    def __init__(self, x, y, offsets, bbox, source=None):
+        self.x = x
+        self.y = y
+        self.offsets = offsets
+        self.bbox = bbox
+        self.attrs = {"source": source}
+
+    def __len__(self):
+        return len(self.bbox)
+
+    def take(self, keep, source=None):
+        """
+        Rings where the boolean mask keep is set, as new BorderLines.
+        """
+        lengths = np.diff(self.offsets)
+        points = np.repeat(keep, lengths)
+        return BorderLines(self.x[points], self.y[points], np.concatenate([[0], np.cumsum(lengths[keep])]),
+                           self.bbox[keep], source=source)
+
+    def clip(self, bbox, source=None):
+        """
+        Ring segments within bbox (min_lon, min_lat, max_lon, max_lat).
+        Segments whose bounding box meets bbox are kept, so lines reach just past the viewport
+        edge; each run of consecutive kept segments is returned as a ring of the new BorderLines.
+        """
+        min_lon, min_lat, max_lon, max_lat = bbox
+        keep = ((self.bbox[:, 2] >= min_lon) & (self.bbox[:, 0] <= max_lon)
+                & (self.bbox[:, 3] >= min_lat) & (self.bbox[:, 1] <= max_lat))
+        rings = self.take(keep)
+        lengths = np.diff(rings.offsets)
+        ring_id = np.repeat(np.arange(len(lengths)), lengths)
+        x0, x1, y0, y1 = rings.x[:-1], rings.x[1:], rings.y[:-1], rings.y[1:]
+        # segment i joins points i and i+1 of the same ring
+        segments = ((ring_id[:-1] == ring_id[1:])
+                    & (np.maximum(x0, x1) >= min_lon) & (np.minimum(x0, x1) <= max_lon)
+                    & (np.maximum(y0, y1) >= min_lat) & (np.minimum(y0, y1) <= max_lat))
+        points = np.zeros(len(rings.x), dtype=bool)
+        points[:-1] |= segments
+        points[1:] |= segments
+        idx = np.flatnonzero(points)
+        if idx.size == 0:
+            return BorderLines(rings.x[:0], rings.y[:0], np.zeros(1, dtype=np.int64),
+                               rings.bbox[:0], source=source)
+        # a run starts wherever the segment from the previous kept point was not kept
+        run_start = np.ones(idx.size, dtype=bool)
+        run_start[1:] = (idx[1:] != idx[:-1] + 1) | ~segments[idx[1:] - 1]
+        starts = np.flatnonzero(run_start)
+        x, y = rings.x[idx], rings.y[idx]
+        run_bbox = np.column_stack([np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+                                    np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts)])
+        return BorderLines(x, y, np.append(starts, idx.size), run_bbox, source=source)
+
+    def line_arrays(self, lon_shift=True, skip_polar=True, skip_wraparound=True):
+        """
+        All rings as two float arrays with NaN between rings, for one merged line trace.
+        Args:
+            lon_shift: shift longitudes above 180 to -180..180
+            skip_polar: leave out rings entirely poleward of 85°
+            skip_wraparound: leave out rings spanning more than 350° of longitude (after the shift)
+        """
+        x = self.x.astype(np.float64)
+        if lon_shift:
+            x = np.where(x > 180, x - 360, x)
+        lengths = np.diff(self.offsets)
+        nonempty = lengths > 0
+        keep = nonempty.copy()
+        if skip_polar:
+            keep &= ~((self.bbox[:, 1] > 85) | (self.bbox[:, 3] < -85))
+        if skip_wraparound and nonempty.any():
+            starts = self.offsets[:-1][nonempty]
+            wraparound = np.zeros_like(keep)
+            wraparound[nonempty] = np.maximum.reduceat(x, starts) - np.minimum.reduceat(x, starts) > 350
+            keep &= ~wraparound
+        points = np.repeat(keep, lengths)
+        ends = np.cumsum(lengths[keep])
+        return (np.insert(x[points], ends, np.nan),
+                np.insert(self.y[points].astype(np.float64), ends, np.nan))
+
+
+def load_border_lines(asset_path, bbox=None, level=None):
+    """
+    Border rings from an asset, at the simplification level suited to bbox (or the given level)
+    and clipped to it.
+    """
+    asset = load_border_asset(asset_path)
+    if level is None:
+        level = tolerance_level(asset["tolerances"], bbox)
+    source = (os.path.abspath(asset_path), level, None if bbox is None else tuple(float(v) for v in bbox))
+    borders = BorderLines(asset[f"x_l{level}"], asset[f"y_l{level}"], asset[f"offsets_l{level}"],
+                          asset[f"bbox_l{level}"], source=source)
+    if bbox is not None:
+        borders = borders.clip(bbox, source=source)
+    return borders
@@ -0,0 +1,160 @@
+"""
+On-disk forecast cache for Skyfora project.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+import xarray as xr
+
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are only serialized within the process
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "SKYFORA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "skyfora")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("SKYFORA_CACHE_MAX_BYTES", 5 * 1024**3))
+
+
+class ForecastCache:
+    """
+    Size-bounded LRU store of forecast subsets on local disk.
+
+    Entries are keyed by (model, cycle, variables, selection) and written as NetCDF.
+    Storing a cycle for a model drops every older cycle of that model, and the least
+    recently used entries are evicted once the store grows past max_bytes.
+    Cycles are "YYYYMMDDHH" strings so they compare in time order.
+    Index updates hold an flock on index.lock, so several processes (apps, prefetch worker)
+    can share one cache directory.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock_path = os.path.join(cache_dir, "index.lock")
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model, cycle, variables=None, selection=None):
+        variables = sorted(variables) if variables is not None else None
+        selection = sorted((k, repr(v)) for k, v in selection.items()) if selection else None
+        raw = json.dumps([model, cycle, variables, selection])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _index_lock(self):
+        # threads of this process first, then other processes through the lock file
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, model, cycle, variables=None, selection=None):
+        """
+        Returns the cached dataset for the key, or None on a miss.
+        """
+        key = self.make_key(model, cycle, variables, selection)
+        with self._index_lock():
+            index = self._read_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            path = os.path.join(self.cache_dir, entry["file"])
+            if not os.path.exists(path):
+                del index[key]
+                self._write_index(index)
+                return None
+            entry["last_access"] = time.time()
+            self._write_index(index)
+        return xr.open_dataset(path)
+
+    def put(self, ds, model, cycle, variables=None, selection=None):
+        """
+        Writes ds to the store and returns it reopened from disk.
+        """
+        key = self.make_key(model, cycle, variables, selection)
+        filename = f"{model}_{cycle}_{key[:12]}.nc"
+        path = os.path.join(self.cache_dir, filename)
+
+        # Remote encodings (chunking, DAP fill values) do not always round-trip to NetCDF
+        ds = ds.copy()
+        for name in ds.variables:
+            ds[name].encoding = {}
+        # unique temporary name, concurrent writers of the same key must not share one
+        fd, tmp_path = tempfile.mkstemp(suffix=".nc.tmp", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            ds.to_netcdf(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._index_lock():
+            index = self._read_index()
+            index[key] = {
+                "model": model,
+                "cycle": cycle,
+                "file": filename,
+                "size": os.path.getsize(path),
+                "last_access": time.time(),
+            }
+            self._drop_older_cycles(index, model, cycle)
+            self._evict(index, keep=key)
+            self._write_index(index)
+        return xr.open_dataset(path)
+
+    def clear(self):
+        with self._index_lock():
+            index = self._read_index()
+            for key in list(index):
+                self._remove(index, key)
+            self._write_index(index)
+
+    def _drop_older_cycles(self, index, model, cycle):
+        for key, entry in list(index.items()):
+            if entry["model"] == model and entry["cycle"] < cycle:
+                self._remove(index, key)
+
+    def _evict(self, index, keep=None):
+        total = sum(entry["size"] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= entry["size"]
+            self._remove(index, key)
+
+    def _remove(self, index, key):
+        entry = index.pop(key)
+        path = os.path.join(self.cache_dir, entry["file"])
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _read_index(self):
+        if not os.path.exists(self._index_path):
+            return {}
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(suffix=".json.tmp", dir=self.cache_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
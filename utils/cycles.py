@@ -0,0 +1,132 @@
+"""
+Forecast cycle discovery for Skyfora project.
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from utils.cache import DEFAULT_CACHE_DIR
+from utils.data import get_gfs_opendap_url, get_gfs_wave_opendap_url, get_meps_opendap_url
+from utils.transport import get_session
+
+# Cycle spacing and how far back to look for each model
+MODELS = {
+    "gfs": dict(url=get_gfs_opendap_url, step_hours=6, lookback_hours=48),
+    "gfswave": dict(url=get_gfs_wave_opendap_url, step_hours=6, lookback_hours=48),
+    "meps": dict(url=get_meps_opendap_url, step_hours=1, lookback_hours=12),
+}
+
+AVAILABLE_TTL = 6 * 3600  # a published cycle stays published
+MISSING_TTL = 300  # re-probe cycles that were not there yet after 5 minutes
+PROBE_TIMEOUT = 10
+
+_catalog_lock = threading.Lock()
+_catalog = None
+_catalog_mtime = None  # mtime of the catalog file _catalog was read from
+CATALOG_PATH = os.path.join(DEFAULT_CACHE_DIR, "catalog.json")
+
+
+def candidate_cycles(model, now=None, lookback_hours=None):
+    """
+    Cycle start times of model from now back lookback_hours, newest first.
+    """
+    spec = MODELS[model]
+    step = spec["step_hours"]
+    lookback_hours = spec["lookback_hours"] if lookback_hours is None else lookback_hours
+    now = now or datetime.utcnow()
+    newest = now.replace(minute=0, second=0, microsecond=0, hour=now.hour - now.hour % step)
+    return [newest - timedelta(hours=h) for h in range(0, lookback_hours + 1, step)]
+
+
+def probe_url(url, timeout=PROBE_TIMEOUT):
+    """
+    True if the OPeNDAP dataset at url answers with a valid DAS.
+    GrADS servers reply 200 with an error page for missing datasets, so the body is checked too.
+    """
+    try:
+        response = get_session().get(url + ".das", timeout=timeout)
+        return response.status_code == 200 and response.content.lstrip().startswith(b"Attributes")
+    except Exception:
+        return False
+
+
+def _load_catalog():
+    """
+    The catalog, re-read whenever another process (e.g. scripts/prefetch_worker.py) has replaced the file.
+    """
+    global _catalog, _catalog_mtime
+    try:
+        mtime = os.stat(CATALOG_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+    if _catalog is None or mtime != _catalog_mtime:
+        try:
+            with open(CATALOG_PATH) as f:
+                _catalog = json.load(f)
+        except (OSError, ValueError):
+            _catalog = {}
+        _catalog_mtime = mtime
+    return _catalog
+
+
+def _save_catalog(catalog):
+    global _catalog_mtime
+    try:
+        catalog_dir = os.path.dirname(CATALOG_PATH)
+        os.makedirs(catalog_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".json.tmp", dir=catalog_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(catalog, f)
+        os.replace(tmp_path, CATALOG_PATH)
+        _catalog_mtime = os.stat(CATALOG_PATH).st_mtime_ns
+    except OSError as e:
+        print(f"Could not write cycle catalog: {e}")
+
+
+def find_latest_cycle(model, now=None, lookback_hours=None, url_for=None, max_workers=8):
+    """
+    Newest published cycle of model.
+    Candidate cycles are probed concurrently and the outcome is kept in a catalog
+    (in memory and in the cache directory) so repeated lookups skip the network until the TTL runs out.
+    Args:
+        model: 'gfs', 'gfswave' or 'meps'
+        url_for: url generator (yyyymmdd, cycle) -> url, defaults to the model's server
+    Returns:
+        (cycle, yyyymmdd) like get_latest_gfs_cycle, or None if no candidate is available
+    """
+    url_for = url_for or MODELS[model]["url"]
+    candidates = [(c.strftime("%H"), c.strftime("%Y%m%d")) for c in candidate_cycles(model, now, lookback_hours)]
+    checked_at = time.time()
+
+    with _catalog_lock:
+        catalog = _load_catalog()
+        known = {}
+        for cycle, yyyymmdd in candidates:
+            entry = catalog.get(url_for(yyyymmdd, cycle))
+            if entry is not None:
+                ttl = AVAILABLE_TTL if entry["available"] else MISSING_TTL
+                if checked_at - entry["checked_at"] < ttl:
+                    known[(cycle, yyyymmdd)] = entry["available"]
+
+    to_probe = [c for c in candidates if c not in known]
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda c: probe_url(url_for(c[1], c[0])), to_probe))
+        with _catalog_lock:
+            # re-read, so entries other processes wrote while probing are kept
+            catalog = _load_catalog()
+            for url in [u for u, e in catalog.items() if checked_at - e["checked_at"] > AVAILABLE_TTL]:
+                del catalog[url]
+            for (cycle, yyyymmdd), available in zip(to_probe, results):
+                known[(cycle, yyyymmdd)] = available
+                catalog[url_for(yyyymmdd, cycle)] = {"available": available, "checked_at": checked_at}
+            _save_catalog(catalog)
+
+    for candidate in candidates:
+        if known.get(candidate):
+            return candidate
+    return None
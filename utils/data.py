@@ -2,12 +2,19 @@ import xarray as xr
 import os
 import zipfile
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from utils.transport import get_session, call_with_retry
+
+OPENDAP_ENGINE = os.environ.get("SKYFORA_OPENDAP_ENGINE", "netcdf4")
+# The netCDF4 engine serializes all reads behind one library lock, pydap issues plain HTTP
+# requests and lets concurrent reads overlap: opens read through fetch_arrays/extract_points opt into it
+PARALLEL_OPENDAP_ENGINE = os.environ.get("SKYFORA_PARALLEL_OPENDAP_ENGINE", "pydap")
+DEFAULT_MAX_WORKERS = int(os.environ.get("SKYFORA_MAX_WORKERS", 4))
 
 def get_latest_gfs_cycle(buffer_hours=6):
     now = datetime.utcnow() - timedelta(hours=buffer_hours)
     yyyymmdd = now.strftime("%Y%m%d")
-    print(yyyymmdd)
     hour = now.hour
     if hour >= 18:
         return "18",yyyymmdd
@@ -18,9 +25,341 @@ def get_latest_gfs_cycle(buffer_hours=6):
     else:
         return "00",yyyymmdd
 
-def open_opendap_dataset(url):
+def get_dataset_cycle(ds):
+    """
+    Returns the forecast cycle of ds as a "YYYYMMDDHH" string.
+    Uses forecast_reference_time when present (MEPS), otherwise the first time step.
+    """
+    if "forecast_reference_time" in ds.variables:
+        ref = ds["forecast_reference_time"].values
+    else:
+        ref = ds["time"].values[0]
+    return np.datetime_as_string(np.datetime64(ref, "h"), unit="h").replace("-", "").replace("T", "")
+
+def get_latlon_names(ds):
+    """
+    Returns the (lat, lon) coordinate names: ('lat', 'lon') for GFS, ('latitude', 'longitude') for MEPS.
+    """
+    if "lat" in ds.variables:
+        return "lat", "lon"
+    return "latitude", "longitude"
+
+def _index_range(mask):
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        raise ValueError("Bounding box does not intersect the dataset grid.")
+    return idx[0], idx[-1] + 1
+
+def _time_slice(ds, time):
+    if time is None or isinstance(time, slice):
+        return time
+    if isinstance(time, int):
+        return slice(0, time)
+    start, end = time
+    times = ds["time"].values
+    i0 = 0 if start is None else np.searchsorted(times, np.datetime64(start), side="left")
+    i1 = len(times) if end is None else np.searchsorted(times, np.datetime64(end), side="right")
+    return slice(int(i0), int(i1))
+
+def subset_dataset(ds, variables=None, bbox=None, time=None, stride=1):
+    """
+    Restrict a lazily opened dataset to the hyperslab a plot or extraction needs.
+    Only index selections are applied, so OPeNDAP transfers just the constrained slab
+    when values are read.
+    Args:
+        variables: list of variable names to keep
+        bbox: (min_lon, min_lat, max_lon, max_lat). On 0-360 grids (GFS) negative
+              longitudes and boxes with min_lon > max_lon wrap across the dateline/meridian
+        time: slice of time indices, number of leading time steps, or (start, end) datetimes
+        stride: step applied to both horizontal dimensions
+    Returns:
+        xr.Dataset
+    """
+    if variables is not None:
+        ds = ds[list(variables)]
+    time = _time_slice(ds, time)
+    if time is not None:
+        ds = ds.isel(time=time)
+    if bbox is None:
+        if stride > 1:
+            lat_name, lon_name = get_latlon_names(ds)
+            ydim, xdim = ds[lat_name].dims[0], ds[lon_name].dims[-1]
+            ds = ds.isel({ydim: slice(None, None, stride), xdim: slice(None, None, stride)})
+        return ds
+
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lat_name, lon_name = get_latlon_names(ds)
+    lat = ds[lat_name].values
+    lon = ds[lon_name].values
+
+    if lat.ndim == 2:
+        # Curvilinear grid (MEPS): index box around every point inside the bbox
+        ydim, xdim = ds[lat_name].dims
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        y0, y1 = _index_range(inside.any(axis=1))
+        x0, x1 = _index_range(inside.any(axis=0))
+        return ds.isel({ydim: slice(y0, y1, stride), xdim: slice(x0, x1, stride)})
+
+    y0, y1 = _index_range((lat >= min_lat) & (lat <= max_lat))
+    ds = ds.isel({lat_name: slice(y0, y1, stride)})
+    if lon.max() <= 180:
+        x0, x1 = _index_range((lon >= min_lon) & (lon <= max_lon))
+        return ds.isel({lon_name: slice(x0, x1, stride)})
+
+    # 0-360 grid (GFS): map the box into 0-360 and split it if it wraps past 360
+    min_lon, max_lon = min_lon % 360, max_lon % 360
+    if min_lon <= max_lon:
+        x0, x1 = _index_range((lon >= min_lon) & (lon <= max_lon))
+        return ds.isel({lon_name: slice(x0, x1, stride)})
+    w0, w1 = _index_range(lon >= min_lon)
+    e0, e1 = _index_range(lon <= max_lon)
+    west = ds.isel({lon_name: slice(w0, w1, stride)})
+    east = ds.isel({lon_name: slice(e0, e1, stride)})
+    west = west.assign_coords({lon_name: west[lon_name] - 360})
+    return xr.concat([west, east], dim=lon_name)
+
+def _read_values(da):
+    return da.values
+
+def extract_points(ds, variables, y_idx, x_idx, t_idx=None, tile=128, max_workers=DEFAULT_MAX_WORKERS, progress=None):
+    """
+    Read values at many grid points without one request per point.
+    Points are grouped into tile x tile blocks of the horizontal grid and each variable
+    is read once per occupied block, as the bounding hyperslab of the points inside it.
+    Args:
+        variables: list of variable names with a time dimension
+        y_idx, x_idx: integer grid indices per point (lat/lon indices on regular grids)
+        t_idx: time index per point, or None to read every time step
+        tile: block size in grid cells, bounds the bytes read per request
+        max_workers: number of (variable, block) reads in flight at once
+        progress: function(done, total) called after every (variable, block) read; an exception
+                  it raises (e.g. a cancelled background job) stops the reads not started yet
+    Returns:
+        dict of variable -> (point, time) array, or (point,) array when t_idx is given
+    """
+    y_idx = np.asarray(y_idx, dtype=np.int64)
+    x_idx = np.asarray(x_idx, dtype=np.int64)
+    lat_name, lon_name = get_latlon_names(ds)
+    ydim, xdim = ds[lat_name].dims[0], ds[lon_name].dims[-1]
+    tiles = (y_idx // tile) * (ds.sizes[xdim] // tile + 1) + x_idx // tile
+    if t_idx is not None:
+        t_idx = np.asarray(t_idx, dtype=np.int64)
+        shape = (len(y_idx),)
+    else:
+        shape = (len(y_idx), ds.sizes["time"])
+
+    def read(job):
+        var, sel = job
+        da = ds[var].transpose("time", ydim, xdim)
+        ys, xs = y_idx[sel], x_idx[sel]
+        y0, x0 = ys.min(), xs.min()
+        slab_isel = {ydim: slice(y0, ys.max() + 1), xdim: slice(x0, xs.max() + 1)}
+        if t_idx is None:
+            slab = call_with_retry(_read_values, da.isel(slab_isel))
+            return slab[:, ys - y0, xs - x0].T
+        ts = t_idx[sel]
+        t0 = ts.min()
+        slab_isel["time"] = slice(t0, ts.max() + 1)
+        slab = call_with_retry(_read_values, da.isel(slab_isel))
+        return slab[ts - t0, ys - y0, xs - x0]
+
+    blocks = [np.flatnonzero(tiles == tile_id) for tile_id in np.unique(tiles)]
+    jobs = [(var, sel) for var in variables for sel in blocks]
+    parts = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for part in pool.map(read, jobs):
+                parts.append(part)
+                if progress is not None:
+                    progress(len(parts), len(jobs))
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    out = {var: np.full(shape, np.nan) for var in variables}
+    for (var, sel), values in zip(jobs, parts):
+        out[var][sel] = values
+    return out
+
+def _fractional_index(coord, values):
+    """
+    Fractional position of values along a monotonic coordinate, clamped to its range.
+    """
+    coord = np.asarray(coord, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if coord[0] > coord[-1]:
+        return np.interp(values, coord[::-1], np.arange(len(coord))[::-1])
+    return np.interp(values, coord, np.arange(len(coord)))
+
+def route_series(ds, variables, lats, lons, interpolate=False, progress=None):
+    """
+    Spatial part of extract_route: the full forecast time series at the grid points around
+    every waypoint, read once per route so that a new departure time only needs sample_route.
+    Args:
+        lats, lons: coordinates per waypoint in degrees
+        interpolate: keep the 4 surrounding grid points with bilinear weights instead of the nearest one
+        progress: function(done, total) passed to extract_points
+    Returns:
+        dict(time, weights (corner, waypoint), interpolate, values {variable: (corner, waypoint, time)})
+    """
+    lat_name, lon_name = get_latlon_names(ds)
+    grid_lon = ds[lon_name].values
+    lons = np.asarray(lons, dtype=np.float64)
+    if grid_lon.max() > 180:
+        lons = lons % 360
+    fy = _fractional_index(ds[lat_name].values, lats)
+    fx = _fractional_index(grid_lon, lons)
+    n = len(fy)
+
+    if interpolate:
+        # Corners of the surrounding grid cell, read in a single batch
+        corners = []
+        for f, size in ((fy, ds.sizes[ds[lat_name].dims[0]]), (fx, len(grid_lon))):
+            i0 = np.floor(f).astype(np.int64)
+            i1 = np.minimum(i0 + 1, size - 1)
+            w = f - i0
+            corners.append(((i0, 1 - w), (i1, w)))
+        idx_y, idx_x, weights = [], [], []
+        for iy, wy in corners[0]:
+            for ix, wx in corners[1]:
+                idx_y.append(iy)
+                idx_x.append(ix)
+                weights.append(wy * wx)
+    else:
+        idx_y, idx_x, weights = [np.rint(fy)], [np.rint(fx)], [np.ones(n)]
+    values = extract_points(ds, variables, np.concatenate(idx_y), np.concatenate(idx_x), progress=progress)
+    return dict(
+        time=ds["time"].values.astype("datetime64[ns]").astype(np.float64),
+        weights=np.stack(weights), interpolate=interpolate,
+        values={var: values[var].reshape(len(weights), n, -1) for var in variables},
+    )
+
+def sample_route(series, times):
+    """
+    Time part of extract_route: values at the waypoint times from route_series output,
+    nearest time step or linear in time (with interpolate). Works in memory, no reads.
+    Returns:
+        dict of variable -> (waypoint,) array
+    """
+    times = np.asarray(times, dtype="datetime64[ns]").astype(np.float64)
+    ft = _fractional_index(series["time"], times)
+    waypoint = np.arange(len(ft))
+    if series["interpolate"]:
+        t0 = np.floor(ft).astype(np.int64)
+        t1 = np.minimum(t0 + 1, len(series["time"]) - 1)
+        wt = ft - t0
+        time_corners = ((t0, 1 - wt), (t1, wt))
+    else:
+        time_corners = ((np.rint(ft).astype(np.int64), np.ones(len(ft))),)
+    weights = np.concatenate([series["weights"] * wt for _, wt in time_corners])
+
+    out = {}
+    for var, corner_series in series["values"].items():
+        corner_values = np.concatenate([corner_series[:, waypoint, it] for it, _ in time_corners])
+        # Missing corners (e.g. land points in wave fields) are left out of the weighting
+        valid = np.isfinite(corner_values)
+        total = np.where(valid, weights, 0).sum(axis=0)
+        weighted = np.where(valid, corner_values * weights, 0).sum(axis=0)
+        out[var] = np.where(total > 0, weighted / np.where(total > 0, total, 1), np.nan)
+    return out
+
+def extract_route(ds, variables, times, lats, lons, interpolate=False):
+    """
+    Values along a route of (time, lat, lon) waypoints on a regular lat/lon grid (GFS).
+    All waypoints are resolved at once and read through extract_points.
+    Args:
+        times: datetimes per waypoint
+        lats, lons: coordinates per waypoint in degrees
+        interpolate: bilinear in space and linear in time instead of nearest neighbour
+    Returns:
+        dict of variable -> (waypoint,) array
+    """
+    return sample_route(route_series(ds, variables, lats, lons, interpolate=interpolate), times)
+
+def fetch_arrays(ds, variables, time_chunk=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Read several variables concurrently on a bounded thread pool.
+    Each variable is split into time chunks of time_chunk steps (whole variable if None),
+    every (variable, chunk) read is scheduled independently and the chunks are joined in order.
+    A failed chunk is retried on its own, chunks already read are kept.
+    Returns:
+        dict of variable -> numpy array
+    """
+    jobs = []
+    for var in variables:
+        n_times = ds[var].sizes.get("time")
+        if time_chunk and n_times:
+            for start in range(0, n_times, time_chunk):
+                jobs.append((var, slice(start, min(start + time_chunk, n_times))))
+        else:
+            jobs.append((var, None))
+
+    def read(job):
+        var, time_slice = job
+        da = ds[var] if time_slice is None else ds[var].isel(time=time_slice)
+        return call_with_retry(_read_values, da)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        parts = list(pool.map(read, jobs))
+
+    arrays = {}
+    for var in variables:
+        chunks = [part for (name, _), part in zip(jobs, parts) if name == var]
+        if len(chunks) == 1:
+            arrays[var] = chunks[0]
+        else:
+            arrays[var] = np.concatenate(chunks, axis=ds[var].dims.index("time"))
+    return arrays
+
+def load_dataset(ds, time_chunk=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    In-memory copy of ds with all data variables read through fetch_arrays.
+    """
+    arrays = fetch_arrays(ds, list(ds.data_vars), time_chunk=time_chunk, max_workers=max_workers)
+    return ds.copy(data=arrays)
+
+def open_opendap_dataset(url, variables=None, isel=None, bbox=None, time=None, stride=1,
+                         model=None, cycle=None, cache=None, engine=OPENDAP_ENGINE,
+                         max_workers=DEFAULT_MAX_WORKERS, time_chunk=None):
+    """
+    Open an OPeNDAP dataset, optionally restricted to variables and index selections.
+    Args:
+        variables: list of variable names to keep (coordinates are kept as well)
+        isel: dict of dimension -> index/slice, e.g. {"time": slice(0, 20)}
+        bbox, time, stride: server-side subset, see subset_dataset
+        model: model name used as cache namespace (e.g. 'meps', 'gfs', 'gfswave')
+        cycle: "YYYYMMDDHH" cycle; read from the dataset when not given
+        cache: utils.cache.ForecastCache, the subset is served from local disk when cached
+        engine: xarray backend used for the remote open
+        max_workers, time_chunk: concurrency of the download written to the cache, see fetch_arrays
+    Returns:
+        xr.Dataset or None on failure
+    """
+    selection = dict(isel or {})
+    for name, value in (("bbox", bbox), ("time", time), ("stride", stride if stride > 1 else None)):
+        if value is not None:
+            selection[f"_{name}"] = value
     try:
-        ds = xr.open_dataset(url)
+        use_cache = cache is not None and model is not None
+        if use_cache and cycle is not None:
+            ds = cache.get(model, cycle, variables, selection)
+            if ds is not None:
+                return ds
+        # pydap requests go through the pooled session (timeouts, counters, keep-alive); netCDF4 uses libnetcdf's HTTP, see utils/transport.py
+        open_kwargs = {"session": get_session()} if engine == "pydap" else {}
+        ds = call_with_retry(xr.open_dataset, url, engine=engine, **open_kwargs)
+        if use_cache and cycle is None:
+            cycle = get_dataset_cycle(ds)
+            cached = cache.get(model, cycle, variables, selection)
+            if cached is not None:
+                return cached
+        if isel:
+            ds = ds.isel(isel)
+        ds = subset_dataset(ds, variables=variables, bbox=bbox, time=time, stride=stride)
+        if use_cache:
+            ds = load_dataset(ds, time_chunk=time_chunk, max_workers=max_workers)
+            ds.attrs["forecast_cycle"] = cycle
+            ds = cache.put(ds, model, cycle, variables, selection)
         return ds
     except Exception as e:
         print(f"Error opening OPeNDAP dataset: {e}")
@@ -34,6 +373,20 @@ def get_gfs_opendap_url(yyyymmdd, cycle="00"):
 def get_gfs_wave_opendap_url(yyyymmdd, cycle="00"):
     return f"http://nomads.ncep.noaa.gov:80/dods/wave/gfswave/{yyyymmdd}/gfswave.global.0p25_{cycle}z"
 
+# --- MEPS OPeNDAP URL GENERATOR ---
+MEPS_LATEST_URL = "https://thredds.met.no/thredds/dodsC/metpplatest/met_forecast_1_0km_nordic_latest.nc"
+
+def get_meps_opendap_url(yyyymmdd, cycle="00"):
+    return (f"https://thredds.met.no/thredds/dodsC/metpparchive/{yyyymmdd[:4]}/{yyyymmdd[4:6]}/{yyyymmdd[6:]}/"
+            f"met_forecast_1_0km_nordic_{yyyymmdd}T{cycle}Z.nc")
+
+def get_meps_cycle_url(cycle=None):
+    """
+    OPeNDAP URL of a "YYYYMMDDHH" MEPS cycle, or of the rolling latest file if cycle is None.
+    Opening the cycle's own file keeps data and cycle keys in step when "latest" lags behind.
+    """
+    return get_meps_opendap_url(cycle[:8], cycle[8:]) if cycle else MEPS_LATEST_URL
+
 def extract_shapefile(zip_path, extract_dir):
     if not os.path.exists(extract_dir):
         os.makedirs(extract_dir)
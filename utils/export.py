@@ -0,0 +1,220 @@
+"""
+HTML export of Plotly animations for Skyfora project.
+
+StreamingHTMLWriter writes a figure and then its frames one at a time, so long animations
+never have to be held in memory at once. With encodings (or write_quantized_html) the animated
+fields, i.e. heatmap z / scatter marker.color of the base figure and of every frame, are stored
+as base64 uint8/uint16 codes over the trace's color range instead of JSON floats, and a small
+script decodes them to Float32Array before Plotly draws the figure.
+"""
+import os
+import json
+import base64
+import numpy as np
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+# Code type per variable. Values are stored as codes over the colorbar range (zmin..zmax or
+# cmin..cmax), values outside it are clipped, and the highest code of each type marks NaN.
+VARIABLE_DTYPES = {
+    "wind": "uint8",     # 0-35 m/s in 0.14 m/s steps
+    "cloud": "uint8",    # 0-100 % in 0.4 % steps (MEPS 0-1 fraction: same relative steps)
+    "pwat": "uint8",     # 0-70 mm in 0.28 mm steps
+    "wave": "uint8",     # 0-20 m in 0.08 m steps
+    "precip": "uint16",  # 0-25 mm; light rain needs finer steps than 0.1 mm
+    "temp": "uint16",    # 250-320 K; 0.28 K steps would band visibly
+}
+NAN_CODES = {"uint8": 255, "uint16": 65535}
+
+DECODER_JS = """
+function decodeQuantized(e) {
+  var bin = atob(e.q), bytes = new Uint8Array(bin.length);
+  for (var i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  var codes = e.dtype === "uint16" ? new Uint16Array(bytes.buffer) : bytes;
+  var nan = e.dtype === "uint16" ? 65535 : 255, step = (e.hi - e.lo) / (nan - 1);
+  var out = new Float32Array(codes.length);
+  for (var j = 0; j < codes.length; j++) out[j] = codes[j] === nan ? NaN : e.lo + codes[j] * step;
+  if (e.shape.length < 2) return out;
+  var rows = [], nx = e.shape[1];
+  for (var r = 0; r < e.shape[0]; r++) rows.push(out.subarray(r * nx, (r + 1) * nx));
+  return rows;
+}
+function decodeFigure(node) {
+  if (Array.isArray(node)) return node.map(decodeFigure);
+  if (node && typeof node === "object") {
+    if (node.__quantized__) return decodeQuantized(node.__quantized__);
+    for (var k in node) node[k] = decodeFigure(node[k]);
+  }
+  return node;
+}
+"""
+
+
+def quantize(values, lo, hi, dtype="uint8"):
+    """
+    Encode values as integer codes over [lo, hi].
+    Returns:
+        dict(q=base64 codes, dtype, shape, lo, hi), the form decodeQuantized reads
+    """
+    values = np.asarray(values, dtype=np.float64)
+    nan_code = NAN_CODES[dtype]
+    scale = (nan_code - 1) / (hi - lo) if hi > lo else 0.0
+    codes = np.clip(np.rint((values - lo) * scale), 0, nan_code - 1)
+    codes = np.where(np.isfinite(values), codes, nan_code).astype("<u2" if dtype == "uint16" else "u1")
+    return dict(q=base64.b64encode(codes.tobytes()).decode("ascii"), dtype=dtype,
+                shape=list(values.shape), lo=float(lo), hi=float(hi))
+
+
+def encode_values(values, encodings):
+    """
+    Panel values of one frame as add_encoded_frame writes them.
+    Args:
+        encodings: one (lo, hi, dtype) per value to quantize, or None to keep float32 values
+    Returns:
+        list of {"__quantized__": quantize(...)} dicts or float32 arrays
+    """
+    return [{"__quantized__": quantize(value, *encoding)} if encoding is not None else np.asarray(value, dtype=np.float32)
+            for value, encoding in zip(values, encodings)]
+
+
+def _animated_values(trace):
+    # z for heatmaps, marker.color for scatters, with the color range to quantize against
+    if isinstance(trace, go.Heatmap):
+        return trace.z, trace.zmin, trace.zmax
+    return trace.marker.color, trace.marker.cmin, trace.marker.cmax
+
+
+def _encode_trace(trace_dict, trace, base, dtype):
+    values, lo, hi = _animated_values(trace)
+    if values is None or np.ndim(values) == 0:
+        return
+    base_lo, base_hi = _animated_values(base)[1:]
+    lo = lo if lo is not None else base_lo
+    hi = hi if hi is not None else base_hi
+    if lo is None or hi is None:
+        lo, hi = float(np.nanmin(values)), float(np.nanmax(values))
+    encoded = {"__quantized__": quantize(values, lo, hi, dtype)}
+    if isinstance(trace, go.Heatmap):
+        trace_dict["z"] = encoded
+    else:
+        trace_dict.setdefault("marker", {})["color"] = encoded
+
+
+def _quantized_frame_dict(fig, frame, dtypes):
+    frame_dict = frame.to_plotly_json()
+    targets = frame.traces if frame.traces is not None else range(len(frame.data))
+    for trace, trace_dict, i in zip(frame.data, frame_dict.get("data", []), targets):
+        if i in dtypes:
+            _encode_trace(trace_dict, trace, fig.data[i], dtypes[i])
+    return frame_dict
+
+
+def plotlyjs_tag(include_plotlyjs=True):
+    """
+    Script tag for plotly.js: True (default) embeds the bundled library so the file works offline,
+    'cdn' links the matching CDN build (smaller file, needs network access to open).
+    """
+    if include_plotlyjs == "cdn":
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>'
+    if include_plotlyjs:
+        return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    return ""
+
+
+class StreamingHTMLWriter:
+    """
+    Standalone HTML writer that takes animation frames one at a time, so only the frame being
+    written is held in memory (instead of fig.frames plus one JSON string of the whole figure).
+    The base figure (traces, layout, controls) is written first; every add_frame appends one
+    script that registers the frame, and close() draws the figure and adds the frames, giving
+    the same interactive result as fig.write_html.
+    Args:
+        fig: base figure, its own frames are not written
+        encodings: optional {trace index: variable name or dtype} to quantize, see VARIABLE_DTYPES
+        include_plotlyjs: see plotlyjs_tag, embedded by default
+    """
+    def __init__(self, path, fig, encodings=None, include_plotlyjs=True, div_id="skyfora-figure"):
+        self.path = path
+        self.fig = fig
+        self.dtypes = {i: VARIABLE_DTYPES.get(name, name) for i, name in (encodings or {}).items()}
+        self.div_id = json.dumps(div_id)
+        self.n_frames = 0
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, "w", encoding="utf-8")
+
+        fig_dict = fig.to_dict()
+        fig_dict.pop("frames", None)
+        for i, dtype in self.dtypes.items():
+            _encode_trace(fig_dict["data"][i], fig.data[i], fig.data[i], dtype)
+        f = self._file
+        f.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"/>\n')
+        f.write(plotlyjs_tag(include_plotlyjs))
+        f.write(f'\n<script type="text/javascript">\n{DECODER_JS}\nvar skyforaFrames = [];\n</script>\n')
+        f.write(f'</head>\n<body>\n<div id="{div_id}"></div>\n')
+        f.write(f'<script type="text/javascript">\nvar figure = decodeFigure({to_json_plotly(fig_dict)});\n</script>\n')
+
+    def add_frame(self, frame):
+        frame_dict = _quantized_frame_dict(self.fig, frame, self.dtypes) if self.dtypes else frame.to_plotly_json()
+        self._write_frame(frame_dict)
+
+    def frame_encodings(self, traces):
+        """
+        encode_values encodings of the animated traces: (lo, hi, dtype) from the trace's color
+        range for quantized traces, None for traces kept as floats (or without a fixed range).
+        """
+        encodings = []
+        for i in traces:
+            lo, hi = _animated_values(self.fig.data[i])[1:]
+            encodings.append((lo, hi, self.dtypes[i]) if i in self.dtypes and lo is not None and hi is not None else None)
+        return encodings
+
+    def add_encoded_frame(self, name, values, traces, title=None):
+        """
+        Write a frame from encode_values output (e.g. built by utils.frames.encoded_frames workers),
+        the same frame add_frame(data_frame(fig, name, values, traces, title)) would write.
+        """
+        data = []
+        for i, value in zip(traces, values):
+            trace = self.fig.data[i]
+            data.append({"type": "heatmap", "z": value} if isinstance(trace, go.Heatmap)
+                        else {"type": trace.type, "marker": {"color": value}})
+        frame_dict = {"data": data, "name": name, "traces": list(traces)}
+        if title is not None:
+            frame_dict["layout"] = {"title": {"text": title}}
+        self._write_frame(frame_dict)
+
+    def _write_frame(self, frame_dict):
+        self._file.write(f'<script type="text/javascript">skyforaFrames.push(decodeFigure({to_json_plotly(frame_dict)}));</script>\n')
+        self.n_frames += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.write(
+            f'<script type="text/javascript">\nPlotly.newPlot({self.div_id}, figure.data, figure.layout, {{responsive: true}})'
+            f'.then(function() {{ return Plotly.addFrames({self.div_id}, skyforaFrames); }});\n</script>\n</body>\n</html>\n'
+        )
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+def write_quantized_html(fig, path, encodings, include_plotlyjs=True, div_id="skyfora-figure"):
+    """
+    Write fig (with its frames) as a standalone HTML file whose animated fields are quantized,
+    see VARIABLE_DTYPES. Opens and animates like fig.write_html output.
+    """
+    with StreamingHTMLWriter(path, fig, encodings=encodings, include_plotlyjs=include_plotlyjs, div_id=div_id) as writer:
+        for frame in fig.frames:
+            writer.add_frame(frame)
+    return path
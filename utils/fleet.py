@@ -0,0 +1,267 @@
+"""
+Fleet-scale wind park forecasts for Skyfora project.
+
+Park registries are read with compact float32 columns (CSV, Excel, Parquet or Arrow), validated
+with whole-column checks, and forecast in chunks of parks. Each chunk's (park, time) results
+are written straight into a columnar store on disk (one memory-mapped .npy per column) and
+aggregated on the way, so memory stays bounded by one chunk whatever the fleet size.
+"""
+import io
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+
+from utils.cache import DEFAULT_CACHE_DIR
+from utils.data import extract_points
+from utils.power import (fleet_power, REQUIRED_PARK_COLUMNS, DEFAULT_TURBINE_HEIGHT, DEFAULT_WINDSHEAR,
+                         DEFAULT_EFFICIENCY)
+
+FLEET_DIR = os.path.join(DEFAULT_CACHE_DIR, "fleet")
+PARK_CHUNK = 5000  # parks read and computed at a time
+KEEP_RESULTS = 8  # result stores kept, least recently used ones are removed on write
+PARK_FILE_TYPES = ["xlsx", "csv", "parquet", "arrow", "feather"]
+POINT_VARIABLES = ["wind_speed_10m", "air_temperature_2m", "air_pressure_at_sea_level"]
+
+OPTIONAL_PARK_DEFAULTS = {
+    "TurbineHeight": DEFAULT_TURBINE_HEIGHT,
+    "WindShear": DEFAULT_WINDSHEAR,
+    "Efficiency": DEFAULT_EFFICIENCY,
+}
+PARK_COLUMNS = ["Longitude", "Latitude"] + REQUIRED_PARK_COLUMNS + list(OPTIONAL_PARK_DEFAULTS)
+PARK_DTYPES = {col: np.float32 for col in PARK_COLUMNS}
+
+# (park, time) float32 columns of a result store
+RESULT_COLUMNS = {
+    "wind10": "Wind Speed 10m (m/s)",
+    "wind_hub": "Wind Speed Hub (m/s)",
+    "power_kw": "Power Output (kW)",
+}
+
+
+def _read_arrow(data, name):
+    # pyarrow is only needed for Parquet/Arrow uploads
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    if name.endswith(".parquet"):
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        return parquet.read(columns=[col for col in parquet.schema_arrow.names if col in PARK_DTYPES]).to_pandas()
+    try:
+        table = ipc.open_file(pa.BufferReader(data)).read_all()
+    except pa.ArrowInvalid:
+        table = ipc.open_stream(pa.BufferReader(data)).read_all()
+    return table.select([col for col in table.column_names if col in PARK_DTYPES]).to_pandas()
+
+
+def read_park_table(data, name):
+    """
+    Park table from uploaded bytes, only the known park columns, as float32.
+    Args:
+        name: file name, its extension picks the reader (see PARK_FILE_TYPES)
+    Returns:
+        DataFrame (non-numeric entries become NaN and are rejected by validate_parks)
+    """
+    name = name.lower()
+    usecols = lambda col: col in PARK_DTYPES
+    if name.endswith(".csv"):
+        try:
+            # fast path: parsed straight into float32 columns
+            df = pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=PARK_DTYPES)
+        except ValueError:
+            df = pd.read_csv(io.BytesIO(data), usecols=usecols)
+    elif name.endswith(".xlsx"):
+        df = pd.read_excel(io.BytesIO(data), usecols=usecols)
+    else:
+        df = _read_arrow(data, name)
+    for col in df.columns:
+        if df[col].dtype != np.float32:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+    return df
+
+
+def validate_parks(df_parks):
+    """
+    Column checks over the whole table at once. Optional columns (and their empty cells) get
+    their defaults, rows failing a check are dropped and the rotor area is added.
+    The index is kept, so parks stay numbered by their row in the upload.
+    Returns:
+        (valid DataFrame, missing required columns, {reason: number of rejected rows})
+    """
+    missing_cols = [col for col in ["Longitude", "Latitude"] + REQUIRED_PARK_COLUMNS if col not in df_parks]
+    if missing_cols:
+        return df_parks, missing_cols, {}
+    df_parks = df_parks.copy()
+    for col, default in OPTIONAL_PARK_DEFAULTS.items():
+        df_parks[col] = df_parks[col].fillna(default).astype(np.float32) if col in df_parks else np.float32(default)
+
+    values = {col: df_parks[col].to_numpy() for col in PARK_COLUMNS}
+    checks = {
+        "missing or non-numeric values": ~np.isfinite(np.column_stack(list(values.values()))).all(axis=1),
+        "coordinates out of range": (np.abs(values["Latitude"]) > 90) | (values["Longitude"] < -180) | (values["Longitude"] > 360),
+        "non-positive rotor radius, rated power or hub height": (
+            (values["RotorRadius_m"] <= 0) | (values["RatedPower_kW"] <= 0) | (values["TurbineHeight"] <= 0)
+        ),
+        "wind speeds not ordered cut-in < rated <= cut-off": ~(
+            (values["CutInWind_mps"] < values["RatedWind_mps"]) & (values["RatedWind_mps"] <= values["CutoffWind_mps"])
+        ),
+    }
+    rejected = np.zeros(len(df_parks), dtype=bool)
+    reasons = {}
+    for reason, failed in checks.items():
+        failed = failed & ~rejected  # each row is counted under its first failed check
+        if failed.any():
+            reasons[reason] = int(failed.sum())
+            rejected |= failed
+    df_parks = df_parks[~rejected]
+    df_parks["RotorArea_m2"] = (np.pi * df_parks["RotorRadius_m"] ** 2).astype(np.float32)
+    return df_parks, [], reasons
+
+
+def load_parks(data, name):
+    """
+    read_park_table followed by validate_parks.
+    """
+    return validate_parks(read_park_table(data, name))
+
+
+class FleetResults:
+    """
+    Columnar store of one fleet forecast: (park, time) float32 columns (RESULT_COLUMNS) as
+    memory-mapped .npy files, the park table, and aggregates computed while it was written.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.n_parks = meta["n_parks"]
+        self.times = pd.to_datetime(meta["times"])
+        self.parks = pd.read_pickle(os.path.join(path, "parks.pkl"))
+
+    def column(self, name):
+        """
+        (park, time) array of a result column, memory-mapped (read from disk as it is indexed).
+        """
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def fleet_total(self):
+        """
+        Power output of the whole fleet per forecast time.
+        """
+        return pd.DataFrame({
+            "Forecast Time": self.times,
+            "Fleet Power Output (kW)": np.load(os.path.join(self.path, "fleet_power_kw.npy")),
+        })
+
+    def summary(self):
+        """
+        One row per park: location, rated power, mean and max power output, capacity factor and mean hub wind.
+        """
+        summary = pd.DataFrame({
+            "Park": [f"Park {i + 1}" for i in self.parks.index],
+            "Longitude": self.parks["Longitude"].to_numpy(),
+            "Latitude": self.parks["Latitude"].to_numpy(),
+            "RatedPower_kW": self.parks["RatedPower_kW"].to_numpy(),
+        })
+        for name, label in (("mean_power_kw", "Mean Power Output (kW)"), ("max_power_kw", "Max Power Output (kW)"),
+                            ("mean_wind_hub", "Mean Wind Speed Hub (m/s)")):
+            summary[label] = np.load(os.path.join(self.path, f"{name}.npy"))
+        summary["Capacity Factor"] = summary["Mean Power Output (kW)"] / summary["RatedPower_kW"]
+        return summary
+
+    def table(self, rows=None):
+        """
+        Tidy DataFrame with one row per park and forecast time (park-major order) for the parks
+        at positions rows, all parks if None.
+        """
+        rows = np.arange(self.n_parks) if rows is None else np.asarray(rows)
+        parks = self.parks.iloc[rows]
+        n_times = len(self.times)
+        table = pd.DataFrame({
+            "Park": np.repeat([f"Park {i + 1}" for i in parks.index], n_times),
+            "Longitude": np.repeat(parks["Longitude"].to_numpy(), n_times),
+            "Latitude": np.repeat(parks["Latitude"].to_numpy(), n_times),
+            "Forecast Time": np.tile(self.times.to_numpy(), len(rows)),
+            "Hub Height (m)": np.repeat(parks["TurbineHeight"].to_numpy(), n_times),
+        })
+        for name, label in RESULT_COLUMNS.items():
+            table[label] = self.column(name)[rows].ravel()
+        return table
+
+
+def _prune(store_dir, keep=KEEP_RESULTS):
+    paths = [os.path.join(store_dir, name) for name in os.listdir(store_dir)
+             if os.path.exists(os.path.join(store_dir, name, "meta.json"))]
+    for path in sorted(paths, key=os.path.getmtime, reverse=True)[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def fleet_forecast(ds, df_parks, times, grid_index, key, variables=POINT_VARIABLES, chunk_parks=PARK_CHUNK,
+                   store_dir=FLEET_DIR, progress=None):
+    """
+    Hub height wind and power output of a whole park registry, chunk_parks parks at a time:
+    nearest grid points, point reads, fleet_power and aggregates per chunk, with the columns
+    written into a FleetResults store. A store already written for key is reused.
+    Args:
+        df_parks: DataFrame from validate_parks
+        grid_index: utils.geo.GridIndex of the dataset grid
+        key: name of the store, e.g. "<upload hash>_<cycle>"
+        progress: function(done, total) called with the parks done after every chunk
+    Returns:
+        FleetResults
+    """
+    path = os.path.join(store_dir, key)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        os.utime(path)
+        return FleetResults(path)
+    n_parks, n_times = len(df_parks), len(times)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        columns = {
+            name: np.lib.format.open_memmap(os.path.join(tmp_path, f"{name}.npy"), mode="w+",
+                                            dtype=np.float32, shape=(n_parks, n_times))
+            for name in RESULT_COLUMNS
+        }
+        aggregates = {name: np.zeros(n_parks, dtype=np.float32) for name in ("mean_power_kw", "max_power_kw", "mean_wind_hub")}
+        fleet_power_kw = np.zeros(n_times, dtype=np.float64)
+
+        for start in range(0, n_parks, chunk_parks):
+            rows = slice(start, min(start + chunk_parks, n_parks))
+            chunk = df_parks.iloc[rows]
+            park_y, park_x, _ = grid_index.query(chunk["Latitude"].values, chunk["Longitude"].values)
+            data = extract_points(ds, variables, park_y, park_x)
+            wind10 = data["wind_speed_10m"][:, :n_times]
+            wind_hub, power_kw = fleet_power(chunk, wind10, temp=data["air_temperature_2m"][:, :n_times],
+                                             pres=data["air_pressure_at_sea_level"][:, :n_times])
+            columns["wind10"][rows] = wind10
+            columns["wind_hub"][rows] = wind_hub
+            columns["power_kw"][rows] = power_kw
+            aggregates["mean_power_kw"][rows] = np.nanmean(power_kw, axis=1)
+            aggregates["max_power_kw"][rows] = np.nanmax(power_kw, axis=1)
+            aggregates["mean_wind_hub"][rows] = np.nanmean(wind_hub, axis=1)
+            fleet_power_kw += np.nansum(power_kw, axis=0)
+            if progress is not None:
+                progress(rows.stop, n_parks)
+
+        for column in columns.values():
+            column.flush()
+        del columns
+        for name, values in aggregates.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+        np.save(os.path.join(tmp_path, "fleet_power_kw.npy"), fleet_power_kw)
+        df_parks.to_pickle(os.path.join(tmp_path, "parks.pkl"))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(dict(n_parks=n_parks, times=[str(t) for t in pd.to_datetime(times)],
+                           created=time.time()), f)
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    _prune(store_dir)
+    return FleetResults(path)
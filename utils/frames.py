@@ -0,0 +1,101 @@
+"""
+Per-frame panel arrays of animation frames for Skyfora project.
+
+Frames are computed one at a time while they are written. Fields may be lazy (e.g. xarray
+DataArrays of a cached NetCDF file or an OPeNDAP dataset), then only the current frame's slabs
+are read and held in memory.
+
+encoded_frames spreads this over a process pool: every worker opens the fields itself (a local
+NetCDF file is shared through the OS page cache), builds a frame's panel arrays and quantizes
+them, so only the base64 codes of each frame travel back to the parent, which writes them in order.
+"""
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from utils.export import encode_values
+from utils.transport import call_with_retry
+
+DEFAULT_FRAME_WORKERS = int(os.environ.get("SKYFORA_FRAME_WORKERS", os.cpu_count() or 1))
+PREFETCH_PER_WORKER = 2  # frames in flight per worker, bounds memory of finished but unwritten frames
+
+
+def _frame_slab(source, t):
+    # numpy arrays are indexed in memory, lazy DataArrays read just this time step
+    return call_with_retry(np.asarray, source[t])
+
+
+def frame_panels(fields, t, panels, column_order=None):
+    """
+    Panel arrays of frame t.
+    Args:
+        fields: dict of (time, y, x) arrays or lazy DataArrays
+        t: time index (or slice, giving (time, y, x) panels)
+        panels: list of (op, variable names), op 'field' for fields[name][t] or 'speed' for the magnitude of a (u, v) pair
+        column_order: optional column permutation applied to every panel, e.g. the -180..180 longitude sort
+    Returns:
+        list of float32 arrays, one per panel
+    """
+    values = []
+    for op, names in panels:
+        if op == "speed":
+            u, v = (_frame_slab(fields[name], t) for name in names)
+            value = np.sqrt(np.square(u, dtype=np.float32) + np.square(v, dtype=np.float32))
+        else:
+            value = _frame_slab(fields[names[0]], t)
+        if column_order is not None:
+            value = value[..., column_order]
+        values.append(np.asarray(value, dtype=np.float32))
+    return values
+
+
+def open_netcdf_fields(path, names):
+    """
+    Lazy fields of a local NetCDF file, e.g. a ForecastCache entry (ds.encoding["source"]).
+    """
+    import xarray as xr
+    ds = xr.open_dataset(path)
+    return {name: ds[name] for name in names}
+
+
+_worker_fields = None
+
+
+def _open_worker_fields(open_fields):
+    global _worker_fields
+    _worker_fields = open_fields()
+
+
+def _encode_frame(frame_fn, encodings, t):
+    return encode_values(frame_fn(_worker_fields, t), encodings)
+
+
+def encoded_frames(frame_fn, open_fields, n_frames, encodings, max_workers=DEFAULT_FRAME_WORKERS):
+    """
+    Yield encode_values(frame_fn(fields, t), encodings) for t in range(n_frames), in order,
+    for StreamingHTMLWriter.add_encoded_frame.
+    Args:
+        frame_fn: picklable function (fields, t) -> panel arrays, e.g. a functools.partial of frame_panels
+        open_fields: picklable function returning the fields, called once per worker,
+                     e.g. functools.partial(open_netcdf_fields, path, names)
+        encodings: see StreamingHTMLWriter.frame_encodings
+        max_workers: worker processes; <= 1 (or no fork support) runs serially in this process
+    """
+    max_workers = min(max_workers, n_frames)
+    # fork reuses the parent's imports; spawn would re-run the calling script in every worker
+    if max_workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        fields = open_fields()
+        for t in range(n_frames):
+            yield encode_values(frame_fn(fields, t), encodings)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("fork"),
+                             initializer=_open_worker_fields, initargs=(open_fields,)) as pool:
+        pending = deque()
+        next_t = 0
+        while next_t < n_frames or pending:
+            while next_t < n_frames and len(pending) < max_workers * PREFETCH_PER_WORKER:
+                pending.append(pool.submit(_encode_frame, frame_fn, encodings, next_t))
+                next_t += 1
+            yield pending.popleft().result()
@@ -1,40 +1,110 @@
 """
 Geospatial helpers for Skyfora project.
 """
-import geopandas as gpd
+import os
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 
+from utils.borders import border_asset_path, build_border_asset, load_border_lines
+
+EARTH_RADIUS_KM = 6371.0
+BORDER_ARRAYS_CACHE_SIZE = 32  # (selection, lon_shift) entries, one per map extent in use
+_grid_index_cache = {}
+_border_arrays_cache = OrderedDict()
+_border_arrays_lock = threading.Lock()
+
 def load_country_borders(shapefile_path, bbox=None):
-    world = gpd.read_file(shapefile_path)
-    if bbox is not None:
-        from shapely.geometry import box as shapely_box
-        min_lon, min_lat, max_lon, max_lat = bbox
-        bbox_geom = shapely_box(min_lon, min_lat, max_lon, max_lat)
-        world["geometry"] = world["geometry"].intersection(bbox_geom)
-        world = world[~world.is_empty & world.geometry.notnull()]
-    return world
+    """
+    Country border rings (utils.borders.BorderLines) clipped to bbox, read from the precompiled
+    asset in the local cache directory at the simplification level that suits bbox. The asset is built
+    on first use if missing (this one step needs geopandas). The asset is read once per process,
+    the clip to bbox is done per call.
+    """
+    asset_path = border_asset_path(shapefile_path)
+    if not os.path.exists(asset_path):
+        if not os.path.exists(shapefile_path):
+            raise FileNotFoundError(
+                f"Country borders {shapefile_path} not found. Download the Natural Earth 'Admin 0 - Countries' "
+                f"shapefile ({os.path.basename(shapefile_path)}) from https://www.naturalearthdata.com/downloads/ "
+                f"into data/, or use the bundled data/ne_110m_admin_0_countries.zip"
+            )
+        print(f"Border asset {asset_path} not found, building it from {shapefile_path}")
+        build_border_asset(shapefile_path, asset_path)
+    return load_border_lines(asset_path, bbox=bbox)
+
+def get_border_arrays(world, lon_shift=True):
+    """
+    All border rings of world as two float arrays with NaN between rings, for one
+    merged line trace. Rings entirely poleward of 85° and rings spanning the dateline
+    (after the optional shift of longitudes to -180..180) are left out.
+    Memoized per (source, lon_shift) for borders from load_country_borders, keeping the
+    BORDER_ARRAYS_CACHE_SIZE most recently used.
+    """
+    source = world.attrs.get("source")
+    if source is None:
+        return world.line_arrays(lon_shift=lon_shift)
+    key = (source, lon_shift)
+    with _border_arrays_lock:
+        if key in _border_arrays_cache:
+            _border_arrays_cache.move_to_end(key)
+        else:
+            _border_arrays_cache[key] = world.line_arrays(lon_shift=lon_shift)
+            while len(_border_arrays_cache) > BORDER_ARRAYS_CACHE_SIZE:
+                _border_arrays_cache.popitem(last=False)
+        return _border_arrays_cache[key]
 
 def get_border_lines(world):
-    from shapely.geometry import MultiLineString
-    lines = []
-    for _, country in world.iterrows():
-        geom = country.geometry
-        if geom is None or geom.is_empty:
-            continue
-        if geom.geom_type == 'Polygon':
-            lines.append(geom.exterior)
-        elif geom.geom_type == 'MultiPolygon':
-            for poly in geom.geoms:
-                if poly is None or poly.is_empty:
-                    continue
-                lines.append(poly.exterior)
-    if lines:
-        multilines = MultiLineString(lines)
-        border_x = []
-        border_y = []
-        for line in multilines.geoms:
-            x, y = line.xy
-            border_x += list(x) + [None]
-            border_y += list(y) + [None]
-        return border_x, border_y
-    return [], []
+    """
+    All border rings of world, unfiltered, as x and y arrays with NaN between rings.
+    """
+    return world.line_arrays(lon_shift=False, skip_polar=False, skip_wraparound=False)
+
+def latlon_to_xyz(lat, lon):
+    """
+    Convert degrees latitude/longitude to 3D unit vectors, shape (..., 3).
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+class GridIndex:
+    """
+    Nearest grid point lookup for regular (GFS) or curvilinear (MEPS) grids.
+    Grid points are stored as unit vectors in a KD-tree, so chord distances are
+    exact great-circle distances after conversion and stay correct at high latitudes.
+    """
+    def __init__(self, lat, lon):
+        from scipy.spatial import cKDTree
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        if lat.ndim == 1:
+            lat, lon = np.meshgrid(lat, lon, indexing="ij")
+        self.shape = lat.shape
+        self._tree = cKDTree(latlon_to_xyz(lat.ravel(), lon.ravel()))
+
+    def query(self, lats, lons):
+        """
+        Args:
+            lats, lons: 1D arrays of point coordinates in degrees
+        Returns:
+            (y_idx, x_idx, dist_km) arrays, one entry per point
+        """
+        chord, flat_idx = self._tree.query(latlon_to_xyz(np.atleast_1d(lats), np.atleast_1d(lons)))
+        dist_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+        y_idx, x_idx = np.unravel_index(flat_idx, self.shape)
+        return y_idx, x_idx, dist_km
+
+def get_grid_index(lat, lon):
+    """
+    Returns a GridIndex for the grid, built once per process and reused for identical grids.
+    """
+    lat = np.ascontiguousarray(lat)
+    lon = np.ascontiguousarray(lon)
+    digest = hashlib.sha1(lat.tobytes() + lon.tobytes()).hexdigest()
+    key = (lat.shape, lon.shape, digest)
+    if key not in _grid_index_cache:
+        _grid_index_cache[key] = GridIndex(lat, lon)
+    return _grid_index_cache[key]
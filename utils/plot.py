@@ -30,11 +30,14 @@ def create_plots(atms_variable, lon, lat, colorscale='Blues', colorbar_x=1.0, co
         hovertemplate=f"Lon: %{{x:.2f}}<br>Lat: %{{y:.2f}}<br>{hover_label}: %{{z:.1f}} {text}<extra></extra>",
     )
 
-def create_scatter(atms_variable, lon, lat, colorscale="RdYlBu_r", cmin=0, cmax=35, colorbar_x=1.0, colorbar_y=0.5, colorbar_len=1, text='m/s', hover_label='Wind'):
+def create_scatter(atms_variable, lon, lat, colorscale="RdYlBu_r", cmin=0, cmax=35, colorbar_x=1.0, colorbar_y=0.5, colorbar_len=1, text='m/s', hover_label='Wind', render="webgl"):
     """
     Scatter plot for wind speed at given points.
+    render='webgl' draws with go.Scattergl (stays interactive for 100k+ points), 'svg' with go.Scatter.
+    Hover text comes from a template on the marker color, no per-point strings are built.
     """
-    return go.Scatter(
+    scatter = go.Scattergl if render == "webgl" else go.Scatter
+    return scatter(
         x=lon,
         y=lat,
         mode='markers',
@@ -53,47 +56,74 @@ def create_scatter(atms_variable, lon, lat, colorscale="RdYlBu_r", cmin=0, cmax=
             opacity=0.7,
             showscale=True
         ),
-        text=[f"{val:.1f} {text}" for val in atms_variable],
-        hovertemplate=f"Lat: %{{y:.2f}}<br>Lon: %{{x:.2f}}<br>{hover_label}: %{{text}}",
+        hovertemplate=f"Lat: %{{y:.2f}}<br>Lon: %{{x:.2f}}<br>{hover_label}: %{{marker.color:.1f}} {text}<extra></extra>",
         name='',
         showlegend=False
     )
 
-def add_country_borders(fig, world, lon_shift=True, row=None, col=None):
-    import numpy as np
-    for _, country in world.iterrows():
-        geom = country.geometry
-        def shift_lon(xx):
-            xx = np.array(xx)
-            xx = np.where(xx > 180, xx - 360, xx)
-            return xx.tolist()
-        def skip_polar(y):
-            y = np.array(y)
-            return np.all(y > 85) or np.all(y < -85)
-        def skip_wraparound(x):
-            x = np.array(x)
-            return (x.max() - x.min()) > 350
-        scatter_kwargs = dict(mode='lines', line=dict(color='black', width=1), showlegend=False, hoverinfo='skip')
-        if row is not None and col is not None:
-            scatter_kwargs['row'] = row
-            scatter_kwargs['col'] = col
-        if geom.geom_type == 'MultiPolygon':
-            for poly in geom.geoms:
-                x, y = poly.exterior.xy
-                if skip_polar(y):
-                    continue
-                if lon_shift:
-                    x = shift_lon(x)
-                if skip_wraparound(x):
-                    continue
-                fig.add_scatter(x=x, y=list(y), **scatter_kwargs)
-        elif geom.geom_type == 'Polygon':
-            x, y = geom.exterior.xy
-            if not skip_polar(y):
-                if lon_shift:
-                    x = shift_lon(x)
-                if not skip_wraparound(x):
-                    fig.add_scatter(x=x, y=list(y), **scatter_kwargs)
+def frame_update(trace, values):
+    """
+    Minimal per-frame update of trace: only z for heatmaps, only marker.color for scatters.
+    """
+    if isinstance(trace, go.Heatmap):
+        return go.Heatmap(z=values)
+    return type(trace)(marker=dict(color=values))
+
+def data_frame(fig, name, values, traces, title=None):
+    """
+    Animation frame that carries only the changing arrays of the animated traces.
+    Coordinates, colorbars, hovertemplates and static traces (e.g. borders) stay on the
+    base figure once instead of being re-embedded in every frame.
+    Args:
+        fig: figure whose traces are animated, with the initial frame already added
+        values: one 2D (heatmap) or 1D (scatter) array per animated trace
+        traces: indices of the animated traces in fig.data
+        title: optional title text shown with this frame
+    Returns:
+        go.Frame
+    """
+    return go.Frame(
+        data=[frame_update(fig.data[i], v) for i, v in zip(traces, values)],
+        traces=list(traces),
+        name=name,
+        layout=go.Layout(title_text=title) if title is not None else None
+    )
 
+class CurvilinearRaster:
+    """
+    Nearest neighbour resampling of a curvilinear grid (MEPS) onto a regular lon/lat raster.
+    The lookup is computed once per grid, every frame is then a single fancy index, and the
+    result can be drawn with create_plots as an image-like heatmap instead of one marker per point.
+    """
+    def __init__(self, lat, lon, resolution=0.05, max_distance_km=None):
+        from utils.geo import get_grid_index
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        self.lon = np.arange(np.nanmin(lon), np.nanmax(lon) + resolution, resolution)
+        self.lat = np.arange(np.nanmin(lat), np.nanmax(lat) + resolution, resolution)
+        target_lat, target_lon = np.meshgrid(self.lat, self.lon, indexing="ij")
+        y_idx, x_idx, dist_km = get_grid_index(lat, lon).query(target_lat.ravel(), target_lon.ravel())
+        if max_distance_km is None:
+            # about one source cell diagonal, so points outside the model domain stay empty
+            max_distance_km = 1.5 * 111.2 * max(resolution, np.nanmax(np.abs(np.diff(lat, axis=0))))
+        self.shape = target_lat.shape
+        self._y_idx = y_idx
+        self._x_idx = x_idx
+        self._outside = dist_km > max_distance_km
 
+    def regrid(self, field):
+        values = np.asarray(field, dtype=np.float32)[self._y_idx, self._x_idx]
+        values[self._outside] = np.nan
+        return values.reshape(self.shape)
 
+def add_country_borders(fig, world, lon_shift=True, row=None, col=None):
+    """
+    Overlay country borders as a single merged line trace (per call / subplot).
+    """
+    from utils.geo import get_border_arrays
+    border_x, border_y = get_border_arrays(world, lon_shift=lon_shift)
+    scatter_kwargs = dict(mode='lines', line=dict(color='black', width=1), showlegend=False, hoverinfo='skip')
+    if row is not None and col is not None:
+        scatter_kwargs['row'] = row
+        scatter_kwargs['col'] = col
+    fig.add_scatter(x=border_x, y=border_y, **scatter_kwargs)
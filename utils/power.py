@@ -0,0 +1,54 @@
+"""
+Wind turbine power helpers for Skyfora project.
+"""
+import numpy as np
+
+DEFAULT_TURBINE_HEIGHT = 100  # meters
+DEFAULT_WINDSHEAR = 0.14
+DEFAULT_EFFICIENCY = 0.45  # Typical efficiency factor
+RHO0 = 1.225  # kg/m³, standard air density
+R_DRY_AIR = 287.05  # J/(kg K)
+
+REQUIRED_PARK_COLUMNS = ["RotorRadius_m", "RatedPower_kW", "CutInWind_mps", "RatedWind_mps", "CutoffWind_mps"]
+
+
+def air_density(temp, pres):
+    """
+    Air density from temperature [K] and pressure [Pa] with the ideal gas law.
+    """
+    return pres / (R_DRY_AIR * temp)
+
+
+def fleet_power(df_parks, wind10, temp=None, pres=None):
+    """
+    Hub height wind and power output for every park and time step at once.
+    Args:
+        df_parks: DataFrame from utils.fleet.validate_parks, one row per park
+        wind10: (park, time) array of 10m wind speed
+        temp, pres: (park, time) arrays of 2m temperature and sea level pressure,
+                    standard density (1.225 kg/m³) is used if either is None
+    Returns:
+        (wind_hub, power_kw) arrays of shape (park, time)
+    """
+    wind10 = np.asarray(wind10, dtype=np.float64)
+
+    def column(name):
+        return df_parks[name].to_numpy(dtype=np.float64)[:, None]
+
+    # Power law shear scaling from 10m to hub height
+    wind_hub = wind10 * (column("TurbineHeight") / 10) ** column("WindShear")
+
+    if temp is None or pres is None:
+        rho = np.full_like(wind_hub, RHO0)
+    else:
+        rho = air_density(np.asarray(temp, dtype=np.float64), np.asarray(pres, dtype=np.float64))
+
+    available_kw = 0.5 * rho * column("RotorArea_m2") * wind_hub**3 * column("Efficiency") / 1000
+
+    # Power curve: zero outside cut-in/cut-off, rated above rated wind, capped in between
+    rated_power = column("RatedPower_kW")
+    power_kw = np.minimum(available_kw, rated_power)
+    power_kw = np.where(wind_hub >= column("RatedWind_mps"), rated_power, power_kw)
+    power_kw = np.where((wind_hub < column("CutInWind_mps")) | (wind_hub > column("CutoffWind_mps")), 0.0, power_kw)
+    return wind_hub, power_kw
+
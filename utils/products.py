@@ -0,0 +1,143 @@
+"""
+Precomputed forecast products for Skyfora project.
+
+Products are derived fields written once per forecast cycle (usually by
+scripts/prefetch_worker.py) so the apps only have to read them from local disk.
+"""
+import os
+import glob
+import tempfile
+import numpy as np
+import xarray as xr
+
+from utils.cache import DEFAULT_CACHE_DIR, ForecastCache
+from utils.data import open_opendap_dataset, fetch_arrays, get_meps_cycle_url, PARALLEL_OPENDAP_ENGINE
+from utils.power import air_density
+from utils.pyramid import build_pyramid, pyramid_to_dataset, pyramid_from_dataset
+from utils.stats import compute_field_stats
+
+PRODUCT_DIR = os.path.join(DEFAULT_CACHE_DIR, "products")
+KEEP_CYCLES = 2  # cycles kept per product, older ones are removed on write
+
+# --- MEPS WIND POWER POTENTIAL MAP ---
+WIND_POWER_MAP = "meps_wind_power_map"
+MEPS_MAP_VARIABLES = ["wind_speed_10m", "air_temperature_2m", "air_pressure_at_sea_level"]
+MEPS_MAP_FRAMES = 47
+MEPS_MAP_STRIDE = 4  # base resolution of the map pyramid (every 4th point of the 1 km grid)
+MEPS_MAP_FACTORS = (1, 2, 5, 10)  # block-mean levels on top of the base, i.e. 4, 8, 20 and 40 km
+MEPS_MAP_BBOX = (0, -90, 30, 90)
+MAP_PERCENTILES = (1, 50, 99)
+MAP_TIME_CHUNK = 4  # time steps read per step of a progressive build
+
+
+def open_meps_map_data(cache=None, cycle=None):
+    """
+    Subsampled MEPS fields for the wind power map, served from the forecast cache when present.
+    Args:
+        cycle: "YYYYMMDDHH" cycle to open, the latest file if None
+    """
+    return open_opendap_dataset(
+        get_meps_cycle_url(cycle), variables=MEPS_MAP_VARIABLES, time=MEPS_MAP_FRAMES,
+        bbox=MEPS_MAP_BBOX, stride=MEPS_MAP_STRIDE,
+        model="meps", cycle=cycle, cache=cache or ForecastCache(), engine=PARALLEL_OPENDAP_ENGINE
+    )
+
+
+def open_meps_map_stream(cycle=None):
+    """
+    Lazy subsampled MEPS map fields: nothing is read until a frame is requested (see wind_power_frame).
+    Args:
+        cycle: "YYYYMMDDHH" cycle to open, the latest file if None
+    """
+    return open_opendap_dataset(
+        get_meps_cycle_url(cycle), variables=MEPS_MAP_VARIABLES, time=MEPS_MAP_FRAMES,
+        bbox=MEPS_MAP_BBOX, stride=MEPS_MAP_STRIDE, engine=PARALLEL_OPENDAP_ENGINE
+    )
+
+
+def _wind_power(fields):
+    rho = air_density(fields["air_temperature_2m"], fields["air_pressure_at_sea_level"])
+    return 0.5 * rho * fields["wind_speed_10m"] ** 3
+
+
+def wind_power_frame(ds_map, t):
+    """
+    Wind power density of map frame t alone, as the same block-mean pyramid levels as
+    build_wind_power_map with a (1, y, x) field. Reads only that time step.
+    """
+    fields = fetch_arrays(ds_map.isel(time=slice(t, t + 1)), MEPS_MAP_VARIABLES)
+    return build_pyramid(_wind_power(fields), ds_map["latitude"].values, ds_map["longitude"].values, factors=MEPS_MAP_FACTORS)
+
+
+def build_wind_power_map(ds_map, time_chunk=None, progress=None):
+    """
+    Wind power density 0.5 * rho * wind**3 (W/m²) for every map frame as a block-mean pyramid
+    (read back with wind_power_levels), with min, max, mean and the color-scale percentiles p1, p50 and p99 as attributes.
+    Args:
+        time_chunk: read this many time steps at a time (all at once if None)
+        progress: function(done, total) called with the time steps read after every chunk,
+                  e.g. to report or cancel a background build
+    """
+    n_times = ds_map.sizes["time"]
+    step = time_chunk or n_times
+    parts = []
+    for start in range(0, n_times, step):
+        parts.append(_wind_power(fetch_arrays(ds_map.isel(time=slice(start, start + step)), MEPS_MAP_VARIABLES)))
+        if progress is not None:
+            progress(min(start + step, n_times), n_times)
+    wind_power = parts[0] if len(parts) == 1 else np.concatenate(parts)  # (t, y, x)
+
+    levels = build_pyramid(wind_power, ds_map["latitude"].values, ds_map["longitude"].values, factors=MEPS_MAP_FACTORS)
+    product = pyramid_to_dataset(levels, "wind_power", ds_map["time"].values)
+    for name, value in compute_field_stats({"wind_power": wind_power}, quantiles=MAP_PERCENTILES)["wind_power"].items():
+        product.attrs[name] = value
+    product.attrs["forecast_cycle"] = ds_map.attrs.get("forecast_cycle", "")
+    return product
+
+
+def wind_power_levels(product):
+    """
+    Pyramid levels of a wind power map product, finest first.
+    """
+    return pyramid_from_dataset(product, "wind_power")
+
+
+def write_product(name, ds, product_dir=PRODUCT_DIR):
+    """
+    Store ds as the product for its forecast cycle and prune older cycles.
+    """
+    cycle = ds.attrs["forecast_cycle"]
+    os.makedirs(product_dir, exist_ok=True)
+    path = os.path.join(product_dir, f"{name}_{cycle}.nc")
+    # unique temporary name, concurrent writers of the same product must not share one
+    fd, tmp_path = tempfile.mkstemp(suffix=".nc.tmp", dir=product_dir)
+    os.close(fd)
+    try:
+        ds.to_netcdf(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    for old_path in _product_paths(name, product_dir)[KEEP_CYCLES:]:
+        os.remove(old_path)
+    return path
+
+
+def read_product(name, min_cycle=None, product_dir=PRODUCT_DIR):
+    """
+    Newest stored product, loaded into memory, or None if there is none at least as new as min_cycle.
+    """
+    paths = _product_paths(name, product_dir)
+    if not paths:
+        return None
+    cycle = os.path.basename(paths[0])[len(name) + 1:-3]
+    if min_cycle is not None and cycle < min_cycle:
+        return None
+    with xr.open_dataset(paths[0]) as ds:
+        return ds.load()
+
+
+def _product_paths(name, product_dir):
+    # Cycles are "YYYYMMDDHH", so the reverse name order is newest first
+    return sorted(glob.glob(os.path.join(product_dir, f"{name}_??????????.nc")), reverse=True)
@@ -0,0 +1,112 @@
+"""
+Multi-resolution pyramids of gridded fields for Skyfora project.
+
+Instead of keeping every n-th grid point (which aliases and drops local peaks), each
+coarser level averages (or takes the maximum of) factor x factor blocks. Levels are
+built once per field and the renderer picks the finest one that fits its point budget.
+"""
+import math
+import numpy as np
+
+DEFAULT_FACTORS = (1, 2, 4, 8, 16, 32)
+
+
+def block_reduce(array, factor, how="mean"):
+    """
+    Reduce the last two axes of array by factor x factor blocks, ignoring NaN.
+    Edges that do not fill a whole block are reduced over the cells they have.
+    Args:
+        how: 'mean' (area average) or 'max' (keeps peaks)
+    """
+    array = np.asarray(array, dtype=np.float32)
+    if factor == 1:
+        return array
+    ny, nx = array.shape[-2:]
+    pad_y, pad_x = -ny % factor, -nx % factor
+    padded = np.pad(array, [(0, 0)] * (array.ndim - 2) + [(0, pad_y), (0, pad_x)], constant_values=np.nan)
+    blocks = padded.reshape(padded.shape[:-2] + (padded.shape[-2] // factor, factor, padded.shape[-1] // factor, factor))
+    valid = np.isfinite(blocks)
+    count = valid.sum(axis=(-3, -1))
+    if how == "max":
+        reduced = np.where(valid, blocks, -np.inf).max(axis=(-3, -1))
+    else:
+        reduced = np.where(valid, blocks, 0).sum(axis=(-3, -1)) / np.maximum(count, 1)
+    return np.where(count > 0, reduced, np.nan).astype(np.float32)
+
+
+def build_pyramid(field, lat, lon, factors=DEFAULT_FACTORS, how="mean"):
+    """
+    Args:
+        field: (..., y, x) array, e.g. (time, y, x)
+        lat, lon: 2D (y, x) coordinates, block-averaged alongside the field
+    Returns:
+        list of levels, finest first: dict(factor, field, lat, lon)
+    """
+    return [
+        dict(factor=factor, field=block_reduce(field, factor, how),
+             lat=block_reduce(lat, factor), lon=block_reduce(lon, factor))
+        for factor in factors
+    ]
+
+
+def factor_for_budget(shape, max_points):
+    """
+    Smallest block factor that brings a (y, x) grid down to max_points points.
+    """
+    ny, nx = shape[-2:]
+    return max(1, math.ceil(math.sqrt(ny * nx / max_points)))
+
+
+def select_level(levels, max_points, bbox=None):
+    """
+    Finest level with at most max_points points inside the viewport, clipped to it.
+    Args:
+        bbox: (min_lon, min_lat, max_lon, max_lat) viewport, None for the whole grid
+    Returns:
+        dict(factor, field, lat, lon) with field (..., y, x) cut to the rows/columns in view
+    """
+    for level in levels:
+        lat, lon = level["lat"], level["lon"]
+        if bbox is None:
+            rows = np.ones(lat.shape[0], dtype=bool)
+            cols = np.ones(lat.shape[1], dtype=bool)
+        else:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+            rows, cols = inside.any(axis=1), inside.any(axis=0)
+            if not rows.any():
+                continue
+        y = np.flatnonzero(rows)
+        x = np.flatnonzero(cols)
+        ys, xs = slice(y[0], y[-1] + 1), slice(x[0], x[-1] + 1)
+        if (ys.stop - ys.start) * (xs.stop - xs.start) <= max_points or level is levels[-1]:
+            return dict(factor=level["factor"], field=level["field"][..., ys, xs], lat=lat[ys, xs], lon=lon[ys, xs])
+    return None
+
+
+def pyramid_to_dataset(levels, name, time):
+    """
+    Pack pyramid levels into one xr.Dataset, variables <name>_l<factor> with (time, y_l<factor>, x_l<factor>).
+    """
+    import xarray as xr
+    data_vars = {}
+    for level in levels:
+        suffix = f"l{level['factor']}"
+        dims = ("time", f"y_{suffix}", f"x_{suffix}")
+        data_vars[f"{name}_{suffix}"] = (dims, level["field"])
+        data_vars[f"latitude_{suffix}"] = (dims[1:], level["lat"])
+        data_vars[f"longitude_{suffix}"] = (dims[1:], level["lon"])
+    ds = xr.Dataset(data_vars, coords={"time": time})
+    ds.attrs["pyramid_factors"] = [level["factor"] for level in levels]
+    return ds
+
+
+def pyramid_from_dataset(ds, name):
+    """
+    Inverse of pyramid_to_dataset.
+    """
+    return [
+        dict(factor=int(factor), field=ds[f"{name}_l{factor}"].values,
+             lat=ds[f"latitude_l{factor}"].values, lon=ds[f"longitude_l{factor}"].values)
+        for factor in np.atleast_1d(ds.attrs["pyramid_factors"])
+    ]
@@ -0,0 +1,185 @@
+"""
+Headless rendering of forecast animation products for Skyfora project.
+
+A product is a stack of panels (one variable or derived field each) from one model, written as
+a standalone animated HTML file. Products of the same model share one opened dataset (the cached
+local NetCDF file, read lazily one frame at a time), the per-cycle statistics and the loaded country
+borders (see scripts/render_batch.py).
+"""
+import os
+from functools import partial
+import numpy as np
+from plotly.subplots import make_subplots
+
+from utils.data import (open_opendap_dataset, get_dataset_cycle, get_latest_gfs_cycle,
+                        get_gfs_opendap_url, get_gfs_wave_opendap_url, MEPS_LATEST_URL, PARALLEL_OPENDAP_ENGINE)
+from utils.cache import ForecastCache
+from utils.cycles import find_latest_cycle
+from utils.export import StreamingHTMLWriter
+from utils.frames import frame_panels
+from utils.geo import load_country_borders
+from utils.plot import create_plots, create_scatter, add_country_borders, data_frame
+from utils.pyramid import block_reduce, factor_for_budget
+from utils.stats import get_field_stats, color_range, stats_key
+
+# Bundled Natural Earth 1:110m countries; a product's "borders" key can point at the 1:10m download instead
+DEFAULT_BORDERS = "data/ne_110m_admin_0_countries.zip"
+DEFAULT_MEPS_STRIDE = 5
+DEFAULT_MEPS_MAX_POINTS = 60000
+PANEL_HEIGHT = 420
+
+
+def panel_key(panel):
+    """
+    Name of a panel's field in titles and statistics, e.g. 'tcdcclm' or 'speed(ugrd10m,vgrd10m)'.
+    """
+    op = panel.get("op", "field")
+    return panel["variables"][0] if op == "field" else f"{op}({','.join(panel['variables'])})"
+
+
+class ModelData:
+    """
+    One opened model cycle: lazy fields of every variable any product needs (downloaded once into
+    the cache, then read from the local file per frame), and the statistics shared by all products rendered from it.
+    """
+    def __init__(self, model, variables, time_steps, stride=1, cache=None):
+        self.model = model
+        self.cache = cache or ForecastCache()
+        self.ds, self.cycle = self._open(model, sorted(variables), time_steps, stride)
+        self.fields = {name: self.ds[name] for name in sorted(variables)} if self.ds is not None else None
+        self._stats = {}
+
+    def _open(self, model, variables, time_steps, stride):
+        if model == "meps":
+            ds = open_opendap_dataset(MEPS_LATEST_URL, variables=variables, time=time_steps, stride=stride,
+                                      model="meps", cache=self.cache, engine=PARALLEL_OPENDAP_ENGINE)
+            return ds, get_dataset_cycle(ds) if ds is not None else None
+        latest = find_latest_cycle(model)
+        cycle, yyyymmdd = latest if latest is not None else get_latest_gfs_cycle()
+        url = get_gfs_wave_opendap_url(yyyymmdd, cycle) if model == "gfswave" else get_gfs_opendap_url(yyyymmdd, cycle)
+        print(f"Using {model} OPeNDAP URL: {url}")
+        ds = open_opendap_dataset(url, variables=variables, time=time_steps, model=model,
+                                  cycle=yyyymmdd + cycle, cache=self.cache, engine=PARALLEL_OPENDAP_ENGINE)
+        return ds, yyyymmdd + cycle
+
+    def panel_values(self, panel, t):
+        """
+        A panel's values at time index t (or a time slice), with its clip/valid_max cleanup applied.
+        Only the slabs of t are read.
+        """
+        values = frame_panels(self.fields, t, [(panel.get("op", "field"), panel["variables"])])[0]
+        if panel.get("valid_max") is not None:
+            values = np.where(values > panel["valid_max"], np.nan, values)
+        if panel.get("clip"):
+            values = np.clip(values, *panel["clip"])
+        return values
+
+    def stats(self, panel, time_steps):
+        """
+        Per-cycle statistics of a panel field, shared by every product showing it.
+        """
+        name = stats_key(panel_key(panel), clip=panel.get("clip"), valid_max=panel.get("valid_max"))
+        if (name, time_steps) not in self._stats:
+            # a function source, read a few time steps at a time (see utils.stats.compute_field_stats)
+            self._stats[name, time_steps] = get_field_stats(self.model, self.cycle, {name: partial(self.panel_values, panel)},
+                                                            n_times=time_steps)[name]
+        return self._stats[name, time_steps]
+
+
+def _panel_range(data, panel, time_steps):
+    low, high = panel.get("range", [0, "p99"])
+    default = tuple(panel.get("default_range", (0, 1)))
+    if isinstance(low, str) or isinstance(high, str):
+        return color_range(data.stats(panel, time_steps), low=low, high=high, default=default)
+    return low, high
+
+
+def _time_labels(ds, time_steps):
+    return [str(np.datetime64(t, 's'))[:16].replace('T', ' ') for t in ds["time"].values[:time_steps]]
+
+
+def render_product(product, data, output_dir, quantize=True):
+    """
+    Render one product config (see scripts/render_batch.py) from shared ModelData to
+    <output_dir>/<name>_<cycle>.html, streaming the frames into the file.
+    Returns:
+        path of the written file
+    """
+    panels = product["panels"]
+    time_steps = min(product.get("time_steps", len(data.ds["time"])), len(data.ds["time"]))
+    labels = _time_labels(data.ds, time_steps)
+    n_rows = len(panels)
+    title = product.get("title", product["name"])
+
+    fig = make_subplots(rows=n_rows, cols=1, shared_xaxes=True, shared_yaxes=True, vertical_spacing=0.04,
+                        subplot_titles=[panel.get("title", panel.get("label", panel_key(panel))) for panel in panels])
+    curvilinear = data.model == "meps"
+    if curvilinear:
+        # Area-average blocks down to the point budget, drawn as WebGL scatters
+        factor = factor_for_budget(data.ds["latitude"].shape, product.get("max_points", DEFAULT_MEPS_MAX_POINTS))
+        lat = block_reduce(data.ds["latitude"].values, factor).ravel()
+        lon = block_reduce(data.ds["longitude"].values, factor).ravel()
+        column_order = None
+        bbox = (np.nanmin(lon), np.nanmin(lat), np.nanmax(lon), np.nanmax(lat))
+        world = load_country_borders(product.get("borders", DEFAULT_BORDERS), bbox=bbox)
+    else:
+        lat = data.ds["lat"].values
+        lon = data.ds["lon"].values
+        column_order = None
+        if np.any(lon > 180):
+            lon_shifted = np.where(lon > 180, lon - 360, lon)
+            column_order = np.argsort(lon_shifted)
+            lon = lon_shifted[column_order]
+        world = load_country_borders(product.get("borders", DEFAULT_BORDERS))
+
+    def frame_values(t):
+        # one frame's panels, read from the cached file and reduced like the coordinates
+        values = [data.panel_values(panel, t) for panel in panels]
+        if curvilinear:
+            return [block_reduce(value, factor).ravel() for value in values]
+        if column_order is not None:
+            return [value[..., column_order] for value in values]
+        return values
+
+    init_values = frame_values(0)
+    encodings = {}
+    for row, (panel, values) in enumerate(zip(panels, init_values), start=1):
+        zmin, zmax = _panel_range(data, panel, time_steps)
+        colorbar_y = 1 - (row - 0.5) / n_rows
+        colorbar_len = 0.9 / n_rows
+        unit, label = panel.get("unit", ""), panel.get("label", panel_key(panel))
+        if curvilinear:
+            trace = create_scatter(values.ravel(), lon, lat, colorscale=panel.get("colorscale", "RdYlBu_r"), cmin=zmin, cmax=zmax,
+                                   colorbar_x=1.01, colorbar_y=colorbar_y, colorbar_len=colorbar_len, text=unit, hover_label=label)
+        else:
+            trace = create_plots(values, lon, lat, colorscale=panel.get("colorscale", "RdYlBu_r"), colorbar_x=1.0, colorbar_y=colorbar_y,
+                                 colorbar_len=colorbar_len, zmin=zmin, zmax=zmax, text=unit, hover_label=label)
+        fig.add_trace(trace, row=row, col=1)
+        if panel.get("encoding"):
+            encodings[row - 1] = panel["encoding"]
+
+    fig.update_layout(
+        title=f"{title} - {labels[0]}",
+        width=product.get("width", 1000),
+        height=product.get("height", PANEL_HEIGHT * n_rows),
+        plot_bgcolor="rgb(230,230,230)",
+        updatemenus=[dict(type="buttons", showactive=False, buttons=[
+            dict(label="Play", method="animate", args=[labels, {"frame": {"duration": 500, "redraw": True}, "fromcurrent": True}]),
+            dict(label="Pause", method="animate", args=[[None], {"frame": {"duration": 0, "redraw": False}, "mode": "immediate", "transition": {"duration": 0}}])
+        ])]
+    )
+    for row in range(1, n_rows + 1):
+        add_country_borders(fig, world, row=row, col=1)
+    if curvilinear:
+        # Axes fixed to the data extent, border lines running past the edge are cut there
+        fig.update_xaxes(range=[bbox[0], bbox[2]])
+        fig.update_yaxes(range=[bbox[1], bbox[3]])
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{product['name']}_{data.cycle}.html")
+    traces = list(range(n_rows))
+    with StreamingHTMLWriter(path, fig, encodings=encodings if quantize else None) as writer:
+        for t in range(time_steps):
+            values = init_values if t == 0 else frame_values(t)
+            writer.add_frame(data_frame(fig, labels[t], values, traces=traces, title=f"{title} - {labels[t]}"))
+    return path
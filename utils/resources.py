@@ -0,0 +1,366 @@
+"""
+Process-wide, cycle-keyed resources for the Skyfora apps.
+
+Streamlit re-runs the app script on every widget interaction and for every session, but
+imported modules live for the whole server process. Opened datasets and derived NumPy blocks
+are therefore kept here, keyed by (model, forecast cycle, name), built once even when many
+sessions ask at the same time, and dropped as soon as a newer cycle of the model is detected.
+Results derived from user uploads are kept in a bounded LRU keyed by a hash of the file content,
+and frames computed on demand (e.g. one map time step) in a small LRU that prefetches neighbours.
+Slow builds run as background jobs that report progress and can be cancelled, so the apps
+render what they have and poll the jobs instead of blocking the page.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.cycles import find_latest_cycle
+
+CYCLE_CHECK_SECONDS = 60  # how often the newest cycle is looked up (find_latest_cycle has its own catalog TTL)
+RESULT_CACHE_ENTRIES = 64  # upload-derived results kept across sessions, least recently used dropped first
+FRAME_CACHE_ENTRIES = 8
+FRAME_PREFETCH = (1, 2, -1)  # offsets from the requested frame computed in the background
+JOB_WORKERS = int(os.environ.get("SKYFORA_JOB_WORKERS", 4))
+JOB_RETRY_SECONDS = 30  # a failed job is started again when requested after this long
+
+
+class CycleResources:
+    """
+    Thread-safe store of values keyed by (model, cycle, name).
+    """
+    def __init__(self, check_seconds=CYCLE_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._build_locks = {}
+        self._cycles = {}  # model -> (checked_at, cycle)
+        self._cycle_locks = {}
+
+    def current_cycle(self, model):
+        """
+        Newest published "YYYYMMDDHH" cycle of model, looked up at most every check_seconds; None if unknown.
+        """
+        with self._lock:
+            checked = self._cycles.get(model)
+            if checked is not None and time.time() - checked[0] < self.check_seconds:
+                return checked[1]
+            cycle_lock = self._cycle_locks.setdefault(model, threading.Lock())
+        with cycle_lock:
+            # another session may have refreshed it while this one waited
+            checked = self._cycles.get(model)
+            if checked is not None and time.time() - checked[0] < self.check_seconds:
+                return checked[1]
+            latest = find_latest_cycle(model)
+            cycle = latest[1] + latest[0] if latest is not None else (checked[1] if checked else None)
+            with self._lock:
+                self._cycles[model] = (time.time(), cycle)
+                self._drop_other_cycles(model, cycle)
+            return cycle
+
+    def _drop_other_cycles(self, model, cycle):
+        for key in [key for key in self._entries if key[0] == model and key[1] != cycle]:
+            del self._entries[key]
+
+    def get(self, model, name, build, cycle=None):
+        """
+        Value of name for the model cycle, built with build(cycle) on first use.
+        Concurrent callers of the same key wait for one build; None results are not kept, so
+        a failed open is retried on the next run.
+        Args:
+            cycle: "YYYYMMDDHH", defaults to current_cycle(model)
+        """
+        if cycle is None:
+            cycle = self.current_cycle(model)
+        key = (model, cycle, name)
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key]
+            value = build(cycle)
+            with self._lock:
+                self._build_locks.pop(key, None)
+                current = self._cycles.get(model)
+                # a value of a cycle that was superseded during the build is returned but not kept
+                if value is not None and (current is None or current[1] in (cycle, None)):
+                    self._entries[key] = value
+            return value
+
+    def clear(self, model=None):
+        with self._lock:
+            for key in [key for key in self._entries if model is None or key[0] == model]:
+                del self._entries[key]
+
+
+class FrameLRU:
+    """
+    Frames computed one at a time with build(t), for views that show a single time step.
+    The requested frame is built in the calling thread (or awaited if a prefetch already runs),
+    then its neighbours are queued on one background thread; pending prefetches of frames that
+    are no longer near the view are cancelled. At most max_frames frames are kept.
+    """
+    def __init__(self, build, n_frames, max_frames=FRAME_CACHE_ENTRIES, prefetch=FRAME_PREFETCH):
+        self.build = build
+        self.n_frames = n_frames
+        self.max_frames = max_frames
+        self.prefetch = prefetch
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()  # t -> Future, least recently used first
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-prefetch")
+
+    def _usable(self, future):
+        return future is not None and not future.cancelled() and not (future.done() and future.exception() is not None)
+
+    def get(self, t):
+        """
+        Frame t, built now if it is neither cached nor being prefetched. Build errors are raised (and not kept).
+        """
+        with self._lock:
+            future = self._frames.get(t)
+            build_here = not self._usable(future)
+            if build_here:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self._frames[t] = future
+            self._frames.move_to_end(t)
+        if build_here:
+            try:
+                future.set_result(self.build(t))
+            except Exception as e:
+                future.set_exception(e)
+        self._schedule_neighbours(t)
+        return future.result()
+
+    def _schedule_neighbours(self, t):
+        wanted = [t + offset for offset in self.prefetch if 0 <= t + offset < self.n_frames]
+        with self._lock:
+            for key, future in list(self._frames.items()):
+                if key not in wanted and key != t and future.cancel():
+                    del self._frames[key]
+            for key in wanted:
+                if not self._usable(self._frames.get(key)):
+                    self._frames[key] = self._pool.submit(self.build, key)
+            self._frames.move_to_end(t)
+            # drop least recently used finished frames, never the requested one or queued prefetches
+            for key in [key for key, future in self._frames.items() if future.done() and key != t]:
+                if len(self._frames) <= self.max_frames:
+                    break
+                del self._frames[key]
+
+    def cached(self):
+        """
+        Indices of the frames that are ready.
+        """
+        with self._lock:
+            return sorted(key for key, future in self._frames.items() if future.done() and self._usable(future))
+
+
+RESOURCES = CycleResources()
+
+
+def current_cycle(model):
+    """
+    Newest "YYYYMMDDHH" cycle of model, shared by all sessions of the process.
+    """
+    return RESOURCES.current_cycle(model)
+
+
+def cycle_resource(model, name, build, cycle=None):
+    """
+    Process-wide value of name for the current (or given) cycle of model, see CycleResources.get.
+    """
+    return RESOURCES.get(model, name, build, cycle=cycle)
+
+
+class ResultCache:
+    """
+    Thread-safe, bounded LRU of computed results, e.g. a parsed upload or the forecast along a route.
+    Keys are tuples that include the content hash of the input and the forecast cycle, so the same
+    file uploaded again (by any session) reuses the result while an edited file or new cycle does not.
+    """
+    def __init__(self, max_entries=RESULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._build_locks = {}
+
+    def get(self, key, build):
+        """
+        Cached value of key, computed with build() on first use. Exceptions and None are not cached.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+            try:
+                value = build()
+            finally:
+                with self._lock:
+                    self._build_locks.pop(key, None)
+            if value is not None:
+                with self._lock:
+                    self._entries[key] = value
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+RESULTS = ResultCache()
+
+
+def content_hash(data):
+    """
+    Hex digest identifying an uploaded file by its bytes (not its name).
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def cached_result(key, build):
+    """
+    Process-wide result of build() for key, see ResultCache.get.
+    """
+    return RESULTS.get(key, build)
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a background job by BackgroundJob.report once the job has been cancelled.
+    """
+
+
+class BackgroundJob:
+    """
+    A function running on the shared job pool with progress and cooperative cancellation.
+    The function receives the job and calls job.report(done, total) between steps; report
+    raises JobCancelled after cancel(), so the job stops at its next step.
+    Sessions showing the job hold it (hold/release); it is cancelled when the last one releases it.
+    """
+    def __init__(self):
+        self.done_steps = 0
+        self.total_steps = None
+        self.finished_at = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._holders = 0
+        self._holders_lock = threading.Lock()
+
+    def report(self, done, total):
+        self.done_steps, self.total_steps = done, total
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    @property
+    def fraction(self):
+        return min(self.done_steps / self.total_steps, 1.0) if self.total_steps else 0.0
+
+    def cancel(self):
+        """
+        Stop the job at its next report; a finished job keeps its result.
+        """
+        if not self.future.done():
+            self._cancel.set()
+            self.future.cancel()
+
+    def hold(self):
+        """
+        Count one more session showing this job.
+        """
+        with self._holders_lock:
+            self._holders += 1
+
+    def release(self):
+        """
+        Drop one session's hold; the job is cancelled once no session holds it.
+        """
+        with self._holders_lock:
+            self._holders = max(self._holders - 1, 0)
+            if self._holders == 0:
+                self.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.future.done()
+
+    def error(self):
+        """
+        Exception the job failed with, None while running, on success or when cancelled.
+        """
+        if not self.future.done() or self.future.cancelled():
+            return None
+        error = self.future.exception()
+        return None if isinstance(error, JobCancelled) else error
+
+    def result(self):
+        return self.future.result()
+
+
+class JobRegistry:
+    """
+    Background jobs keyed like ResultCache entries. Starting a key that already runs (or has
+    finished) returns the existing job, so sessions asking for the same result share one build;
+    finished jobs are kept as a bounded LRU of results. Cancelled jobs, and failed ones after
+    retry_seconds, are started again when requested.
+    """
+    def __init__(self, max_entries=RESULT_CACHE_ENTRIES, workers=JOB_WORKERS, retry_seconds=JOB_RETRY_SECONDS):
+        self.max_entries = max_entries
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="skyfora-job")
+
+    def _reusable(self, job):
+        if job is None or job.cancelled:
+            return False
+        return job.error() is None or time.time() - job.finished_at < self.retry_seconds
+
+    def _run(self, job, fn):
+        try:
+            return fn(job)
+        finally:
+            job.finished_at = time.time()
+
+    def start(self, key, fn):
+        """
+        Job computing fn(job) for key, started on first request.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if not self._reusable(job):
+                job = BackgroundJob()
+                job.future = self._pool.submit(self._run, job, fn)
+                self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            for old_key in [old_key for old_key, old in self._jobs.items() if old.done()]:
+                if len(self._jobs) <= self.max_entries:
+                    break
+                del self._jobs[old_key]
+            return job
+
+
+JOBS = JobRegistry()
+
+
+def start_job(key, fn):
+    """
+    Process-wide background job running fn(job) for key, see JobRegistry.start.
+    """
+    return JOBS.start(key, fn)
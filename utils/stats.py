@@ -0,0 +1,206 @@
+"""
+Per-variable field statistics for Skyfora project.
+
+Min, max, mean and quantiles of each rendered variable are computed once per forecast cycle,
+chunk by chunk with a streaming quantile sketch, and kept as JSON in the cache directory so
+every renderer (apps, animation scripts, products) derives its color scale from the same numbers.
+"""
+import os
+import json
+import glob
+import tempfile
+import numpy as np
+
+from utils.cache import DEFAULT_CACHE_DIR
+
+STATS_DIR = os.path.join(DEFAULT_CACHE_DIR, "stats")
+DEFAULT_QUANTILES = (1, 50, 99)  # percent, stored as p1, p50, p99
+SKETCH_BINS = 4096
+STATS_TIME_CHUNK = 4
+KEEP_CYCLES = 4  # cycles kept per model, older stats files are removed on write
+
+
+class QuantileSketch:
+    """
+    Streaming quantile estimate in constant memory: a fixed number of equal-width bins whose
+    width doubles (merging neighbour bins) whenever values fall outside the covered range.
+    Quantiles are accurate to one bin, at worst (max - min) / bins * 2, far finer than a color scale resolves.
+    """
+    def __init__(self, bins=SKETCH_BINS):
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.lo = None
+        self.width = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        vmin, vmax = values.min(), values.max()
+        if self.lo is None:
+            self.lo = vmin
+            self.width = (vmax - vmin) / self.bins if vmax > vmin else max(abs(vmin), 1.0) * 1e-6
+        while vmin < self.lo or vmax >= self.lo + self.width * self.bins:
+            self._grow(downward=vmin < self.lo)
+        idx = np.minimum(((values - self.lo) / self.width).astype(np.int64), self.bins - 1)
+        self.counts += np.bincount(idx, minlength=self.bins)
+
+    def _grow(self, downward):
+        merged = self.counts.reshape(-1, 2).sum(axis=1)
+        self.counts = np.zeros_like(self.counts)
+        if downward:
+            self.counts[self.bins // 2:] = merged
+            self.lo -= self.width * self.bins
+        else:
+            self.counts[:self.bins // 2] = merged
+        self.width *= 2
+
+    def quantiles(self, percents):
+        """
+        Estimated values at the given percents (0-100), interpolated within bins. NaN if empty.
+        """
+        total = self.counts.sum()
+        if total == 0:
+            return [np.nan for _ in percents]
+        cumulative = np.cumsum(self.counts)
+        results = []
+        for q in percents:
+            rank = q / 100 * total
+            b = int(np.searchsorted(cumulative, rank, side="left"))
+            b = min(b, self.bins - 1)
+            below = cumulative[b - 1] if b > 0 else 0
+            inside = (rank - below) / self.counts[b] if self.counts[b] else 0.0
+            results.append(float(self.lo + (b + inside) * self.width))
+        return results
+
+
+class FieldStats:
+    """
+    Running count, min, max, mean and quantile sketch of one variable, fed chunk by chunk.
+    """
+    def __init__(self, bins=SKETCH_BINS):
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch(bins)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            return
+        self.count += finite.size
+        self.total += finite.sum()
+        self.min = min(self.min, finite.min())
+        self.max = max(self.max, finite.max())
+        self.sketch.update(finite)
+
+    def result(self, quantiles=DEFAULT_QUANTILES):
+        if self.count == 0:
+            return None
+        stats = dict(count=int(self.count), min=float(self.min), max=float(self.max), mean=self.total / self.count)
+        for q, value in zip(quantiles, self.sketch.quantiles(quantiles)):
+            # the sketch interpolates inside bins, keep the estimate within the observed range
+            stats[f"p{q:g}"] = float(np.clip(value, self.min, self.max))
+        return stats
+
+
+def _time_chunks(source, n_times, time_chunk):
+    for start in range(0, n_times, time_chunk):
+        t_slice = slice(start, min(start + time_chunk, n_times))
+        if callable(source):
+            yield source(t_slice)
+        elif hasattr(source, "isel"):
+            yield source.isel(time=t_slice).values
+        else:
+            yield source[t_slice]
+
+
+def compute_field_stats(sources, n_times=None, quantiles=DEFAULT_QUANTILES, time_chunk=STATS_TIME_CHUNK):
+    """
+    Statistics of every source, read time_chunk time steps at a time.
+    Args:
+        sources: {name: (time, ...) numpy array, xarray DataArray (read lazily per chunk),
+                 or function(time slice) -> array for derived fields such as wind speed}
+        n_times: number of time steps, default the first axis of the array sources (required for functions)
+    Returns:
+        {name: dict(count, min, max, mean, p<q> ...) or None if all values are missing}
+    """
+    results = {}
+    for name, source in sources.items():
+        steps = n_times if n_times is not None else len(source)
+        stats = FieldStats()
+        for chunk in _time_chunks(source, steps, time_chunk):
+            stats.update(chunk)
+        results[name] = stats.result(quantiles)
+    return results
+
+
+def stats_key(name, **settings):
+    """
+    Name under which a field's statistics are stored, including the cleanup applied to it,
+    e.g. stats_key('apcpsfc', clip=(0, 50)) -> 'apcpsfc[clip=[0, 50]]'. Settings that are None are left out,
+    so the same field with different clip/valid_max settings gets its own entry.
+    """
+    parts = [f"{key}={json.dumps(value)}" for key, value in sorted(settings.items()) if value is not None]
+    return f"{name}[{','.join(parts)}]" if parts else name
+
+
+def _stats_path(model, cycle, stats_dir):
+    return os.path.join(stats_dir, f"{model}_{cycle}.json")
+
+
+def get_field_stats(model, cycle, sources, n_times=None, quantiles=DEFAULT_QUANTILES, stats_dir=STATS_DIR):
+    """
+    Statistics of sources for one model cycle, computed on first request and cached as JSON.
+    Variables already stored for the cycle (with the same quantiles and time steps) are not recomputed.
+    Returns:
+        {name: dict(count, min, max, mean, p<q> ...)}
+    """
+    path = _stats_path(model, cycle, stats_dir)
+    stored = {}
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable stats file {path}: {e}")
+    keys = [f"p{q:g}" for q in quantiles]
+    steps = {name: n_times if n_times is not None else (None if callable(source) else len(source))
+             for name, source in sources.items()}
+    missing = {
+        name: source for name, source in sources.items()
+        if stored.get(name) is None or stored[name].get("time_steps") != steps[name]
+        or any(key not in stored[name] for key in keys)
+    }
+    if missing:
+        for name, stats in compute_field_stats(missing, n_times, quantiles).items():
+            if stats is not None:
+                stats["time_steps"] = steps[name]
+            stored[name] = stats
+        os.makedirs(stats_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".json.tmp", dir=stats_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(stored, f, indent=1)
+        os.replace(tmp_path, path)
+        # "YYYYMMDDHH" cycles sort by name, keep the newest ones
+        for old_path in sorted(glob.glob(os.path.join(stats_dir, f"{model}_??????????.json")), reverse=True)[KEEP_CYCLES:]:
+            os.remove(old_path)
+    return {name: stored[name] for name in sources}
+
+
+def color_range(stats, low=0, high="p99", default=(0, 1)):
+    """
+    (zmin, zmax) for a color scale from one variable's statistics.
+    Args:
+        low, high: statistic names (e.g. 'min', 'p1', 'p99') or numbers used as they are
+        default: range used when there are no statistics or they give an empty range
+    """
+    if stats is None:
+        return default
+    zmin, zmax = (stats[bound] if isinstance(bound, str) else bound for bound in (low, high))
+    if not zmax > zmin:  # e.g. p99 of a mostly dry precipitation field
+        return default
+    return zmin, zmax
@@ -0,0 +1,152 @@
+"""
+HTTP transport for OPeNDAP reads in Skyfora project.
+
+One pooled requests session per process (keep-alive connections are reused across reads),
+default timeouts on every request, and counters for requests, retries, failures and bytes
+transferred. Retries happen in one place, call_with_retry around each read, and only for
+connection errors, timeouts and overload/gateway statuses (RETRY_STATUS).
+
+The session, its timeouts and the request/byte counters apply to the pydap engine
+(PARALLEL_OPENDAP_ENGINE) and to cycle probes only. The netCDF4 engine (the default OPENDAP_ENGINE)
+goes through libnetcdf's own HTTP client: it has libcurl's timeouts, is not counted, and its failures
+arrive as generic OSError/RuntimeError that look the same as an unpublished cycle or a missing
+variable, so they are raised at once instead of retried. Reads that need the retries open with pydap.
+"""
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.environ.get("SKYFORA_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.environ.get("SKYFORA_READ_TIMEOUT", 120))
+MAX_RETRIES = int(os.environ.get("SKYFORA_MAX_RETRIES", 4))
+BACKOFF_FACTOR = 1.0  # seconds, doubled on every retry before jitter
+POOL_SIZE = 16
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Transport errors worth another attempt: failed or dropped connections and timeouts
+# (requests.HTTPError only for RETRY_STATUS, see _retryable)
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                ConnectionError, TimeoutError)
+
+
+class TransportStats:
+    """
+    Thread-safe counters for the process-wide transport.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.retries = 0
+            self.failures = 0
+            self.bytes = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        with self._lock:
+            return dict(requests=self.requests, retries=self.retries, failures=self.failures, bytes=self.bytes)
+
+
+STATS = TransportStats()
+
+
+def backoff_delay(attempt, factor=BACKOFF_FACTOR):
+    """
+    Full-jitter exponential backoff: uniform in [0, factor * 2**attempt].
+    """
+    return random.uniform(0, factor * 2 ** attempt)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default (connect, read) timeout to requests without one.
+    """
+    def __init__(self, *args, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def _count_response(response, *args, stream=False, **kwargs):
+    STATS.add(requests=1)
+    if response.status_code >= 400:
+        STATS.add(failures=1)
+    # Bytes of the body actually read (Content-Length is missing on chunked responses)
+    if not stream:
+        STATS.add(bytes=len(response.content))
+    else:
+        iter_content = response.iter_content
+
+        def counted_iter_content(*args, **kwargs):
+            for chunk in iter_content(*args, **kwargs):
+                STATS.add(bytes=len(chunk))
+                yield chunk
+        response.iter_content = counted_iter_content
+
+
+def _raise_retryable_status(response, *args, **kwargs):
+    # Overload and gateway errors as requests.HTTPError, so call_with_retry repeats the read
+    if response.status_code in RETRY_STATUS:
+        response.raise_for_status()
+
+
+def make_session(timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_size=POOL_SIZE):
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(timeout=timeout, max_retries=0, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.hooks["response"].extend([_count_response, _raise_retryable_status])
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Process-wide pooled session, created on first use.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def _retryable(error):
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUS
+    return isinstance(error, RETRY_ERRORS)
+
+
+def call_with_retry(fn, *args, retries=MAX_RETRIES, **kwargs):
+    """
+    Call fn, retrying transport errors (RETRY_ERRORS and HTTP RETRY_STATUS responses) with jittered backoff.
+    Used around individual chunk reads so a failure only repeats that chunk; other
+    exceptions (missing files or cycles, 404s, programming errors) are raised at once.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not _retryable(e):
+                raise
+            if attempt == retries:
+                STATS.add(failures=1)
+                raise
+            STATS.add(retries=1)
+            time.sleep(backoff_delay(attempt))